@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'portal.instrument.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +85,36 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# `swapi` cache keeps SWAPI resources which are not expected to change
+# (planets). `stats` cache keeps value counts of collections, which
+# never change: Its entries do not expire, least recently used entries
+# are evicted. TIMEOUT is in seconds, MAX_ENTRIES bounds the size.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'swapi': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'swapi',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    'stats': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'stats',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 500,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -165,3 +196,98 @@ LOGGING = {
 # Media root settings - where the files will be stored
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'files')
+
+
+# Collection detail paging: default and maximum page size
+
+COLLECTION_PAGE_SIZE = 10
+COLLECTION_PAGE_SIZE_MAX = 100
+
+# Collection storage backend used for reading the collections:
+#   - 'csv': parse CSV file (rows are located by row index)
+#   - 'columnar': read memory-mapped columnar binary copy of CSV file
+
+COLLECTION_STORAGE_BACKEND = 'columnar'
+
+# Lifetime (in seconds) of collection pages within browser caches and
+# of collection API responses and exports within browser and proxy
+# caches. Collections never change, responses are revalidated by their
+# ETag and Last-Modified headers after that.
+
+COLLECTION_CACHE_MAX_AGE = 60 * 60 * 24 * 30
+
+# Serve collection list, detail and statistics by asynchronous views
+# (see `portal.views_async`). Use it with ASGI server only.
+
+PORTAL_ASYNC_VIEWS = False
+
+# Timing instrumentation (see `portal.instrument`): Stages of views,
+# SWAPI requests and ingestion jobs are timed and reported by
+# `Server-Timing` response header, `portal.timing` log records and
+# Prometheus histograms at `/metrics`. When disabled, the middleware
+# is not used and `/metrics` is not found.
+
+INSTRUMENTATION_ENABLED = False
+
+
+# SWAPI settings
+# SWAPI_HOST: Base URL of Star Wars API. Point it to local stand-in
+#   server (`manage.py fake_swapi`) for benchmarks and load tests.
+
+SWAPI_HOST = 'https://swapi.dev/api/'
+
+# SWAPI_HOMEWORLD_RESOLUTION (used for all INGEST_ENRICHED_FIELDS):
+#   - 'lazy': fetch just the resources referenced by people
+#       (e.g. planets referenced as homeworlds)
+#   - 'prefetch': fetch the whole resource lists (together with people)
+
+SWAPI_HOMEWORLD_RESOLUTION = 'lazy'
+
+# On-disk cache of SWAPI responses used for conditional requests
+# (ETag / If-Modified-Since). Set to None to disable it.
+# Responses without validators are not requested again within
+# SWAPI_HTTP_CACHE_FRESHNESS seconds.
+
+SWAPI_HTTP_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'swapi')
+SWAPI_HTTP_CACHE_FRESHNESS = 60 * 60
+
+
+# Collection ingestion jobs
+# INGEST_JOB_RUNNER:
+#   - 'thread': run jobs on local worker thread pool
+#   - 'db': keep jobs pending in DB, run `manage.py ingest_worker`
+#       to process them
+#   - 'sync': run jobs within the request (useful for testing)
+#   - 'async': run jobs on the event loop of ASGI server (requires
+#       PORTAL_ASYNC_VIEWS), otherwise the same as 'thread'
+
+INGEST_JOB_RUNNER = 'thread'
+INGEST_JOB_WORKERS = 2
+
+# Jobs running (or pending) longer than INGEST_JOB_TIMEOUT seconds are
+# considered stale (e.g. the process was killed) and their collections
+# fail. Collections list page stops refreshing then.
+
+INGEST_JOB_TIMEOUT = 60 * 30
+
+# Reuse unchanged rows (by `url` and `edited` of people) from the most
+# recent collection instead of transforming them again
+
+INGEST_INCREMENTAL = True
+
+# Resource types fetched by one ingestion job (see
+# `portal.swapi.RESOURCES`). Collections of the types are ingested
+# concurrently.
+
+INGEST_RESOURCE_TYPES = (
+    'people', 'planets', 'films', 'species', 'vehicles', 'starships')
+
+# URL reference fields replaced by names of the referenced resources,
+# by resource type (e.g. 'homeworld', 'species', 'films', 'vehicles' or
+# 'starships' of people). Other reference fields are not part of the
+# collections.
+
+INGEST_ENRICHED_FIELDS = {
+    'people': ('homeworld',),
+    'species': ('homeworld',),
+}
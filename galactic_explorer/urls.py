@@ -13,21 +13,38 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.urls import path
 
 from portal import views
+from portal import views_async
+
+# Collection views served by ASGI server may be asynchronous
+collection_views = views_async if settings.PORTAL_ASYNC_VIEWS else views
 
 urlpatterns = [
     path(
         '',
         views.view_index, name='home'),
+    path(
+        'metrics',
+        views.view_metrics, name='metrics'),
     path(
         'collections/',
-        views.view_collections, name='collections'),
+        collection_views.view_collections, name='collections'),
     path(
         'collections/<str:collection_id>/',
-        views.view_collection_detail, name='collection_detail'),
+        collection_views.view_collection_detail, name='collection_detail'),
     path(
         'collections/<str:collection_id>/stats/',
-        views.view_collection_stats, name='collection_stats'),
+        collection_views.view_collection_stats, name='collection_stats'),
+    path(
+        'collections/<str:collection_id>/export/',
+        views.view_collection_export, name='collection_export'),
+    path(
+        'api/collections/<str:collection_id>/rows/',
+        views.api_collection_rows, name='api_collection_rows'),
+    path(
+        'api/collections/<str:collection_id>/stats/',
+        views.api_collection_stats, name='api_collection_stats'),
 ]
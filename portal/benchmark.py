@@ -0,0 +1,269 @@
+import csv
+import glob
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from portal import fakeswapi
+from portal import models
+from portal import stats
+from portal import storage
+from portal import views
+
+# Storage variants: storage backend and whether the sidecar files
+# written by the ingestion (row index, columnar file, value counts) are
+# present. `reparse` reads the plain CSV file only.
+STORAGE_VARIANTS = {
+    'reparse': ('csv', False),
+    'csv': ('csv', True),
+    'columnar': ('columnar', True),
+}
+# Fields selected by statistics cases
+STATS_FIELDS = {
+    'stats_single': ('eye_color',),
+    'stats_multi': ('eye_color', 'gender', 'homeworld'),
+}
+CASES = (
+    'detail_first', 'detail_middle', 'detail_last',
+    'stats_single', 'stats_multi')
+HEADER = (
+    'name', 'height', 'mass', 'hair_color', 'skin_color', 'eye_color',
+    'birth_year', 'gender', 'homeworld', 'date')
+PLANETS_COUNT = 200
+
+
+def collection_csv_write(path: str, rows_count: int, seed: int = 0):
+    """Write synthetic people collection CSV file. Values are picked
+    from the values of the fake SWAPI dataset (see
+    `fakeswapi.FIELD_CHOICES`), so the file is deterministic for
+    the given seed.
+
+    :param path: Path of the CSV file
+    :type path: str
+    :param rows_count: Number of data rows
+    :type rows_count: int
+    :param seed: Seed of random generator
+    :type seed: int
+    """
+
+    rnd = random.Random(seed)
+    choices = fakeswapi.FIELD_CHOICES['people']
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for i in range(1, rows_count + 1):
+            writer.writerow(
+                ['People %s' % i]
+                + [rnd.choice(choices[field]) for field in HEADER[1:-2]]
+                + ['Planets %s' % rnd.randint(1, PLANETS_COUNT),
+                   '2014-12-%02d' % rnd.randint(9, 31)])
+
+
+def collection_store(csv_path: str, sidecars: bool) -> str:
+    """Store copy of the CSV file as collection file within
+    `MEDIA_ROOT` the same way as the ingestion does
+
+    :param csv_path: Path of the CSV file
+    :type csv_path: str
+    :param sidecars: Write sidecar files of the storage backend (see
+        `COLLECTION_STORAGE_BACKEND` setting) and value counts
+    :type sidecars: bool
+    :return: Name of the collection file
+    :rtype: str
+    """
+
+    temp_name = storage.collection_temp_name()
+    try:
+        shutil.copyfile(csv_path, storage.collection_path(temp_name))
+        if sidecars:
+            storage.backend_get().sidecars_write(temp_name)
+            storage.collection_counts_write(temp_name)
+        return storage.collection_store(temp_name)
+    finally:
+        storage.collection_delete(temp_name)
+
+
+def timings_get(func: Callable[[], object], repeat: int,
+                setup: Optional[Callable[[], object]] = None) -> dict:
+    """Time the function
+
+    :param func: Timed function
+    :type func: callable
+    :param repeat: Number of runs
+    :type repeat: int
+    :param setup: Function called before every run (not timed)
+    :type setup: callable, optional
+    :return: Timings in seconds: the first run, minimum, median and
+        mean of all the runs
+    :rtype: dict
+    """
+
+    timings = []
+    for _ in range(max(1, repeat)):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return {
+        'runs': len(timings),
+        'first': timings[0],
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+    }
+
+
+def benchmark_run(
+        sizes: Iterable[int],
+        variants: Iterable[str] = tuple(STORAGE_VARIANTS),
+        repeat: int = 5,
+        seed: int = 0,
+        progress: Optional[Callable[[dict], None]] = None) -> List[dict]:
+    """Time collection detail and statistics views on synthetic
+    collections
+
+    For every size, the collection file is generated once and stored
+    within temporary `MEDIA_ROOT` of every storage variant. Collection
+    objects are created within transaction, which is rolled back, so
+    neither DB nor `MEDIA_ROOT` is changed.
+
+    Statistics cache is invalidated before every run, so the value
+    counts are read from sidecar files (or counted) every time. Value
+    counts of `reparse` variant are counted by parsing the CSV file
+    every time. The first run of multi-field statistics of the other
+    variants counts the values by storage backend and writes them.
+
+    :param sizes: Numbers of rows of the collections
+    :type sizes: iterable
+    :param variants: Storage variants (see `STORAGE_VARIANTS`)
+    :type variants: iterable
+    :param repeat: Number of runs of every case
+    :type repeat: int
+    :param seed: Seed of random generator of collection data
+    :type seed: int
+    :param progress: Function called with every result
+    :type progress: callable, optional
+    :return: Results: number of rows, storage variant, case and its
+        timings (see `timings_get`)
+    :rtype: list
+    """
+
+    results = []
+    factory = RequestFactory()
+    with tempfile.TemporaryDirectory() as source_dir:
+        for rows_count in sizes:
+            csv_path = os.path.join(source_dir, '%s.csv' % rows_count)
+            collection_csv_write(csv_path, rows_count, seed)
+            for variant in variants:
+                for result in _variant_run(
+                        factory, csv_path, rows_count, variant, repeat):
+                    results.append(result)
+                    if progress is not None:
+                        progress(result)
+            os.remove(csv_path)
+    return results
+
+
+def _variant_run(factory: RequestFactory, csv_path: str, rows_count: int,
+                 variant: str, repeat: int) -> Iterable[dict]:
+    """Time the cases on the collection stored by the storage variant"""
+
+    backend, sidecars = STORAGE_VARIANTS[variant]
+    with tempfile.TemporaryDirectory() as media_root, \
+            override_settings(
+                MEDIA_ROOT=media_root, COLLECTION_STORAGE_BACKEND=backend), \
+            transaction.atomic():
+        file_name = collection_store(csv_path, sidecars)
+        col = models.Collection.objects.create(
+            file_name=file_name, file=file_name,
+            status=models.Collection.Status.DONE,
+            row_count=rows_count, header=list(HEADER))
+
+        def setup():
+            stats.collection_stats_invalidate(col.pk)
+            if not sidecars:
+                # Value counts are written on the first request
+                _counts_delete(file_name)
+
+        pages = max(1, -(-rows_count // settings.COLLECTION_PAGE_SIZE))
+        requests = _requests_get(factory, col.pk, pages)
+        for case in CASES:
+            view = views.view_collection_stats \
+                if case in STATS_FIELDS else views.view_collection_detail
+            request = requests[case]
+            result = {'rows': rows_count, 'storage': variant, 'case': case}
+            result.update(timings_get(
+                lambda: _response_check(view(request, col.pk)), repeat,
+                setup))
+            yield result
+
+        storage._columnar_reader_get.cache_clear()
+        transaction.set_rollback(True)
+
+
+def _requests_get(factory: RequestFactory, collection_id: int,
+                  pages: int) -> Dict[str, object]:
+    """GET requests of the cases"""
+
+    detail = '/collections/%s/' % collection_id
+    stats_path = '/collections/%s/stats/' % collection_id
+    return {
+        'detail_first': factory.get(detail, {'page': 1}),
+        'detail_middle': factory.get(detail, {'page': (pages + 1) // 2}),
+        'detail_last': factory.get(detail, {'page': pages}),
+        **{case: factory.get(stats_path, {f: 'on' for f in fields})
+           for case, fields in STATS_FIELDS.items()},
+    }
+
+
+def _counts_delete(file_name: str):
+    """Delete value counts sidecar files of the collection"""
+
+    pattern = '%s.counts-*' % glob.escape(storage.collection_path(file_name))
+    for path in glob.glob(pattern):
+        os.remove(path)
+
+
+def _response_check(response):
+    """Make sure the view responded with the page"""
+
+    if response.status_code != 200:
+        raise RuntimeError(
+            'Unexpected response status: %s' % response.status_code)
+
+
+def results_compare(results: List[dict], baseline: List[dict]) -> List[dict]:
+    """Compare median timings of the results with the baseline results
+
+    :param results: Results of `benchmark_run`
+    :type results: list
+    :param baseline: Baseline results of `benchmark_run`
+    :type baseline: list
+    :return: Results with `baseline` median and `ratio` of medians.
+        Results without baseline are omitted
+    :rtype: list
+    """
+
+    def key(result):
+        return result['rows'], result['storage'], result['case']
+
+    baseline = {key(r): r for r in baseline}
+    comparison = []
+    for result in results:
+        base = baseline.get(key(result))
+        if base is None:
+            continue
+        comparison.append(dict(
+            result, baseline=base['median'],
+            ratio=result['median'] / base['median']
+            if base['median'] else None))
+    return comparison
@@ -0,0 +1,245 @@
+import array
+import collections
+import csv
+import json
+import mmap
+import struct
+import sys
+from typing import List, Sequence
+
+# File layout:
+#   - MAGIC (8 bytes)
+#   - Length of metadata (unsigned 32-bit little-endian integer)
+#   - Metadata (JSON): number of rows and description of columns
+#   - Column sections (aligned to 8 bytes), their positions relative to
+#       the end of metadata (aligned) are stored within metadata:
+#       - Dictionary-encoded column: array of value codes. Dictionary
+#           (list of distinct values) is stored within metadata
+#       - Plain column: array of value offsets (rows + 1) followed by
+#           UTF-8 encoded values
+# All the arrays are little-endian.
+MAGIC = b'GECOL\x00\x01\x00'
+# Column is dictionary-encoded if the number of its distinct values is
+# at most the ratio of the number of rows
+DICT_RATIO = 0.5
+
+
+def columnar_write(csv_path: str, path: str):
+    """Convert CSV file into columnar binary file
+
+    :param csv_path: Path of the source CSV file
+    :type csv_path: str
+    :param path: Path of the columnar file
+    :type path: str
+    """
+
+    with open(csv_path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        columns = [[] for _ in header]
+        rows_count = 0
+        for row in reader:
+            for column, value in zip(columns, row):
+                column.append(value)
+            for column in columns[len(row):]:
+                column.append('')
+            rows_count += 1
+
+    meta = {'rows': rows_count, 'columns': []}
+    sections = []
+    for name, values in zip(header, columns):
+        dictionary = list(dict.fromkeys(values))
+        if len(dictionary) <= max(1, rows_count * DICT_RATIO):
+            codes_map = {v: c for c, v in enumerate(dictionary)}
+            codes = array.array(
+                _typecode(len(dictionary)), [codes_map[v] for v in values])
+            meta['columns'].append({
+                'name': name, 'encoding': 'dict',
+                'dictionary': dictionary, 'typecode': codes.typecode})
+            sections.append([_array_bytes(codes)])
+        else:
+            data = [v.encode('utf-8') for v in values]
+            offsets = array.array('Q', [0])
+            for value in data:
+                offsets.append(offsets[-1] + len(value))
+            offsets = array.array(_typecode(offsets[-1]), offsets)
+            meta['columns'].append({
+                'name': name, 'encoding': 'plain',
+                'typecode': offsets.typecode})
+            sections.append([_array_bytes(offsets), b''.join(data)])
+
+    # Positions of sections are relative to the end of metadata
+    position = 0
+    for column, column_sections in zip(meta['columns'], sections):
+        column['sections'] = []
+        for section in column_sections:
+            column['sections'].append([position, len(section)])
+            position = _align(position + len(section))
+    meta_bytes = json.dumps(meta).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(meta_bytes)))
+        f.write(meta_bytes)
+        data_start = _align(f.tell())
+        for column, column_sections in zip(meta['columns'], sections):
+            for (position, _), section in zip(
+                    column['sections'], column_sections):
+                f.write(b'\0' * (data_start + position - f.tell()))
+                f.write(section)
+
+
+class ColumnarReader(object):
+    """Read-only access to memory-mapped columnar file. Values are read
+    without any parsing: Just the requested rows are decoded.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path of the columnar file
+        :type path: str
+        """
+
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        if view[:len(MAGIC)] != MAGIC:
+            raise ValueError('Incorrect columnar file: %s' % path)
+        meta_start = len(MAGIC) + 4
+        meta_len, = struct.unpack('<I', view[len(MAGIC):meta_start])
+        meta = json.loads(bytes(view[meta_start:meta_start + meta_len]))
+        data_start = _align(meta_start + meta_len)
+
+        self.rows_count = meta['rows']
+        self.header = [c['name'] for c in meta['columns']]
+        self._columns = {}
+        for column in meta['columns']:
+            sections = [
+                view[data_start + position:data_start + position + length]
+                for position, length in column['sections']]
+            if column['encoding'] == 'dict':
+                self._columns[column['name']] = _DictColumn(
+                    column['dictionary'],
+                    _array_view(sections[0], column['typecode']))
+            else:
+                self._columns[column['name']] = _PlainColumn(
+                    _array_view(sections[0], column['typecode']),
+                    sections[1])
+
+    def rows(self, start: int, stop: int) -> List[tuple]:
+        """Get rows of the given range
+
+        :param start: Index of the first row
+        :type start: int
+        :param stop: Index of the row after the last one
+        :type stop: int
+        :return: List of rows
+        :rtype: list
+        """
+
+        start, stop, _ = slice(start, stop).indices(self.rows_count)
+        return list(zip(*(
+            self._columns[name].values(start, stop)
+            for name in self.header)))
+
+    def value_counts(self, fields: Sequence[str]) -> List[tuple]:
+        """Count occurrences of distinct values of the given fields. The
+        result is the same as `petl.valuecounts` without `frequency`:
+        The most common values first, values with the same count in
+        order of their first occurrence.
+
+        Dictionary-encoded columns are counted by their codes, so their
+        values are decoded just once.
+
+        :param fields: Field names
+        :type fields: sequence
+        :return: List of tuples: values of the fields and count
+        :rtype: list
+        """
+
+        columns = [self._columns[name] for name in fields]
+        keys = [c.keys() for c in columns]
+        counter = collections.Counter(
+            keys[0] if len(keys) == 1 else zip(*keys))
+        result = []
+        for key, count in counter.most_common():
+            if len(keys) == 1:
+                key = (key,)
+            result.append(tuple(
+                c.decode(k) for c, k in zip(columns, key)) + (count,))
+        return result
+
+
+class _DictColumn(object):
+    """Dictionary-encoded column: Codes of values"""
+
+    def __init__(self, dictionary: list, codes: Sequence[int]):
+        self.dictionary = dictionary
+        self.codes = codes
+
+    def values(self, start: int, stop: int) -> list:
+        dictionary = self.dictionary
+        return [dictionary[c] for c in self.codes[start:stop]]
+
+    def keys(self) -> Sequence:
+        return self.codes
+
+    def decode(self, key) -> str:
+        return self.dictionary[key]
+
+
+class _PlainColumn(object):
+    """Plain column: UTF-8 encoded values and their offsets"""
+
+    def __init__(self, offsets: Sequence[int], data: memoryview):
+        self.offsets = offsets
+        self.data = data
+
+    def values(self, start: int, stop: int) -> list:
+        offsets = self.offsets[start:stop + 1]
+        data = self.data
+        return [
+            str(data[a:b], 'utf-8') for a, b in zip(offsets, offsets[1:])]
+
+    def keys(self) -> Sequence:
+        return self.values(0, len(self.offsets) - 1)
+
+    @staticmethod
+    def decode(key) -> str:
+        return key
+
+
+def _typecode(max_value: int) -> str:
+    """Smallest unsigned array typecode for the values"""
+
+    for typecode in ('B', 'H', 'I'):
+        if max_value < 1 << (8 * array.array(typecode).itemsize):
+            return typecode
+    return 'Q'
+
+
+def _align(position: int) -> int:
+    """Align the position to 8 bytes"""
+
+    return (position + 7) // 8 * 8
+
+
+def _array_bytes(values: array.array) -> bytes:
+    """Little-endian bytes of the array"""
+
+    if sys.byteorder != 'little':
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _array_view(section: memoryview, typecode: str) -> Sequence[int]:
+    """Array of integers over little-endian bytes. Memory is not copied
+    on little-endian platforms.
+    """
+
+    if sys.byteorder != 'little':
+        values = array.array(typecode, bytes(section))
+        values.byteswap()
+        return values
+    return section.cast(typecode)
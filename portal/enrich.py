@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Executor, Future
+from typing import Dict, Iterable, Mapping, Optional, Set, Union
+
+from django.conf import settings
+
+from portal import instrument
+from portal import swapi
+
+log = logging.getLogger('portal')
+
+# Separator of names of list-valued references (e.g. `films`)
+LIST_SEPARATOR = ', '
+# Value of references to resources which are not available
+MISSING = 'N/A'
+
+
+class ResourceIndex(object):
+    """In-memory hash index of SWAPI resources by their URL. The index
+    is shared by all the pages (and all the enriched fields) of one
+    ingestion job, so every resource is fetched at most once. The
+    index can be shared by ingestions running on several threads.
+
+    Resources are fetched by the client on demand:
+        - lazy mode: just the referenced resources missing within the
+            index (see `swapi.SWAPI.resources_get`). Resources which
+            are not available are not requested again
+        - prefetch mode: the whole list of the resource type, once per
+            resource type (see `swapi.SWAPI.resource_list_get`)
+    """
+
+    def __init__(
+            self,
+            client: Union[swapi.SWAPI, swapi.AsyncSWAPI, None] = None,
+            prefetch: bool = False):
+        """
+        :param client: Star Wars API client. Without client, just the
+            resources added by `add` are available
+        :type client: swapi.SWAPI or swapi.AsyncSWAPI, optional
+        :param prefetch: Fetch whole resource lists
+        :type prefetch: bool
+        """
+
+        self.client = client
+        self.prefetch = prefetch
+        self._resources = {}
+        # URLs of resources which could not be fetched
+        self._unavailable = set()
+        # Fetched (or being fetched) resource lists by resource type
+        self._lists = {}
+        self._lists_lock = threading.Lock()
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._resources
+
+    def __len__(self) -> int:
+        return len(self._resources)
+
+    def get(self, url: str) -> Optional[dict]:
+        """Get indexed resource
+
+        :param url: Resource URL
+        :type url: str
+        :return: Resource object. If it is not indexed, returns None
+        :rtype: dict, optional
+        """
+
+        return self._resources.get(url)
+
+    def add(self, resources: Mapping[str, dict]):
+        """Add resources into the index
+
+        :param resources: Resource objects by their URL
+        :type resources: mapping
+        """
+
+        self._resources.update(resources)
+
+    def list_indexed(self, resource_type: str):
+        """Mark the whole list of the resource type indexed (e.g. added
+        page by page by the ingestion of the resource type), so it is
+        not fetched in prefetch mode
+
+        :param resource_type: Resource type (e.g. `planets`)
+        :type resource_type: str
+        """
+
+        future = Future()
+        future.set_result(True)
+        with self._lists_lock:
+            self._lists.setdefault(resource_type, future)
+
+    def lists_prefetch(self, resource_types: Iterable[str],
+                       executor: Executor):
+        """Start fetching the lists of resource types in background, so
+        they are fetched together with the first page of people
+        (prefetch mode only)
+
+        :param resource_types: Resource types (e.g. `planets`)
+        :type resource_types: iterable
+        :param executor: Executor the lists are fetched by
+        :type executor: concurrent.futures.Executor
+        """
+
+        if not self.prefetch:
+            return
+        with self._lists_lock:
+            for resource_type in resource_types:
+                if resource_type not in self._lists:
+                    self._lists[resource_type] = executor.submit(
+                        instrument.context_bind(self._list_fetch),
+                        resource_type)
+
+    def resolve(self, resource_type: str, urls: Iterable[str]):
+        """Make sure the resources are indexed. Just the missing ones
+        are fetched (in prefetch mode, the resource list is fetched if
+        it was not yet).
+
+        :param resource_type: Resource type (e.g. `planets`)
+        :type resource_type: str
+        :param urls: Resource URLs
+        :type urls: iterable
+        :raises swapi.SWAPIError: In case of Star Wars API error
+        """
+
+        if self.prefetch:
+            with self._lists_lock:
+                future = self._lists.get(resource_type)
+                fetch = future is None
+                if fetch:
+                    future = self._lists[resource_type] = Future()
+            if fetch:
+                try:
+                    future.set_result(self._list_fetch(resource_type))
+                except BaseException as e:
+                    future.set_exception(e)
+            if not future.result():
+                raise swapi.SWAPIError(
+                    'Error processing %s request' % resource_type)
+            return
+
+        urls_missing = self._missing_get(urls)
+        if urls_missing:
+            self._resources_add(
+                resource_type, urls_missing,
+                self.client.resources_get(urls_missing))
+
+    async def resolve_async(self, resource_type: str, urls: Iterable[str]):
+        """Asynchronous version of `resolve` using asynchronous client
+        (see `swapi.AsyncSWAPI`)
+        """
+
+        if self.prefetch:
+            if resource_type not in self._lists:
+                future = self._lists[resource_type] = Future()
+                results = None
+                try:
+                    results = await self.client.resource_list_get(
+                        resource_type)
+                    if results is not None:
+                        self.add({r['url']: r for r in results})
+                finally:
+                    future.set_result(results is not None)
+            elif not self._lists[resource_type].done():
+                # Being fetched by another task
+                await asyncio.wrap_future(self._lists[resource_type])
+            if not self._lists[resource_type].result():
+                raise swapi.SWAPIError(
+                    'Error processing %s request' % resource_type)
+            return
+
+        urls_missing = self._missing_get(urls)
+        if urls_missing:
+            self._resources_add(
+                resource_type, urls_missing,
+                await self.client.resources_get(urls_missing))
+
+    def _missing_get(self, urls: Iterable[str]) -> list:
+        """Distinct URLs which are neither indexed nor unavailable"""
+
+        return sorted({
+            u for u in urls
+            if u not in self._resources and u not in self._unavailable})
+
+    def _list_fetch(self, resource_type: str) -> bool:
+        """Fetch resource list and index it
+
+        :return: False in case of Star Wars API error
+        :rtype: bool
+        """
+
+        results = self.client.resource_list_get(resource_type)
+        if results is None:
+            return False
+        self.add({r['url']: r for r in results})
+        return True
+
+    def _resources_add(self, resource_type: str, urls: Iterable[str],
+                       resources: Optional[Mapping[str, dict]]):
+        """Index fetched single resources. Requested resources which
+        were not fetched are marked unavailable (they are converted
+        into `MISSING`).
+        """
+
+        if resources is None:
+            raise swapi.SWAPIError(
+                'Error processing %s request' % resource_type)
+        self.add(resources)
+        self._unavailable.update(u for u in urls if u not in resources)
+
+
+class EnrichmentStage(object):
+    """Transform stage replacing SWAPI URL references by names of the
+    referenced resources.
+
+    References are hash-joined with `ResourceIndex`: `prepare` collects
+    the referenced URLs of the records in one pass and makes sure they
+    are indexed, `apply` converts the reference fields of the table
+    by index lookups. List-valued references (e.g. `films`) are
+    converted into names joined by `LIST_SEPARATOR`.
+    """
+
+    def __init__(self, references: Mapping[str, str], index: ResourceIndex):
+        """
+        :param references: Resource types by enriched field (e.g.
+            `{'homeworld': 'planets'}`)
+        :type references: mapping
+        :param index: Index of referenced resources
+        :type index: ResourceIndex
+        """
+
+        self.references = dict(references)
+        self.index = index
+
+    @property
+    def resource_types(self) -> Set[str]:
+        """Resource types referenced by enriched fields"""
+
+        return set(self.references.values())
+
+    def urls_get(self, records: Iterable[dict]) -> Dict[str, set]:
+        """Collect URLs referenced by enriched fields of the records
+
+        :param records: Dicts representing SW resource data
+        :type records: iterable
+        :return: Sets of URLs by resource type
+        :rtype: dict
+        """
+
+        urls = {resource_type: set() for resource_type in self.resource_types}
+        for record in records:
+            for field, resource_type in self.references.items():
+                value = record.get(field)
+                if isinstance(value, str):
+                    value = [value]
+                urls[resource_type].update(u for u in value or () if u)
+        return urls
+
+    def prepare(self, records: Iterable[dict]):
+        """Make sure the resources referenced by the records are indexed
+
+        :param records: Dicts representing SW resource data
+        :type records: iterable
+        :raises swapi.SWAPIError: In case of Star Wars API error
+        """
+
+        for resource_type, urls in self.urls_get(records).items():
+            if urls or self.index.prefetch:
+                self.index.resolve(resource_type, urls)
+
+    async def prepare_async(self, records: Iterable[dict]):
+        """Asynchronous version of `prepare`: Resource types are
+        resolved concurrently.
+        """
+
+        await asyncio.gather(*(
+            self.index.resolve_async(resource_type, urls)
+            for resource_type, urls in self.urls_get(records).items()
+            if urls or self.index.prefetch))
+
+    def apply(self, table):
+        """Replace references of enriched fields of the table by names
+        of indexed resources
+
+        :param table: Table of SW resource data
+        :type table: petl.Table
+        :return: Transformed table
+        :rtype: petl.Table
+        """
+
+        header = table.header()
+        for field, resource_type in self.references.items():
+            if field in header:
+                table = table.convert(field, self._converter_get(
+                    swapi.RESOURCES[resource_type].name_field))
+        return table
+
+    def _converter_get(self, name_field: str):
+        """Converter of reference values into resource names"""
+
+        def name_get(url):
+            resource = self.index.get(url)
+            return MISSING if resource is None \
+                else resource.get(name_field, MISSING)
+
+        def convert(value):
+            if isinstance(value, (list, tuple)):
+                return LIST_SEPARATOR.join(name_get(u) for u in value)
+            return name_get(value)
+
+        return convert
+
+
+def index_create(
+        client: Union[swapi.SWAPI, swapi.AsyncSWAPI, None] = None
+) -> ResourceIndex:
+    """Create resource index resolving resources in the mode given by
+    `SWAPI_HOMEWORLD_RESOLUTION` setting
+
+    :param client: Star Wars API client
+    :type client: swapi.SWAPI or swapi.AsyncSWAPI, optional
+    :rtype: ResourceIndex
+    """
+
+    prefetch = settings.SWAPI_HOMEWORLD_RESOLUTION == 'prefetch'
+    return ResourceIndex(client, prefetch)
@@ -0,0 +1,376 @@
+import datetime
+import hashlib
+import http.server
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+import urllib.parse
+from typing import Dict, List, Optional
+
+log = logging.getLogger('portal')
+
+# Values of scalar fields of generated resources by resource type.
+# Every value is picked at random from the choices.
+FIELD_CHOICES = {
+    'people': {
+        'height': ['96', '150', '167', '172', '183', '202', 'unknown'],
+        'mass': ['32', '49', '75', '77', '84', '136', 'unknown'],
+        'hair_color': ['blond', 'brown', 'black', 'white', 'none', 'n/a'],
+        'skin_color': ['fair', 'light', 'gold', 'white, blue', 'dark'],
+        'eye_color': ['blue', 'brown', 'yellow', 'red', 'blue-gray'],
+        'birth_year': ['19BBY', '33BBY', '41.9BBY', '52BBY', 'unknown'],
+        'gender': ['male', 'female', 'n/a', 'hermaphrodite'],
+    },
+    'planets': {
+        'rotation_period': ['23', '24', '25', '26', 'unknown'],
+        'orbital_period': ['304', '364', '463', '549', 'unknown'],
+        'diameter': ['7200', '10465', '12500', '19720', 'unknown'],
+        'climate': ['arid', 'temperate', 'frozen', 'murky', 'tropical'],
+        'gravity': ['1 standard', '1.1 standard', 'N/A', 'unknown'],
+        'terrain': ['desert', 'grasslands, mountains', 'jungle', 'swamp'],
+        'surface_water': ['1', '8', '40', '100', 'unknown'],
+        'population': ['200000', '2000000000', '1000', 'unknown'],
+    },
+    'films': {
+        'episode_id': ['1', '2', '3', '4', '5', '6'],
+        'opening_crawl': ['It is a period of civil war.'],
+        'director': ['George Lucas', 'Irvin Kershner', 'Richard Marquand'],
+        'producer': ['Gary Kurtz, Rick McCallum', 'Howard G. Kazanjian'],
+        'release_date': ['1977-05-25', '1980-05-17', '1983-05-25'],
+    },
+    'species': {
+        'classification': ['mammal', 'artificial', 'reptile', 'amphibian'],
+        'designation': ['sentient', 'reptilian'],
+        'average_height': ['180', '100', '200', 'n/a'],
+        'skin_colors': ['caucasian, black', 'n/a', 'green', 'grey'],
+        'hair_colors': ['blonde, brown', 'n/a', 'none', 'black'],
+        'eye_colors': ['brown, blue', 'n/a', 'black', 'yellow'],
+        'average_lifespan': ['120', 'indefinite', '400', 'unknown'],
+        'language': ['Galactic Basic', 'n/a', 'Shyriiwook', 'Huttese'],
+    },
+    'vehicles': {
+        'model': ['Digger Crawler', 'T-16 skyhopper', 'X-34 landspeeder'],
+        'manufacturer': ['Corellia Mining Corporation', 'Incom Corporation'],
+        'cost_in_credits': ['150000', '14500', '10550', 'unknown'],
+        'length': ['36.8', '10.4', '3.4', '6.4'],
+        'max_atmosphering_speed': ['30', '1200', '250', '1000'],
+        'crew': ['46', '1', '2', '0'],
+        'passengers': ['30', '1', '0'],
+        'cargo_capacity': ['50000', '50', '5', 'none'],
+        'consumables': ['2 months', '0', 'none', '1 day'],
+        'vehicle_class': ['wheeled', 'repulsorcraft', 'starfighter'],
+    },
+    'starships': {
+        'model': ['CR90 corvette', 'Imperial I-class Star Destroyer'],
+        'manufacturer': ['Corellian Engineering Corporation', 'Kuat'],
+        'cost_in_credits': ['3500000', '150000000', 'unknown'],
+        'length': ['150', '1,600', '19000', '20'],
+        'max_atmosphering_speed': ['950', '975', 'n/a', '1050'],
+        'crew': ['30-165', '47,060', '4', '1'],
+        'passengers': ['600', 'n/a', '0', '6'],
+        'cargo_capacity': ['3000000', '36000000', '100', '110'],
+        'consumables': ['1 year', '2 years', '1 week', '2 months'],
+        'hyperdrive_rating': ['2.0', '1.0', '0.5', '4.0'],
+        'MGLT': ['60', '70', '100', '75'],
+        'starship_class': ['corvette', 'Star Destroyer', 'Starfighter'],
+    },
+}
+# URL reference fields of generated resources: Referenced resource type
+# and whether the field is list-valued
+REFERENCE_FIELDS = {
+    'people': {
+        'homeworld': ('planets', False), 'films': ('films', True),
+        'species': ('species', True), 'vehicles': ('vehicles', True),
+        'starships': ('starships', True)},
+    'planets': {'residents': ('people', True), 'films': ('films', True)},
+    'films': {
+        'characters': ('people', True), 'planets': ('planets', True),
+        'starships': ('starships', True), 'vehicles': ('vehicles', True),
+        'species': ('species', True)},
+    'species': {
+        'homeworld': ('planets', False), 'people': ('people', True),
+        'films': ('films', True)},
+    'vehicles': {'pilots': ('people', True), 'films': ('films', True)},
+    'starships': {'pilots': ('people', True), 'films': ('films', True)},
+}
+# Default number of generated resources by resource type
+DEFAULT_COUNTS = {
+    'people': 1000,
+    'planets': 200,
+    'films': 6,
+    'species': 40,
+    'vehicles': 40,
+    'starships': 40,
+}
+# Maximum number of references within list-valued field
+REFERENCES_MAX = 4
+# Paths of API endpoints: Trailing slash is optional
+PATH_RE = re.compile(
+    r'^/api/(?:(?P<resource>[a-z]+)(?:/(?P<id>[0-9]+))?/?)?$')
+
+
+class FakeDataset(object):
+    """Synthetic SWAPI dataset: Resources of all types referencing each
+    other by URLs. The dataset is deterministic for the given seed.
+    """
+
+    def __init__(
+            self,
+            base_url: str,
+            counts: Optional[Dict[str, int]] = None,
+            seed: int = 0):
+        """
+        :param base_url: Base URL of the API used within resource URLs
+            (e.g. `http://127.0.0.1:8001/api/`)
+        :type base_url: str
+        :param counts: Number of resources by resource type.
+            `DEFAULT_COUNTS` are used for missing types
+        :type counts: dict, optional
+        :param seed: Seed of random generator
+        :type seed: int
+        """
+
+        self.base_url = base_url
+        self.counts = dict(DEFAULT_COUNTS, **(counts or {}))
+        rnd = random.Random(seed)
+        self.resources = {
+            resource_type: [
+                self._resource_generate(rnd, resource_type, i)
+                for i in range(1, count + 1)]
+            for resource_type, count in self.counts.items()}
+
+    def url(self, resource_type: str, resource_id: int) -> str:
+        """URL of the resource"""
+
+        return '%s%s/%s/' % (self.base_url, resource_type, resource_id)
+
+    def page_get(self, resource_type: str, page: int,
+                 page_size: int) -> Optional[dict]:
+        """Get page of list response
+
+        :param resource_type: Resource type
+        :type resource_type: str
+        :param page: Page number (starting with 1)
+        :type page: int
+        :param page_size: Number of resources on page
+        :type page_size: int
+        :return: SWAPI list response. If the page does not exist,
+            returns None
+        :rtype: dict, optional
+        """
+
+        resources = self.resources[resource_type]
+        pages = max(1, math.ceil(len(resources) / page_size))
+        if not 1 <= page <= pages:
+            return
+        page_url = '%s%s/?page=%%s' % (self.base_url, resource_type)
+        return {
+            'count': len(resources),
+            'next': page_url % (page + 1) if page < pages else None,
+            'previous': page_url % (page - 1) if page > 1 else None,
+            'results': resources[(page - 1) * page_size:page * page_size],
+        }
+
+    def resource_get(self, resource_type: str,
+                     resource_id: int) -> Optional[dict]:
+        """Get single resource
+
+        :return: The resource. If it does not exist, returns None
+        :rtype: dict, optional
+        """
+
+        resources = self.resources[resource_type]
+        if not 1 <= resource_id <= len(resources):
+            return
+        return resources[resource_id - 1]
+
+    def _resource_generate(
+            self, rnd: random.Random, resource_type: str,
+            resource_id: int) -> dict:
+        """Generate resource of the type"""
+
+        name_field = 'title' if resource_type == 'films' else 'name'
+        resource = {
+            name_field: '%s %s' % (resource_type.capitalize(), resource_id)}
+        for field, choices in FIELD_CHOICES[resource_type].items():
+            resource[field] = rnd.choice(choices)
+        for field, (referenced, many) in \
+                REFERENCE_FIELDS[resource_type].items():
+            count = self.counts.get(referenced, DEFAULT_COUNTS[referenced])
+            ids = [
+                rnd.randint(1, count)
+                for _ in range(rnd.randint(0, REFERENCES_MAX) if many else 1)
+            ] if count else []
+            urls = [self.url(referenced, i) for i in sorted(set(ids))]
+            resource[field] = urls if many else (urls[0] if urls else None)
+        created = datetime.datetime(2014, 12, 9, 13, 50, 51) + \
+            datetime.timedelta(minutes=rnd.randint(0, 60 * 24 * 30))
+        edited = created + datetime.timedelta(
+            seconds=rnd.randint(0, 60 * 60 * 24 * 30), microseconds=1000)
+        resource.update({
+            'created': created.isoformat() + '.000000Z',
+            'edited': edited.isoformat() + 'Z',
+            'url': self.url(resource_type, resource_id),
+        })
+        return resource
+
+
+class FakeSWAPIServer(http.server.ThreadingHTTPServer):
+    """Local stand-in of Star Wars API serving `FakeDataset`.
+
+    Endpoints: `/api/` (resource list URLs), `/api/<resource>/?page=N`
+    (list responses) and `/api/<resource>/<id>/` (single resources).
+    Every response is delayed by `latency` (plus random `jitter`)
+    and fails with HTTP 500 with probability `error_rate`.
+
+    Responses carry `ETag` and matching conditional requests are
+    answered with 304 Not Modified, so the HTTP cache of the portal
+    (see `SWAPI_HTTP_CACHE_DIR` setting) revalidates every response
+    instead of using it without any request.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+            self,
+            host: str = '127.0.0.1',
+            port: int = 0,
+            counts: Optional[Dict[str, int]] = None,
+            page_size: int = 10,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            error_rate: float = 0.0,
+            seed: int = 0):
+        """
+        :param host: Host to bind
+        :type host: str
+        :param port: Port to bind. Free port is used by default
+        :type port: int
+        :param counts: Number of resources by resource type (see
+            `FakeDataset`)
+        :type counts: dict, optional
+        :param page_size: Number of resources on list page
+        :type page_size: int
+        :param latency: Delay of responses in seconds
+        :type latency: float
+        :param jitter: Maximum random delay added to `latency`
+        :type jitter: float
+        :param error_rate: Probability of HTTP 500 response
+        :type error_rate: float
+        :param seed: Seed of random generators
+        :type seed: int
+        """
+
+        super().__init__((host, port), _FakeSWAPIHandler)
+        self.base_url = 'http://%s:%s/api/' % self.server_address[:2]
+        self.dataset = FakeDataset(self.base_url, counts, seed)
+        self.page_size = page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests_count = 0
+        self.errors_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def start(self) -> threading.Thread:
+        """Serve on daemon thread. Call `shutdown` to stop it.
+
+        :return: The serving thread
+        :rtype: threading.Thread
+        """
+
+        thread = threading.Thread(
+            target=self.serve_forever, kwargs={'poll_interval': 0.05},
+            name='fake-swapi', daemon=True)
+        thread.start()
+        return thread
+
+    def response_get(self, path: str) -> tuple:
+        """Get response of the request path
+
+        :param path: Request path with query
+        :type path: str
+        :return: Tuple of HTTP status and JSON response body
+        :rtype: tuple
+        """
+
+        with self._lock:
+            self.requests_count += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            error = self._random.random() < self.error_rate
+            if error:
+                self.errors_count += 1
+        if delay:
+            time.sleep(delay)
+        if error:
+            return 500, {'detail': 'Injected error'}
+
+        parts = urllib.parse.urlsplit(path)
+        match = PATH_RE.match(parts.path)
+        resource_type = match and match.group('resource')
+        if match is None or \
+                resource_type and resource_type not in self.dataset.resources:
+            return 404, {'detail': 'Not found'}
+        if resource_type is None:
+            return 200, {
+                t: '%s%s/' % (self.base_url, t)
+                for t in self.dataset.resources}
+        if match.group('id'):
+            body = self.dataset.resource_get(
+                resource_type, int(match.group('id')))
+        else:
+            page = urllib.parse.parse_qs(parts.query).get('page', ['1'])[0]
+            body = self.dataset.page_get(
+                resource_type, int(page) if page.isdigit() else 0,
+                self.page_size)
+        if body is None:
+            return 404, {'detail': 'Not found'}
+        return 200, body
+
+
+class _FakeSWAPIHandler(http.server.BaseHTTPRequestHandler):
+    """Request handler of `FakeSWAPIServer`"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status, body = self.server.response_get(self.path)
+        data = json.dumps(body).encode('utf-8')
+        etag = '"%s"' % hashlib.sha1(data).hexdigest()
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            # Conditional request of HTTP cache (see `portal.httpcache`)
+            status, data = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if status in (200, 304):
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        log.debug('Fake SWAPI: ' + format, *args)
+
+
+def counts_parse(values: List[str]) -> Dict[str, int]:
+    """Parse numbers of resources given as `<resource type>=<count>`
+
+    :param values: Values to parse
+    :type values: list
+    :return: Number of resources by resource type
+    :rtype: dict
+    :raises ValueError: In case of incorrect value
+    """
+
+    counts = {}
+    for value in values:
+        resource_type, _, count = value.partition('=')
+        if resource_type not in DEFAULT_COUNTS or not count.isdigit():
+            raise ValueError('Incorrect resource count: %s' % value)
+        counts[resource_type] = int(count)
+    return counts
@@ -1,14 +1,32 @@
 from django import forms
 
+from portal import swapi
+
 
 class StatisticsForm(forms.Form):
-    name = forms.BooleanField(label='name', required=False)
-    height = forms.BooleanField(label='height', required=False)
-    mass = forms.BooleanField(label='mass', required=False)
-    hair_color = forms.BooleanField(label='hair_color', required=False)
-    skin_color = forms.BooleanField(label='skin_color', required=False)
-    eye_color = forms.BooleanField(label='eye_color', required=False)
-    birth_year = forms.BooleanField(label='birth_year', required=False)
-    gender = forms.BooleanField(label='gender', required=False)
-    homeworld = forms.BooleanField(label='homeworld', required=False)
-    date = forms.BooleanField(label='date', required=False)
+    """Statistics form: a checkbox for every field of the collection.
+    Fields are derived from the collection header, which is the schema
+    of the resource type transformed by the ingestion (see
+    `portal.ingest`).
+    """
+
+    def __init__(self, *args, fields=(), **kwargs):
+        """
+        :param fields: Collection fields
+        :type fields: sequence
+        """
+
+        super().__init__(*args, **kwargs)
+        for field in fields:
+            self.fields[field] = forms.BooleanField(
+                label=field, required=False)
+
+
+class CollectionsFetchForm(forms.Form):
+    """Form fetching new collections: All the resource types of
+    `INGEST_RESOURCE_TYPES` setting are fetched by default.
+    """
+
+    resource_type = forms.ChoiceField(
+        choices=[('', 'all')] + [(name, name) for name in swapi.RESOURCES],
+        required=False)
@@ -0,0 +1,182 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Mapping, Optional
+
+from django.conf import settings
+
+log = logging.getLogger('portal')
+
+
+class HTTPCache(object):
+    """On-disk cache of HTTP JSON responses keyed by URL.
+
+    Every entry is stored in a separate file together with the response
+    validators (`ETag`, `Last-Modified`), so the next request of the URL
+    can be conditional. Entries without validators are served without
+    any request while they are fresh.
+
+    Entry attributes:
+        - url: Requested URL
+        - etag: Value of `ETag` header or None
+        - last_modified: Value of `Last-Modified` header or None
+        - stored: Timestamp of the last successful (re)validation
+        - data: Parsed JSON response body
+    """
+
+    def __init__(self, directory: str, freshness: float = 0):
+        """
+        :param directory: Directory where the entries are stored.
+            It is created if it does not exist
+        :type directory: str
+        :param freshness: Number of seconds an entry without validators
+            is served without any request
+        :type freshness: float
+        """
+
+        self.directory = directory
+        self.freshness = freshness
+
+    @classmethod
+    def from_settings(cls) -> Optional['HTTPCache']:
+        """Create the cache configured by `SWAPI_HTTP_CACHE_DIR` and
+        `SWAPI_HTTP_CACHE_FRESHNESS` settings
+
+        :return: HTTP cache. If `SWAPI_HTTP_CACHE_DIR` is not set,
+            returns None
+        :rtype: HTTPCache, optional
+        """
+
+        directory = getattr(settings, 'SWAPI_HTTP_CACHE_DIR', None)
+        if not directory:
+            return
+        return cls(
+            directory,
+            getattr(settings, 'SWAPI_HTTP_CACHE_FRESHNESS', 0))
+
+    def get(self, url: str) -> Optional[dict]:
+        """Get cache entry of the URL
+
+        :param url: Requested URL
+        :type url: str
+        :return: Cache entry. If there is no (readable) entry,
+            returns None
+        :rtype: dict, optional
+        """
+
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.error('Error reading HTTP cache entry: %s', e)
+            return
+        if entry.get('url') != url:
+            return
+        return entry
+
+    def set(self, url: str, data, headers: Mapping[str, str]) -> dict:
+        """Store the response of the URL
+
+        :param url: Requested URL
+        :type url: str
+        :param data: Parsed JSON response body
+        :param headers: Response headers
+        :type headers: mapping
+        :return: Stored cache entry
+        :rtype: dict
+        """
+
+        entry = {
+            'url': url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'stored': time.time(),
+            'data': data,
+        }
+        self._write(entry)
+        return entry
+
+    def touch(self, entry: dict):
+        """Mark the entry as revalidated now
+
+        :param entry: Cache entry
+        :type entry: dict
+        """
+
+        entry['stored'] = time.time()
+        self._write(entry)
+
+    def is_fresh(self, entry: dict) -> bool:
+        """Check, if the entry can be used without any request: It has
+        no validators and it is within the freshness window.
+
+        :param entry: Cache entry
+        :type entry: dict
+        :rtype: bool
+        """
+
+        if entry['etag'] or entry['last_modified']:
+            return False
+        return time.time() - entry['stored'] < self.freshness
+
+    @staticmethod
+    def conditional_headers(entry: Optional[dict]) -> dict:
+        """Get headers of conditional request for the entry
+
+        :param entry: Cache entry
+        :type entry: dict, optional
+        :return: `If-None-Match` and `If-Modified-Since` headers
+        :rtype: dict
+        """
+
+        headers = {}
+        if entry is None:
+            return headers
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def clear(self):
+        """Remove all the entries"""
+
+        if not os.path.isdir(self.directory):
+            return
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith('.json'):
+                os.remove(os.path.join(self.directory, file_name))
+
+    def _path(self, url: str) -> str:
+        """Path of entry file of the URL"""
+
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, '%s.json' % digest)
+
+    def _write(self, entry: dict):
+        """Write the entry atomically: Concurrent readers never see
+        partially written entry. The cache is optional, so write errors
+        (e.g. full disk) are just logged.
+        """
+
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(entry['url']))
+            tmp_path = None
+        except OSError as e:
+            log.error('Error writing HTTP cache entry: %s', e)
+        finally:
+            if tmp_path is not None:
+                with contextlib.suppress(OSError):
+                    os.remove(tmp_path)
@@ -0,0 +1,643 @@
+import asyncio
+import csv
+import datetime
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import dateutil.parser
+import petl as etl
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+
+from portal import enrich
+from portal import instrument
+from portal import storage
+from portal import swapi
+
+log = logging.getLogger('portal')
+
+# Fields of resources identifying the source resource and its version.
+# They are stored within `keys` sidecar file of the collection.
+KEY_FIELDS = ('url', 'edited')
+# ISO 8601 timestamp: date, time and optional fraction and time zone
+ISO_TIMESTAMP_RE = re.compile(
+    r'([0-9]{4})-([0-9]{2})-([0-9]{2})'
+    r'T([0-9]{2}):([0-9]{2}):([0-9]{2})(?:\.[0-9]+)?'
+    r'(?:Z|[+-][0-9]{2}:?[0-9]{2})?')
+
+
+def collection_ingest(
+        previous_file_name: Optional[str] = None,
+        resource_type: str = 'people',
+        index: Optional[enrich.ResourceIndex] = None,
+        indexed: bool = False) -> Optional[str]:
+    """Fetch new collection data and load it into collection file.
+
+    - Get pages of resources of the type and the resources they
+        reference from SW API (see `SWAPI_HOMEWORLD_RESOLUTION` setting)
+    - Transform the data (see `swapi.RESOURCES` for the schema)
+        - Parse date of edited column
+        - Replace URL references of enriched fields (see
+            `INGEST_ENRICHED_FIELDS` setting) by names of referenced
+            resources (see `enrich.EnrichmentStage`)
+        - Cut other reference fields and the fields common to all
+            resources (see `swapi.RESOURCE_FIELDS`)
+    - Load the data into CSV file and the keys of resources into its
+        `keys` sidecar file. Write sidecar files of the storage backend
+        (see `COLLECTION_STORAGE_BACKEND` setting) and value counts of
+        every field
+    - Store the files under content-addressed name (see
+        `storage.collection_store`)
+
+    The collection is written page by page as the pages arrive
+    (see `swapi.SWAPI.resource_pages_iter`): Just a few pages are kept
+    in memory. Fields of resources are taken from the first page.
+    Files are written under temporary names, so nothing is left when
+    the ingestion fails.
+
+    Incremental mode: When previous collection is given, resources
+    whose `url` and `edited` match the previous collection are not
+    transformed again: their rows are reused from the previous
+    collection file. In lazy mode, just resources referenced by changed
+    resources are requested.
+
+    :param previous_file_name: Name of the previous collection file
+        used for incremental ingestion
+    :type previous_file_name: str, optional
+    :param resource_type: Resource type of the collection
+    :type resource_type: str
+    :param index: Index of referenced resources shared with other
+        ingestions. A new one is used by default
+    :type index: enrich.ResourceIndex, optional
+    :param indexed: Add the resources into the index as the pages
+        arrive (they are referenced by other ingestions, see
+        `_pages_index`)
+    :type indexed: bool
+    :return: Name of the collection file within `MEDIA_ROOT`.
+        In case of Star Wars API error, returns None
+    :rtype: str, optional
+    """
+
+    s = swapi.get_client()
+    stage = enrich.EnrichmentStage(
+        _references_get(resource_type),
+        index if index is not None else enrich.index_create(s))
+
+    with ThreadPoolExecutor(
+            max_workers=max(1, len(stage.resource_types))) as executor:
+        # Resource lists are fetched along with the first page
+        stage.index.lists_prefetch(stage.resource_types, executor)
+        try:
+            pages = s.resource_pages_iter(resource_type)
+            if indexed:
+                pages = _pages_index(pages, resource_type, stage.index)
+            return _collection_write(
+                pages, swapi.RESOURCES[resource_type], stage,
+                previous_file_name)
+        except swapi.SWAPIError as e:
+            log.error('Error processing Star Wars API request: %s', e)
+            return
+
+
+def collections_ingest(
+        previous_file_names: Dict[str, Optional[str]]
+) -> Dict[str, Optional[str]]:
+    """Ingest collections of several resource types concurrently (see
+    `collection_ingest`). The ingestions share the SWAPI client (its
+    connection pool and caches) and the index of referenced resources,
+    so every referenced resource is fetched once for all of them.
+
+    Resource types referenced by other ingested types are ingested
+    first and their resources are added into the index as the pages
+    arrive (see `_ingestion_waves`), so they are not fetched again to
+    enrich the referencing types.
+
+    :param previous_file_names: Names of the previous collection files
+        used for incremental ingestion by resource type. Resource types
+        without previous collection map to None
+    :type previous_file_names: dict
+    :return: Names of the collection files by resource type. In case
+        of error, the name is None
+    :rtype: dict
+    """
+
+    index = enrich.index_create(swapi.get_client())
+    waves, referenced = _ingestion_waves(previous_file_names)
+    futures = {}
+    for wave in waves:
+        with ThreadPoolExecutor(
+                max_workers=len(wave),
+                thread_name_prefix='ingest-resource') as executor:
+            futures.update({
+                resource_type: executor.submit(
+                    instrument.context_bind(collection_ingest),
+                    previous_file_names[resource_type], resource_type,
+                    index, resource_type in referenced)
+                for resource_type in wave})
+
+    file_names = {}
+    for resource_type in previous_file_names:
+        future = futures[resource_type]
+        try:
+            file_names[resource_type] = future.result()
+        except Exception:
+            log.exception('Ingestion error: %s', resource_type)
+            file_names[resource_type] = None
+    return file_names
+
+
+async def collection_ingest_async(
+        previous_file_name: Optional[str] = None,
+        resource_type: str = 'people',
+        index: Optional[enrich.ResourceIndex] = None,
+        indexed: bool = False) -> Optional[str]:
+    """Asynchronous version of `collection_ingest`: Star Wars API is
+    requested by asynchronous client (see `swapi.AsyncSWAPI`),
+    collection files are read and written on worker threads.
+
+    The collection is written page by page as well: Every page is
+    fetched and its references are indexed on the event loop (see
+    `_pages_prepare`), then it is written on the worker thread.
+
+    :param previous_file_name: Name of the previous collection file
+        used for incremental ingestion
+    :type previous_file_name: str, optional
+    :param resource_type: Resource type of the collection
+    :type resource_type: str
+    :param index: Index of referenced resources shared with other
+        ingestions. A new one is used by default
+    :type index: enrich.ResourceIndex, optional
+    :param indexed: Add the resources into the index as the pages
+        arrive
+    :type indexed: bool
+    :return: Name of the collection file within `MEDIA_ROOT`.
+        In case of Star Wars API error, returns None
+    :rtype: str, optional
+    """
+
+    s = swapi.get_async_client()
+    schema = swapi.RESOURCES[resource_type]
+    stage = enrich.EnrichmentStage(
+        _references_get(resource_type),
+        index if index is not None else enrich.index_create(s))
+    previous_header, previous_keys = None, {}
+    if previous_file_name:
+        previous_header, previous_keys = await sync_to_async(
+            _previous_keys_get, thread_sensitive=False)(previous_file_name)
+
+    pages = s.resource_pages_iter(resource_type)
+    if indexed:
+        pages = _pages_index_async(pages, resource_type, stage.index)
+    pages = _pages_prepare(
+        pages, schema, stage, previous_header, previous_keys)
+    try:
+        # Referenced resources of every page are indexed before the
+        # page is written, so the stage does not request anything on
+        # the worker thread
+        return await sync_to_async(
+            _collection_write, thread_sensitive=False)(
+            _pages_sync_iter(pages), schema, stage, previous_file_name)
+    except swapi.SWAPIError as e:
+        log.error('Error processing Star Wars API request: %s', e)
+        return
+    finally:
+        await pages.aclose()
+
+
+async def collections_ingest_async(
+        previous_file_names: Dict[str, Optional[str]]
+) -> Dict[str, Optional[str]]:
+    """Asynchronous version of `collections_ingest`: The collections
+    of every wave are ingested concurrently on the event loop.
+
+    :param previous_file_names: Names of the previous collection files
+        by resource type
+    :type previous_file_names: dict
+    :return: Names of the collection files by resource type
+    :rtype: dict
+    """
+
+    index = enrich.index_create(swapi.get_async_client())
+    waves, referenced = _ingestion_waves(previous_file_names)
+    results = {}
+    for wave in waves:
+        results.update(zip(wave, await asyncio.gather(*(
+            collection_ingest_async(
+                previous_file_names[resource_type], resource_type, index,
+                resource_type in referenced)
+            for resource_type in wave), return_exceptions=True)))
+
+    file_names = {}
+    for resource_type in previous_file_names:
+        result = results[resource_type]
+        if isinstance(result, Exception):
+            log.error('Ingestion error: %s', resource_type,
+                      exc_info=result)
+            result = None
+        file_names[resource_type] = result
+    return file_names
+
+
+def _ingestion_waves(resource_types) -> Tuple[List[list], set]:
+    """Order ingestions of the resource types into waves: Resource
+    types referenced by enriched fields (see `_references_get`) of
+    other types are ingested in earlier waves than the referencing
+    types. Types referencing each other are ingested within the same
+    wave.
+
+    :param resource_types: Iterable of ingested resource types
+    :type resource_types: iterable
+    :return: Tuple of list of waves (lists of resource types) and set
+        of resource types referenced by other ingested types
+    :rtype: tuple
+    """
+
+    resource_types = list(resource_types)
+    references = {
+        resource_type: set(_references_get(resource_type).values())
+        & set(resource_types) - {resource_type}
+        for resource_type in resource_types}
+    referenced = set().union(*references.values())
+
+    # Resource types reachable by references from every type
+    reachable = {}
+    for resource_type in resource_types:
+        reached, stack = set(), list(references[resource_type])
+        while stack:
+            t = stack.pop()
+            if t not in reached:
+                reached.add(t)
+                stack.extend(references[t])
+        reachable[resource_type] = reached
+
+    # The type is ingested once all the types it reaches are ingested,
+    # except the types reaching it back
+    waves = []
+    remaining = resource_types
+    while remaining:
+        wave = [
+            resource_type for resource_type in remaining
+            if all(resource_type in reachable[t]
+                   for t in reachable[resource_type] if t in remaining)]
+        waves.append(wave)
+        remaining = [t for t in remaining if t not in wave]
+    return waves, referenced
+
+
+def _pages_index(
+        pages: Iterator[list], resource_type: str,
+        index: enrich.ResourceIndex) -> Iterator[list]:
+    """Add resources of every page into the index as the pages pass.
+    Once all the pages passed, the list of the resource type is
+    indexed (see `enrich.ResourceIndex.list_indexed`).
+
+    :param pages: Iterator of lists of dicts representing SW resource
+        data
+    :type pages: iterator
+    :param resource_type: Resource type of the pages
+    :type resource_type: str
+    :param index: Index of referenced resources
+    :type index: enrich.ResourceIndex
+    :return: Iterator of the pages
+    :rtype: iterator
+    """
+
+    for records in pages:
+        index.add({r['url']: r for r in records if r.get('url')})
+        yield records
+    index.list_indexed(resource_type)
+
+
+async def _pages_index_async(
+        pages: AsyncIterator[list], resource_type: str,
+        index: enrich.ResourceIndex) -> AsyncIterator[list]:
+    """Asynchronous version of `_pages_index`"""
+
+    try:
+        async for records in pages:
+            index.add({r['url']: r for r in records if r.get('url')})
+            yield records
+    finally:
+        await pages.aclose()
+    index.list_indexed(resource_type)
+
+
+async def _pages_prepare(
+        pages: AsyncIterator[list], schema: swapi.ResourceSchema,
+        stage: enrich.EnrichmentStage, previous_header: Optional[tuple],
+        previous_keys: dict) -> AsyncIterator[list]:
+    """Index resources referenced by changed resources of every page
+    before the page is passed on (see `collection_ingest_async`). In
+    prefetch mode, resource lists are fetched along with the first
+    page.
+
+    :param pages: Asynchronous iterator of lists of dicts representing
+        SW resource data
+    :type pages: async iterator
+    :param schema: Schema of the resource type
+    :type schema: swapi.ResourceSchema
+    :param stage: Enrichment stage of URL references of the resources
+    :type stage: enrich.EnrichmentStage
+    :param previous_header: Header of the previous collection
+    :type previous_header: tuple, optional
+    :param previous_keys: Previous collection keys (see
+        `_previous_keys_get`)
+    :type previous_keys: dict
+    :return: Asynchronous iterator of the pages
+    :raises swapi.SWAPIError: In case of Star Wars API error
+    """
+
+    try:
+        if stage.index.prefetch:
+            records, _ = await asyncio.gather(
+                pages.__anext__(), stage.prepare_async([]))
+        else:
+            records = await pages.__anext__()
+        _, header = _header_get(records, schema, stage)
+        if previous_header != header:
+            previous_keys = {}
+        while True:
+            with instrument.span('ingest.enrich'):
+                await stage.prepare_async(
+                    r for r in records if _record_changed(r, previous_keys))
+            yield records
+            try:
+                records = await pages.__anext__()
+            except StopAsyncIteration:
+                return
+    finally:
+        await pages.aclose()
+
+
+def _pages_sync_iter(pages: AsyncIterator[list]) -> Iterator[list]:
+    """Iterate the asynchronous iterator of pages on worker thread
+    started by `sync_to_async`: Every page is awaited on the event
+    loop.
+
+    :param pages: Asynchronous iterator of pages
+    :type pages: async iterator
+    :return: Iterator of the pages
+    :rtype: iterator
+    """
+
+    async def page_next():
+        try:
+            return await pages.__anext__()
+        except StopAsyncIteration:
+            return
+
+    while True:
+        records = async_to_sync(page_next)()
+        if records is None:
+            return
+        yield records
+
+
+def _collection_write(
+        pages, schema: swapi.ResourceSchema, stage: enrich.EnrichmentStage,
+        previous_file_name: Optional[str]) -> str:
+    """Transform resources page by page, merge them with unchanged rows
+    of the previous collection and store the collection files
+
+    :param pages: Iterable of lists of dicts representing SW resource
+        data
+    :type pages: iterable
+    :param schema: Schema of the resource type
+    :type schema: swapi.ResourceSchema
+    :param stage: Enrichment stage of URL references of the resources
+    :type stage: enrich.EnrichmentStage
+    :param previous_file_name: Name of the previous collection file
+        used for incremental ingestion
+    :type previous_file_name: str, optional
+    :return: Name of the collection file within `MEDIA_ROOT`
+    :rtype: str
+    :raises swapi.SWAPIError: In case of Star Wars API error
+    """
+
+    previous_header, previous_keys = None, {}
+    if previous_file_name:
+        previous_header, previous_keys = _previous_keys_get(
+            previous_file_name)
+
+    temp_name = storage.collection_temp_name()
+    try:
+        with open(storage.collection_path(temp_name), 'w',
+                  newline='', encoding='utf-8') as f, \
+                open(storage.collection_path(temp_name, 'keys'), 'w',
+                     newline='', encoding='utf-8') as f_keys:
+            writer, writer_keys = csv.writer(f), csv.writer(f_keys)
+            writer_keys.writerow(KEY_FIELDS)
+            header = None
+            records_count = records_changed_count = 0
+            for records in pages:
+                if header is None:
+                    fields, header = _header_get(records, schema, stage)
+                    if previous_keys and previous_header != header:
+                        log.info('Collection header changed: incremental '
+                                 'ingestion is not possible')
+                        previous_keys = {}
+                    writer.writerow(header)
+
+                # Transform changed resources and merge them with
+                # unchanged rows respecting the order of resources
+                records_changed = [
+                    r for r in records if _record_changed(r, previous_keys)]
+                with instrument.span('ingest.enrich'):
+                    stage.prepare(records_changed)
+                rows_changed = iter(etl.data(_records_transform(
+                    records_changed, schema, stage, fields)))
+                with instrument.span('ingest.previous'):
+                    rows_previous = _previous_rows_read(
+                        previous_file_name,
+                        [previous_keys[r['url']][1] for r in records
+                         if not _record_changed(r, previous_keys)])
+                # Tables are lazy: the rows are transformed while they
+                # are written
+                with instrument.span('ingest.write'):
+                    writer.writerows(
+                        next(rows_changed)
+                        if _record_changed(r, previous_keys)
+                        else rows_previous[previous_keys[r['url']][1]]
+                        for r in records)
+                    writer_keys.writerows(
+                        etl.data(etl.fromdicts(records, header=KEY_FIELDS)))
+                records_count += len(records)
+                records_changed_count += len(records_changed)
+        if header is None:
+            raise swapi.SWAPIError('No resources')
+        log.info('Resources changed: %s of %s',
+                 records_changed_count, records_count)
+
+        with instrument.span('ingest.store'):
+            storage.backend_get().sidecars_write(temp_name)
+            storage.collection_counts_write(temp_name)
+            return storage.collection_store(temp_name)
+    finally:
+        storage.collection_delete(temp_name)
+
+
+def _references_get(resource_type: str) -> dict:
+    """Get resource types referenced by fields of the resource type
+    enriched by the ingestion (see `INGEST_ENRICHED_FIELDS` setting)
+
+    :param resource_type: Resource type of the collection
+    :type resource_type: str
+    :return: Referenced resource types by field
+    :rtype: dict
+    """
+
+    references = swapi.RESOURCES[resource_type].references
+    return {
+        field: references[field]
+        for field in settings.INGEST_ENRICHED_FIELDS.get(resource_type, ())}
+
+
+def _header_get(
+        records: list, schema: swapi.ResourceSchema,
+        stage: enrich.EnrichmentStage) -> Tuple[tuple, tuple]:
+    """Get fields of resources and the collection header
+
+    :param records: List of dicts representing SW resource data
+    :type records: list
+    :param schema: Schema of the resource type
+    :type schema: swapi.ResourceSchema
+    :param stage: Enrichment stage of URL references of the resources
+    :type stage: enrich.EnrichmentStage
+    :return: Tuple of resource fields and collection header
+    :rtype: tuple
+    """
+
+    fields = etl.header(etl.fromdicts(records))
+    return fields, etl.header(
+        _records_transform([], schema, stage, fields))
+
+
+def _records_transform(
+        records: list, schema: swapi.ResourceSchema,
+        stage: enrich.EnrichmentStage, fields: tuple):
+    """Transform resources. The transformation is derived from the
+    schema of the resource type: Resources referenced by enriched
+    fields must be indexed already (see
+    `enrich.EnrichmentStage.prepare`), other reference fields are cut
+    out.
+
+    :param records: List of dicts representing SW resource data
+    :type records: list
+    :param schema: Schema of the resource type
+    :type schema: swapi.ResourceSchema
+    :param stage: Enrichment stage of URL references of the resources
+    :type stage: enrich.EnrichmentStage
+    :param fields: Fields of the resources
+    :type fields: tuple
+    :return: Transformed table
+    :rtype: petl.Table
+    """
+
+    with instrument.span('ingest.dates'):
+        dates = _dates_parse([r.get('edited') for r in records])
+    table = etl.fromdicts(records, header=fields).addcolumn('date', dates)
+    return stage.apply(table).cutout(*(
+        f for f in fields
+        if f in swapi.RESOURCE_FIELDS
+        or f in schema.references and f not in stage.references))
+
+
+def _dates_parse(values: list) -> list:
+    """Parse dates of timestamps (`%Y-%m-%d` format).
+
+    SWAPI timestamps are ISO 8601 (e.g. `2014-12-20T21:17:56.891000Z`),
+    so the date is just their valid prefix. Other values are parsed by
+    `dateutil.parser`. Every distinct value is parsed once.
+
+    :param values: Timestamps
+    :type values: list
+    :return: Dates in the order of timestamps
+    :rtype: list
+    """
+
+    dates = {}
+    for value in values:
+        if value in dates:
+            continue
+        match = ISO_TIMESTAMP_RE.fullmatch(value) \
+            if isinstance(value, str) else None
+        date = None
+        if match:
+            try:
+                datetime.datetime(*map(int, match.groups()))
+                date = value[:10]
+            except ValueError:
+                pass
+        if date is None:
+            date = dateutil.parser.parse(value).strftime('%Y-%m-%d')
+        dates[value] = date
+    return [dates[value] for value in values]
+
+
+def _record_changed(record: dict, previous_keys: dict) -> bool:
+    """Check, if the resource is not within previous collection or was
+    edited since then
+
+    :param record: Dict representing SW resource data
+    :type record: dict
+    :param previous_keys: Previous collection keys (see
+        `_previous_keys_get`)
+    :type previous_keys: dict
+    :rtype: bool
+    """
+
+    previous = previous_keys.get(record.get('url'))
+    return previous is None or previous[0] != record.get('edited')
+
+
+def _previous_keys_get(file_name: str) -> Tuple[Optional[tuple], dict]:
+    """Get header and keys of rows of previous collection
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str
+    :return: Tuple of the collection header and dict of tuples
+        (`edited`, row index) by resource `url`. If the collection, its
+        keys or its row index are not available, returns (None, {})
+    :rtype: tuple
+    """
+
+    path_keys = storage.collection_path(file_name, 'keys')
+    rows_count = storage.collection_rows_count(file_name)
+    if rows_count is None or not os.path.exists(path_keys):
+        return None, {}
+    table_keys = etl.fromcsv(path_keys)
+    keys = {
+        url: (edited, index)
+        for index, (url, edited) in enumerate(etl.data(table_keys))}
+    if etl.header(table_keys) != KEY_FIELDS or len(keys) != rows_count:
+        log.error('Inconsistent keys of collection %s', file_name)
+        return None, {}
+    return tuple(storage.collection_header(file_name)), keys
+
+
+def _previous_rows_read(file_name: Optional[str], indices: list) -> dict:
+    """Read rows of previous collection. Consecutive rows are read
+    at once using the row index.
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str, optional
+    :param indices: Indices of the rows
+    :type indices: list
+    :return: Dict of rows by their index
+    :rtype: dict
+    """
+
+    rows = {}
+    indices = sorted(indices)
+    while indices:
+        start = stop = indices[0]
+        while stop - start < len(indices) and indices[stop - start] == stop:
+            stop += 1
+        rows.update(zip(
+            range(start, stop),
+            storage.collection_rows_read(file_name, start, stop)))
+        indices = indices[stop - start:]
+    return rows
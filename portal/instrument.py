@@ -0,0 +1,401 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Sequence
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+log = logging.getLogger('portal.timing')
+
+# Upper bounds of histogram buckets in seconds
+BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+    30)
+# Span of disabled instrumentation: reusable context manager doing
+# nothing
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Histogram(object):
+    """Prometheus histogram: Counts of observed values within
+    cumulative buckets, their sum and count by label values. Metrics
+    are kept by the process, so every server worker process exposes
+    its own ones.
+    """
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str],
+                 buckets: Sequence[float] = BUCKETS):
+        """
+        :param name: Metric name
+        :type name: str
+        :param documentation: Metric description
+        :type documentation: str
+        :param labelnames: Label names
+        :type labelnames: sequence
+        :param buckets: Upper bounds of the buckets
+        :type buckets: sequence
+        """
+
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Bucket counts, sum and count by label values
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str):
+        """Observe the value
+
+        :param value: Observed value (e.g. duration in seconds)
+        :type value: float
+        :param labelvalues: Values of the labels
+        :type labelvalues: str
+        """
+
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [
+                    [0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> Iterator[str]:
+        """Render the histogram in Prometheus text exposition format
+
+        :return: Lines of the histogram
+        :rtype: iterator
+        """
+
+        yield '# HELP %s %s' % (self.name, self.documentation)
+        yield '# TYPE %s histogram' % self.name
+        with self._lock:
+            series = sorted(
+                (labelvalues, (list(counts), total, count))
+                for labelvalues, (counts, total, count)
+                in self._series.items())
+        for labelvalues, (counts, total, count) in series:
+            labels = list(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield '%s_bucket%s %s' % (
+                    self.name, _labels_format(labels + [('le', bound)]),
+                    cumulative)
+            yield '%s_bucket%s %s' % (
+                self.name, _labels_format(labels + [('le', '+Inf')]), count)
+            yield '%s_sum%s %r' % (self.name, _labels_format(labels), total)
+            yield '%s_count%s %s' % (
+                self.name, _labels_format(labels), count)
+
+
+REQUEST_DURATION = Histogram(
+    'portal_request_duration_seconds', 'Duration of HTTP requests.',
+    ('view', 'method', 'status'))
+SPAN_DURATION = Histogram(
+    'portal_span_duration_seconds',
+    'Duration of instrumented stages of views, SWAPI requests and '
+    'ingestion.',
+    ('span',))
+HISTOGRAMS = (REQUEST_DURATION, SPAN_DURATION)
+
+
+def _labels_format(labels: list) -> str:
+    """Format labels of a sample"""
+
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', r'\\')
+                     .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels)
+
+
+def metrics_render() -> str:
+    """Render all the metrics in Prometheus text exposition format
+
+    :return: Metrics
+    :rtype: str
+    """
+
+    return ''.join(
+        '%s\n' % line for histogram in HISTOGRAMS
+        for line in histogram.render())
+
+
+class Timings(object):
+    """Durations of spans within one request (or ingestion job).
+    Spans of the same name are summed up. Spans are recorded into the
+    timings of the current context (see `timings_collect`), timings of
+    a nested context are recorded into the outer one as well.
+    """
+
+    def __init__(self, parent: Optional['Timings'] = None):
+        """
+        :param parent: Timings of the outer context
+        :type parent: Timings, optional
+        """
+
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.duration = None
+        # (name, duration) pairs. Spans may be added by several threads
+        # (appending to list is atomic)
+        self.spans = []
+
+    def add(self, name: str, duration: float):
+        """Add duration of the span
+
+        :param name: Span name
+        :type name: str
+        :param duration: Duration in seconds
+        :type duration: float
+        """
+
+        self.spans.append((name, duration))
+        if self.parent is not None:
+            self.parent.add(name, duration)
+
+    def stop(self) -> float:
+        """Stop timing
+
+        :return: Total duration in seconds
+        :rtype: float
+        """
+
+        self.duration = time.perf_counter() - self.start
+        return self.duration
+
+    def summary(self) -> Dict[str, dict]:
+        """Sum up the spans
+
+        :return: Total duration (in seconds) and count of spans by name
+            in the order of their first occurrence
+        :rtype: dict
+        """
+
+        summary = {}
+        for name, duration in list(self.spans):
+            span = summary.setdefault(name, {'duration': 0.0, 'count': 0})
+            span['duration'] += duration
+            span['count'] += 1
+        return summary
+
+    def record(self) -> dict:
+        """Structured record of the timings (durations in milliseconds)
+
+        :rtype: dict
+        """
+
+        return {
+            'duration': _ms(self.duration),
+            'spans': {
+                name: {'duration': _ms(span['duration']),
+                       'count': span['count']}
+                for name, span in self.summary().items()}}
+
+    def server_timing(self) -> str:
+        """Value of `Server-Timing` response header: Metric of every
+        span (with count of spans as description if there are more of
+        them) and `total` metric
+
+        :rtype: str
+        """
+
+        metrics = [
+            '%s;dur=%.1f%s' % (
+                name, span['duration'] * 1000,
+                ';desc="x%s"' % span['count'] if span['count'] > 1 else '')
+            for name, span in self.summary().items()]
+        if self.duration is not None:
+            metrics.append('total;dur=%.1f' % (self.duration * 1000))
+        return ', '.join(metrics)
+
+    def log_format(self) -> str:
+        """Spans formatted for log message"""
+
+        return ', '.join(
+            '%s=%.1f ms%s' % (
+                name, span['duration'] * 1000,
+                ' (x%s)' % span['count'] if span['count'] > 1 else '')
+            for name, span in self.summary().items())
+
+
+# Timings of the current request (or ingestion job)
+_timings = contextvars.ContextVar('portal_timings', default=None)
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def enabled() -> bool:
+    """Instrumentation is enabled by `INSTRUMENTATION_ENABLED` setting"""
+
+    return settings.INSTRUMENTATION_ENABLED
+
+
+class Span(object):
+    """Context manager timing a stage: Its duration is observed by
+    `SPAN_DURATION` histogram and added into the timings of the
+    current context
+    """
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        duration = time.perf_counter() - self.start
+        SPAN_DURATION.observe(duration, self.name)
+        timings = _timings.get()
+        if timings is not None:
+            timings.add(self.name, duration)
+
+
+def span(name: str):
+    """Time a stage (see `Span`). When instrumentation is disabled,
+    no-op context manager is returned.
+
+    :param name: Span name (e.g. `swapi.request`)
+    :type name: str
+    :return: Context manager
+    """
+
+    if not settings.INSTRUMENTATION_ENABLED:
+        return _NULL_SPAN
+    return Span(name)
+
+
+def context_bind(func: Callable) -> Callable:
+    """Bind the function to timings of the current context, so spans of
+    the function called on another thread (e.g. by executor) are
+    recorded within them
+
+    :param func: Function
+    :type func: callable
+    :return: The function itself if there are no timings
+    :rtype: callable
+    """
+
+    timings = _timings.get()
+    if timings is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _timings.set(timings)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _timings.reset(token)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def timings_collect(name: str) -> Iterator[Optional[Timings]]:
+    """Collect timings of spans within the context (e.g. ingestion
+    job). The total duration is observed as span of the name. Timings
+    are logged as structured record (`timing` attribute of the record).
+
+    :param name: Name of the timed context
+    :type name: str
+    :return: Timings. When instrumentation is disabled, None
+    """
+
+    if not settings.INSTRUMENTATION_ENABLED:
+        yield None
+        return
+
+    timings = Timings(_timings.get())
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+        duration = timings.stop()
+        SPAN_DURATION.observe(duration, name)
+        if timings.parent is not None:
+            timings.parent.add(name, duration)
+        log.info('%s timing: %.1f ms (%s)', name, duration * 1000,
+                 timings.log_format(),
+                 extra={'timing': dict(timings.record(), name=name)})
+
+
+class TimingMiddleware(object):
+    """Middleware timing requests and spans of their processing (see
+    `span`):
+        - `Server-Timing` response header
+        - Structured log record (`timing` attribute of the record)
+        - `REQUEST_DURATION` histogram by view name, method and status
+
+    The middleware is not used at all if `INSTRUMENTATION_ENABLED`
+    setting is off.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable):
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the middleware as coroutine function (the same way
+            # as `django.utils.deprecation.MiddlewareMixin`)
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timings = Timings()
+        token = _timings.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self._response_timed(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = Timings()
+        token = _timings.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self._response_timed(request, response, timings)
+
+    def _response_timed(self, request, response, timings: Timings):
+        """Report timings of the request"""
+
+        duration = timings.stop()
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unknown'
+        REQUEST_DURATION.observe(
+            duration, view, request.method, str(response.status_code))
+        response['Server-Timing'] = timings.server_timing()
+        record = dict(
+            timings.record(), method=request.method, path=request.path,
+            view=view, status=response.status_code)
+        log.info('%s %s %s %.1f ms (%s)', request.method, request.path,
+                 response.status_code, duration * 1000,
+                 timings.log_format(), extra={'timing': record})
+        return response
@@ -0,0 +1,283 @@
+import asyncio
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Sequence, Tuple
+
+from asgiref.sync import sync_to_async
+from django import db
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from portal import ingest
+from portal import instrument
+from portal import models
+from portal import storage
+
+log = logging.getLogger('portal')
+
+_executor = None
+_executor_lock = threading.Lock()
+# Running asynchronous jobs
+_tasks = set()
+
+
+def job_submit(*cols: models.Collection):
+    """Submit ingestion job of pending collections. Collections of
+    all the resource types are ingested by one job (see
+    `ingest.collections_ingest`).
+
+    The job is processed according to `INGEST_JOB_RUNNER` setting:
+        - 'thread': on local worker thread pool
+            (`INGEST_JOB_WORKERS` threads)
+        - 'db': the collections stay pending in DB until they are
+            picked up by `manage.py ingest_worker`
+        - 'sync': immediately, within the current thread
+        - 'async': on the event loop of ASGI server; just jobs
+            submitted by asynchronous views (see `job_submit_async`),
+            others are processed as 'thread' ones
+
+    :param cols: Pending collections
+    :type cols: models.Collection
+    """
+
+    runner = settings.INGEST_JOB_RUNNER
+    if runner == 'sync':
+        job_run(*(col.pk for col in cols))
+    elif runner in ('thread', 'async'):
+        _executor_get().submit(_job_run_thread, *(col.pk for col in cols))
+
+
+def job_run(*collection_ids: int) -> int:
+    """Run ingestion job of the collections which are still pending.
+
+    Collection status is set to `running` and then to `done` or
+    `failed` according to the result. Collection file name, row count
+    and header are set when the job is done. If `INGEST_INCREMENTAL`
+    setting is on, the most recent finished collection of the same
+    resource type is used as the base of incremental ingestion.
+    Stages of the job are timed (see `instrument.timings_collect`).
+
+    :param collection_ids: IDs of the collections
+    :type collection_ids: int
+    :return: Number of collections claimed and run by the job
+    :rtype: int
+    """
+
+    claimed = _job_claim(collection_ids)
+    if not claimed:
+        return 0
+
+    log.info('Ingestion job started: %s', _job_ids_format(claimed))
+    try:
+        with instrument.timings_collect('ingest.job'):
+            file_names = ingest.collections_ingest(
+                {t: previous for t, (_, previous) in claimed.items()})
+    except Exception:
+        log.exception('Ingestion job error: %s', _job_ids_format(claimed))
+        file_names = {}
+    return _job_finish(claimed, file_names)
+
+
+async def job_submit_async(*cols: models.Collection):
+    """Submit ingestion job of pending collections from asynchronous
+    view.
+
+    With `INGEST_JOB_RUNNER` setting 'async', the job is run as a task
+    on the running event loop (see `job_run_async`): It requires ASGI
+    server, whose event loop outlives the request. Other runners are
+    processed the same way as by `job_submit`.
+
+    :param cols: Pending collections
+    :type cols: models.Collection
+    """
+
+    if settings.INGEST_JOB_RUNNER == 'async':
+        task = asyncio.get_running_loop().create_task(
+            job_run_async(*(col.pk for col in cols)))
+        # Keep reference to the task until it is done
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    else:
+        await sync_to_async(job_submit)(*cols)
+
+
+async def job_run_async(*collection_ids: int) -> int:
+    """Asynchronous version of `job_run`: Star Wars API is requested
+    on the event loop (see `ingest.collections_ingest_async`)
+
+    :param collection_ids: IDs of the collections
+    :type collection_ids: int
+    :return: Number of collections claimed and run by the job
+    :rtype: int
+    """
+
+    claimed = await sync_to_async(_job_claim)(collection_ids)
+    if not claimed:
+        return 0
+
+    log.info('Ingestion job started: %s', _job_ids_format(claimed))
+    try:
+        with instrument.timings_collect('ingest.job'):
+            file_names = await ingest.collections_ingest_async(
+                {t: previous for t, (_, previous) in claimed.items()})
+    except Exception:
+        log.exception('Ingestion job error: %s', _job_ids_format(claimed))
+        file_names = {}
+    return await sync_to_async(_job_finish)(claimed, file_names)
+
+
+def _job_claim(
+        collection_ids: Sequence[int]
+) -> Dict[str, Tuple[list, Optional[str]]]:
+    """Claim the job of the collections which are still pending: Their
+    status is set to `running` and their start date is set.
+
+    :param collection_ids: IDs of the collections
+    :type collection_ids: sequence
+    :return: Tuples of IDs of claimed collections and the previous
+        collection file name used for incremental ingestion by resource
+        type
+    :rtype: dict
+    """
+
+    claimed = {}
+    pending = models.Collection.objects.filter(
+        pk__in=collection_ids,
+        status=models.Collection.Status.PENDING,
+    ).order_by('pk').values_list('pk', 'resource_type')
+    for collection_id, resource_type in pending:
+        # The collection may be claimed by another worker meanwhile
+        if models.Collection.objects.filter(
+                pk=collection_id,
+                status=models.Collection.Status.PENDING,
+        ).update(status=models.Collection.Status.RUNNING,
+                 date_started=timezone.now()):
+            claimed.setdefault(resource_type, ([], None))[0].append(
+                collection_id)
+
+    for resource_type, (ids, _) in claimed.items():
+        previous_file_name = None
+        if settings.INGEST_INCREMENTAL:
+            previous = models.Collection.objects.filter(
+                status=models.Collection.Status.DONE,
+                resource_type=resource_type,
+            ).order_by('-date_created', '-pk').first()
+            if previous is not None:
+                previous_file_name = previous.file_name
+        claimed[resource_type] = (ids, previous_file_name)
+    return claimed
+
+
+def _job_finish(claimed: dict, file_names: Dict[str, Optional[str]]) -> int:
+    """Store the job result: Set collection file name, row count
+    and header and `done` status. Collections without file name get
+    `failed` status. Just running collections are updated: Collections
+    failed meanwhile as stale (see `stale_jobs_fail`) are kept failed
+    and the job is logged as lost.
+
+    :param claimed: Claimed collections (see `_job_claim`)
+    :type claimed: dict
+    :param file_names: Names of the collection files by resource type
+    :type file_names: dict
+    :return: Number of the collections
+    :rtype: int
+    """
+
+    count = 0
+    for resource_type, (ids, _) in claimed.items():
+        file_name = file_names.get(resource_type)
+        running = models.Collection.objects.filter(
+            pk__in=ids, status=models.Collection.Status.RUNNING)
+        if file_name:
+            updated = running.update(
+                file_name=file_name, file=file_name,
+                row_count=storage.collection_rows_count(file_name),
+                header=storage.collection_header(file_name),
+                status=models.Collection.Status.DONE)
+        else:
+            updated = running.update(
+                status=models.Collection.Status.FAILED)
+        if updated < len(ids):
+            log.warning('Ingestion job lost: %s %s: %s collection(s) '
+                        'failed as stale meanwhile',
+                        resource_type, ids, len(ids) - updated)
+        log.info('Ingestion job finished: %s %s [%s]',
+                 resource_type, ids, file_name)
+        count += len(ids)
+    return count
+
+
+def _job_ids_format(claimed: dict) -> str:
+    """Format IDs of claimed collections for logging"""
+
+    return ', '.join(
+        '%s %s' % (resource_type, ids)
+        for resource_type, (ids, _) in claimed.items())
+
+
+def stale_jobs_fail() -> int:
+    """Set `failed` status of collections whose job is stale: Running
+    or pending collections whose job was started (or submitted) more
+    than `INGEST_JOB_TIMEOUT` seconds ago, e.g. when the process was
+    killed during the job or no worker processes the DB-backed queue.
+
+    :return: Number of the collections
+    :rtype: int
+    """
+
+    deadline = timezone.now() - datetime.timedelta(
+        seconds=settings.INGEST_JOB_TIMEOUT)
+    count = models.Collection.objects.filter(
+        Q(status=models.Collection.Status.RUNNING,
+          date_started__lt=deadline)
+        # Collections claimed before the start date was stored
+        | Q(status=models.Collection.Status.RUNNING,
+            date_started__isnull=True, date_created__lt=deadline)
+        | Q(status=models.Collection.Status.PENDING,
+            date_created__lt=deadline)
+    ).update(status=models.Collection.Status.FAILED)
+    if count:
+        log.warning('Stale ingestion jobs failed: %s collection(s)', count)
+    return count
+
+
+def pending_jobs_run() -> int:
+    """Run all pending ingestion jobs (DB-backed queue processing).
+    Pending collections are ingested by one job. Stale jobs are failed
+    first (see `stale_jobs_fail`).
+
+    :return: Number of collections run
+    :rtype: int
+    """
+
+    stale_jobs_fail()
+    pending = list(models.Collection.objects.filter(
+        status=models.Collection.Status.PENDING,
+    ).order_by('date_created').values_list('pk', flat=True))
+    return job_run(*pending) if pending else 0
+
+
+def _job_run_thread(*collection_ids: int):
+    """Run the job on worker thread. DB connection of the thread is
+    closed afterwards.
+    """
+
+    try:
+        job_run(*collection_ids)
+    finally:
+        db.connection.close()
+
+
+def _executor_get() -> ThreadPoolExecutor:
+    """Get process-wide thread pool of job workers"""
+
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.INGEST_JOB_WORKERS,
+                thread_name_prefix='ingest')
+        return _executor
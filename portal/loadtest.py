@@ -0,0 +1,173 @@
+import math
+import random
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+import requests
+
+# Reported latency percentiles
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: Sequence[float], p: float) -> Optional[float]:
+    """Get percentile of the values (nearest-rank method)
+
+    :param values: Values
+    :type values: sequence
+    :param p: Percentile (0-100)
+    :type p: float
+    :return: The percentile. If there are no values, returns None
+    :rtype: float, optional
+    """
+
+    if not values:
+        return
+    values = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def load_run(request_send: Callable[[int], bool], requests_count: int,
+             concurrency: int) -> dict:
+    """Send requests at the given concurrency and measure their latency
+
+    :param request_send: Function sending i-th request. It returns False
+        (or raises an exception) on error
+    :type request_send: callable
+    :param requests_count: Number of requests
+    :type requests_count: int
+    :param concurrency: Number of requests in flight at once
+    :type concurrency: int
+    :return: Summary: number of requests and errors, duration and
+        throughput (requests per second), mean, maximum and percentiles
+        (`p50`, `p95`, `p99`) of latency in seconds
+    :rtype: dict
+    """
+
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            ok = request_send(i)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        results = list(executor.map(timed, range(requests_count)))
+    duration = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in results]
+    summary = {
+        'requests': requests_count,
+        'errors': sum(1 for _, ok in results if not ok),
+        'concurrency': concurrency,
+        'duration': duration,
+        'throughput': requests_count / duration if duration else None,
+        'mean': sum(latencies) / len(latencies) if latencies else None,
+        'max': max(latencies, default=None),
+    }
+    for p in PERCENTILES:
+        summary['p%s' % p] = percentile(latencies, p)
+    return summary
+
+
+class PortalLoadClient(object):
+    """HTTP client of portal views used by load-test scenarios. Every
+    thread has its own `requests.Session`.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 30,
+                 seed: int = 0):
+        """
+        :param base_url: Base URL of running portal server
+            (e.g. `http://127.0.0.1:8000/`)
+        :type base_url: str
+        :param timeout: Request timeout in seconds
+        :type timeout: float
+        :param seed: Seed of random page and field selection
+        :type seed: int
+        """
+
+        self.base_url = base_url
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """Session of the current thread"""
+
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def get(self, path: str, params: Optional[dict] = None) -> bool:
+        """Send GET request
+
+        :return: True if the response status is 200
+        :rtype: bool
+        """
+
+        r = self.session.get(
+            urllib.parse.urljoin(self.base_url, path), params=params,
+            timeout=self.timeout)
+        return r.status_code == 200
+
+    def collections_get(self, i: int) -> bool:
+        """Get collections list page"""
+
+        return self.get('collections/')
+
+    def collections_post(self, i: int) -> Optional[List[int]]:
+        """Fetch new collections: POST collections list page (with CSRF
+        token of the session). The ingestion job is not waited for.
+
+        :return: IDs of the new collections (`X-Collection-Ids` response
+            header). In case of error, returns None
+        :rtype: list, optional
+        """
+
+        url = urllib.parse.urljoin(self.base_url, 'collections/')
+        if 'csrftoken' not in self.session.cookies:
+            self.session.get(url, timeout=self.timeout)
+        r = self.session.post(
+            url, timeout=self.timeout,
+            headers={'X-CSRFToken': self.session.cookies.get('csrftoken', '')})
+        if r.status_code != 200:
+            return
+        return [
+            int(collection_id)
+            for collection_id in r.headers.get(
+                'X-Collection-Ids', '').split(',') if collection_id]
+
+    def detail_get(self, collection_id: int, page: int,
+                   page_size: Optional[int] = None) -> bool:
+        """Get page of collection detail"""
+
+        params = {'page': page}
+        if page_size:
+            params['page_size'] = page_size
+        return self.get(
+            'collections/%s/' % collection_id, params)
+
+    def stats_get(self, collection_id: int, fields: List[str]) -> bool:
+        """Get collection statistics of the fields"""
+
+        return self.get(
+            'collections/%s/stats/' % collection_id,
+            {field: 'on' for field in fields})
+
+    def page_choose(self, pages: int) -> int:
+        """Random page number"""
+
+        return self._random.randint(1, max(1, pages))
+
+    def fields_choose(self, header: List[str], max_fields: int = 2) -> list:
+        """Random selection of fields"""
+
+        return self._random.sample(
+            header, self._random.randint(1, min(max_fields, len(header))))
@@ -0,0 +1,96 @@
+import json
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal import benchmark
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+
+
+class Command(BaseCommand):
+    help = ('Benchmark of collection read paths: Time collection detail '
+            '(first, middle and last page) and statistics (single and '
+            'multiple fields) views on synthetic collections stored by '
+            'every storage variant')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, action='append',
+            help='Number of rows of synthetic collection. Can be '
+                 'repeated, %s by default' % ', '.join(
+                     str(s) for s in DEFAULT_SIZES))
+        parser.add_argument(
+            '--storage', action='append',
+            choices=tuple(benchmark.STORAGE_VARIANTS),
+            help='Storage variant: reparse (CSV file without sidecar '
+                 'files), csv (CSV file with row index and value counts), '
+                 'columnar (columnar file and value counts). Can be '
+                 'repeated, all by default')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Number of runs of every case')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed of random generator of collection data')
+        parser.add_argument(
+            '--json', dest='json_path', help='Write results to JSON file')
+        parser.add_argument(
+            '--compare', dest='compare_path',
+            help='Compare results with results of previous run '
+                 '(JSON file)')
+        parser.add_argument(
+            '--threshold', type=float, default=1.2,
+            help='Ratio of median timings reported as regression when '
+                 'comparing')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare_path']:
+            try:
+                with open(options['compare_path']) as f:
+                    baseline = json.load(f)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError('Cannot read results to compare: %s' % e)
+
+        results = benchmark.benchmark_run(
+            options['rows'] or DEFAULT_SIZES,
+            options['storage'] or tuple(benchmark.STORAGE_VARIANTS),
+            options['repeat'], options['seed'], self._result_write)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({
+                    'python': platform.python_version(),
+                    'repeat': options['repeat'],
+                    'seed': options['seed'],
+                    'results': results}, f, indent=2)
+
+        if baseline is not None:
+            self._comparison_write(
+                benchmark.results_compare(results, baseline),
+                options['threshold'])
+
+    def _result_write(self, result):
+        """Write result of the case"""
+
+        self.stdout.write(
+            '%8s rows  %-8s %-14s first %9.2f ms  median %9.2f ms  '
+            'min %9.2f ms' % (
+                result['rows'], result['storage'], result['case'],
+                result['first'] * 1000, result['median'] * 1000,
+                result['min'] * 1000))
+
+    def _comparison_write(self, comparison, threshold):
+        """Write comparison with previous results"""
+
+        self.stdout.write('Comparison of median timings:')
+        for result in comparison:
+            ratio = result['ratio']
+            self.stdout.write(
+                '%8s rows  %-8s %-14s %9.2f ms -> %9.2f ms  %s%s' % (
+                    result['rows'], result['storage'], result['case'],
+                    result['baseline'] * 1000, result['median'] * 1000,
+                    'x%.2f' % ratio if ratio is not None else '-',
+                    '  REGRESSION'
+                    if ratio is not None and ratio > threshold else ''))
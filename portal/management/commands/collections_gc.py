@@ -0,0 +1,48 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from portal import models
+from portal import storage
+
+
+class Command(BaseCommand):
+    help = ('Delete collection files (and their sidecar files) which are '
+            'not referenced by any collection. Files stored within '
+            'INGEST_JOB_TIMEOUT may be referenced by running ingestion '
+            'job, so they are kept')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Just list the files which would be deleted')
+        parser.add_argument(
+            '--temp-age', type=float, default=24 * 60 * 60,
+            help='Minimal age (in seconds) of temporary ingestion files '
+                 'to be deleted')
+
+    def handle(self, *args, **options):
+        referenced = set(
+            models.Collection.objects.values_list('file_name', flat=True))
+        temp_mtime_max = time.time() - options['temp_age']
+
+        orphans = []
+        for file_name in sorted(os.listdir(settings.MEDIA_ROOT)):
+            # Sidecar files belong to the collection file they extend
+            owner = '.'.join(file_name.split('.')[:2])
+            if storage.COLLECTION_FILE_RE.match(owner):
+                if owner not in referenced and \
+                        not storage.collection_recently_stored(owner):
+                    orphans.append(file_name)
+            elif storage.TEMP_FILE_RE.match(owner):
+                path = storage.collection_path(file_name)
+                if os.path.getmtime(path) < temp_mtime_max:
+                    orphans.append(file_name)
+
+        for file_name in orphans:
+            self.stdout.write('Deleting %s' % file_name)
+            if not options['dry_run']:
+                os.remove(storage.collection_path(file_name))
+        self.stdout.write('%s orphaned file(s)' % len(orphans))
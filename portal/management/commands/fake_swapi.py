@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from portal import fakeswapi
+
+
+class Command(BaseCommand):
+    help = ('Run local stand-in of Star Wars API with synthetic dataset. '
+            'Point SWAPI_HOST setting to the printed URL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host', default='127.0.0.1', help='Host to bind')
+        parser.add_argument(
+            '--port', type=int, default=8001, help='Port to bind')
+        parser.add_argument(
+            '--count', action='append', default=[],
+            metavar='RESOURCE=COUNT',
+            help='Number of resources of the type (e.g. people=5000), '
+                 'can be repeated')
+        parser.add_argument(
+            '--page-size', type=int, default=10,
+            help='Number of resources on list page')
+        parser.add_argument(
+            '--latency', type=float, default=0.0,
+            help='Delay of responses in seconds')
+        parser.add_argument(
+            '--jitter', type=float, default=0.0,
+            help='Maximum random delay added to latency in seconds')
+        parser.add_argument(
+            '--error-rate', type=float, default=0.0,
+            help='Probability of HTTP 500 response (0-1)')
+        parser.add_argument(
+            '--seed', type=int, default=0, help='Seed of random generators')
+
+    def handle(self, *args, **options):
+        try:
+            counts = fakeswapi.counts_parse(options['count'])
+        except ValueError as e:
+            raise CommandError(e)
+        if options['page_size'] < 1:
+            raise CommandError('Page size must be positive')
+
+        server = fakeswapi.FakeSWAPIServer(
+            options['host'], options['port'], counts,
+            page_size=options['page_size'],
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            seed=options['seed'])
+        self.stdout.write('Fake SWAPI: %s (%s)' % (
+            server.base_url,
+            ', '.join('%s %s' % (len(resources), resource_type)
+                      for resource_type, resources
+                      in server.dataset.resources.items())))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write('Requests: %s, injected errors: %s' % (
+                server.requests_count, server.errors_count))
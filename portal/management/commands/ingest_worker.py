@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from portal import jobs
+
+
+class Command(BaseCommand):
+    help = 'Process pending collection ingestion jobs stored in DB'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Process pending jobs and exit')
+        parser.add_argument(
+            '--interval', type=float, default=2.0,
+            help='Polling interval in seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            count = jobs.pending_jobs_run()
+            if count:
+                self.stdout.write('Processed %s collection(s)' % count)
+            if options['once']:
+                return
+            time.sleep(options['interval'])
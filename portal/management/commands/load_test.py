@@ -0,0 +1,148 @@
+import json
+import math
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from portal import loadtest
+from portal import models
+
+SCENARIOS = ('collections', 'ingest', 'detail', 'stats')
+# Interval of polling status of collections ingested by ingest scenario
+INGEST_POLL_INTERVAL = 0.1
+
+
+class Command(BaseCommand):
+    help = ('Load test of running portal server: Send requests of the '
+            'scenarios at the given concurrency and report latency '
+            'percentiles and throughput')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url', default='http://127.0.0.1:8000/',
+            help='Base URL of running portal server')
+        parser.add_argument(
+            '--scenario', action='append', choices=SCENARIOS,
+            help='Scenario: collections (list page), ingest (fetch new '
+                 'collections and wait until the ingestion job is '
+                 'finished), detail (random pages of collection detail), '
+                 'stats (random field selections of collection '
+                 'statistics). Can be repeated, all but ingest by default')
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Number of requests of every scenario')
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Number of requests in flight at once')
+        parser.add_argument(
+            '--collection', type=int,
+            help='ID of collection used by detail and stats scenarios. '
+                 'The latest finished collection by default')
+        parser.add_argument(
+            '--page-size', type=int,
+            help='Page size of detail scenario (COLLECTION_PAGE_SIZE by '
+                 'default)')
+        parser.add_argument(
+            '--timeout', type=float, default=30, help='Request timeout')
+        parser.add_argument(
+            '--ingest-timeout', type=float, default=600,
+            help='Timeout of ingestion job of ingest scenario')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Seed of random page and field selection')
+        parser.add_argument(
+            '--json', dest='json_path', help='Write results to JSON file')
+
+    def handle(self, *args, **options):
+        scenarios = options['scenario'] or [
+            s for s in SCENARIOS if s != 'ingest']
+        client = loadtest.PortalLoadClient(
+            options['base_url'], options['timeout'], options['seed'])
+        count = options['requests']
+
+        col = None
+        if {'detail', 'stats'} & set(scenarios):
+            col = self._collection_get(options['collection'])
+
+        results = {}
+        for scenario in scenarios:
+            if scenario == 'collections':
+                request_send = client.collections_get
+            elif scenario == 'ingest':
+                def request_send(i):
+                    return self._ingest(
+                        client, i, options['ingest_timeout'])
+            elif scenario == 'detail':
+                page_size = options['page_size'] or \
+                    settings.COLLECTION_PAGE_SIZE
+                pages = [
+                    client.page_choose(math.ceil(col.row_count / page_size))
+                    for _ in range(count)]
+
+                def request_send(i):
+                    return client.detail_get(
+                        col.pk, pages[i], options['page_size'])
+            else:
+                selections = [
+                    client.fields_choose(col.header) for _ in range(count)]
+
+                def request_send(i):
+                    return client.stats_get(col.pk, selections[i])
+
+            results[scenario] = loadtest.load_run(
+                request_send, count, options['concurrency'])
+            self._result_write(scenario, results[scenario])
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({
+                    'base_url': options['base_url'],
+                    'collection': col and col.pk,
+                    'results': results}, f, indent=2)
+
+    def _ingest(self, client, i, timeout):
+        """Fetch new collections and wait until their ingestion job is
+        finished (polling their status in DB)
+
+        :return: True if all the collections are done
+        """
+
+        ids = client.collections_post(i)
+        if not ids:
+            return False
+        in_progress = (
+            models.Collection.Status.PENDING,
+            models.Collection.Status.RUNNING)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            statuses = set(models.Collection.objects.filter(
+                pk__in=ids).values_list('status', flat=True))
+            if not statuses.intersection(in_progress):
+                return statuses == {models.Collection.Status.DONE}
+            time.sleep(INGEST_POLL_INTERVAL)
+        return False
+
+    def _collection_get(self, collection_id):
+        """Get finished collection with metadata"""
+
+        cols = models.Collection.objects.filter(
+            status=models.Collection.Status.DONE)
+        if collection_id is not None:
+            cols = cols.filter(pk=collection_id)
+        col = cols.order_by('-date_created', '-pk').first()
+        if col is None:
+            raise CommandError('No finished collection')
+        col.metadata_ensure()
+        return col
+
+    def _result_write(self, scenario, result):
+        """Write result of the scenario"""
+
+        self.stdout.write(
+            '%-12s %5s req %4s err  %8.1f req/s  '
+            'p50 %7.1f ms  p95 %7.1f ms  p99 %7.1f ms' % (
+                scenario, result['requests'], result['errors'],
+                result['throughput'] or 0,
+                *((result['p%s' % p] or 0) * 1000
+                  for p in loadtest.PERCENTILES)))
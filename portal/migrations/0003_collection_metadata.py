@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-17 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0002_collection_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='header',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='row_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
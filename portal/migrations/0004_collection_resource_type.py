@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-17 03:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0003_collection_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='resource_type',
+            field=models.CharField(choices=[('people', 'people'), ('planets', 'planets'), ('films', 'films'), ('species', 'species'), ('vehicles', 'vehicles'), ('starships', 'starships')], default='people', max_length=20),
+        ),
+    ]
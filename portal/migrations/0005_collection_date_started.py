@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-17 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0004_collection_resource_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='date_started',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,10 +1,53 @@
+import petl as etl
 from django.db import models
 
+from portal import storage
+from portal import swapi
+
 
 class Collection(models.Model):
+
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        RUNNING = 'running'
+        DONE = 'done'
+        FAILED = 'failed'
+
     file_name = models.CharField(max_length=200)
     date_created = models.DateTimeField(auto_now_add=True)
     file = models.FileField()
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.DONE)
+    row_count = models.PositiveIntegerField(null=True, blank=True)
+    header = models.JSONField(null=True, blank=True)
+    resource_type = models.CharField(
+        max_length=20, default='people',
+        choices=[(name, name) for name in swapi.RESOURCES])
+    date_started = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.file_name
+
+    def file_references(self):
+        """Count of collections referencing the collection file.
+        Collection files are content-addressed, so they are shared
+        by collections with identical content.
+        """
+
+        return Collection.objects.filter(file_name=self.file_name).count()
+
+    def metadata_ensure(self):
+        """Make sure `row_count` and `header` are set. They are set
+        during ingestion, but collections created before have to be
+        read once.
+        """
+
+        if self.row_count is not None and self.header is not None:
+            return
+        self.header = storage.collection_header(self.file_name)
+        self.row_count = storage.collection_rows_count(self.file_name)
+        if self.row_count is None:
+            self.row_count = etl.nrows(
+                etl.fromcsv(storage.collection_path(self.file_name)))
+        Collection.objects.filter(pk=self.pk).update(
+            row_count=self.row_count, header=self.header)
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from portal import models
+from portal import stats
+from portal import storage
+
+
+@receiver(post_delete, sender=models.Collection)
+def collection_file_release(sender, instance, **kwargs):
+    """Delete collection file (with its sidecar files) when the last
+    collection referencing it is deleted. Recently stored files may be
+    referenced by running ingestion job, so they are left to
+    `manage.py collections_gc`.
+    """
+
+    if instance.file_name and not instance.file_references() \
+            and not storage.collection_recently_stored(instance.file_name):
+        storage.collection_delete(instance.file_name)
+
+
+@receiver(post_delete, sender=models.Collection)
+def collection_stats_release(sender, instance, **kwargs):
+    """Invalidate cached statistics of deleted collection"""
+
+    stats.collection_stats_invalidate(instance.id)
@@ -0,0 +1,97 @@
+import contextlib
+import time
+from typing import Sequence
+
+from django.conf import settings
+from django.core.cache import caches
+
+from portal import storage
+
+# Django cache of collection statistics. Timeout, maximum number of
+# entries and eviction are set within `CACHES` setting
+STATS_CACHE_ALIAS = 'stats'
+
+
+def collection_stats_get(collection, fields: Sequence[str]) -> list:
+    """Get value counts of the given fields of the collection.
+
+    Collections never change, so the counts are cached by collection id
+    (and its file name) and the sorted field set: Any order of the same
+    fields is served from the same cache entry without reading the
+    collection files. Cache keys include the statistics version of the
+    collection (see `collection_stats_invalidate`).
+
+    :param collection: Collection
+    :type collection: models.Collection
+    :param fields: Field names
+    :type fields: sequence
+    :return: List of tuples: values of the fields and count.
+        The most common values first
+    :rtype: list
+    """
+
+    key = tuple(sorted(fields))
+    cache = _cache_get()
+    cache_key = _cache_key(
+        collection.id, _version_get(cache, collection.id),
+        collection.file_name, key)
+    rows = cache.get(cache_key)
+    if rows is None:
+        rows = storage.collection_value_counts(collection.file_name, key)
+        cache.set(cache_key, rows)
+    if key == tuple(fields):
+        return rows
+    order = [key.index(f) for f in fields] + [len(key)]
+    return [tuple(row[i] for i in order) for row in rows]
+
+
+def collection_stats_invalidate(collection_id: int):
+    """Invalidate cached statistics of the collection: Statistics
+    version of the collection is incremented atomically, so the entries
+    of the previous version are not used anymore and they are left to
+    the cache eviction. Without the version (never requested or evicted
+    from the cache), there is nothing to invalidate.
+
+    :param collection_id: ID of the collection
+    :type collection_id: int
+    """
+
+    with contextlib.suppress(ValueError):
+        _cache_get().incr(_cache_key(collection_id))
+
+
+def _cache_get():
+    """Statistics cache. When `STATS_CACHE_ALIAS` is not configured,
+    default cache is used.
+    """
+
+    if STATS_CACHE_ALIAS in settings.CACHES:
+        return caches[STATS_CACHE_ALIAS]
+    return caches['default']
+
+
+def _version_get(cache, collection_id: int) -> int:
+    """Statistics version of the collection. Missing version is added
+    (unless added by a concurrent request) with the current time, so
+    the version evicted from the cache is never reused.
+    """
+
+    key = _cache_key(collection_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key, 0)
+    return version
+
+
+def _cache_key(
+        collection_id: int, version: int = None, file_name: str = None,
+        fields: Sequence[str] = None) -> str:
+    """Cache key of the statistics of the collection fields. Without
+    fields, key of the statistics version of the collection
+    """
+
+    if fields is None:
+        return 'stats:%s' % collection_id
+    return 'stats:%s:%s:%s:%s' % (
+        collection_id, version, file_name, ','.join(fields))
@@ -0,0 +1,520 @@
+import array
+import contextlib
+import csv
+import functools
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from collections import Counter
+from typing import Iterator, List, Optional, Sequence
+
+import petl as etl
+from django.conf import settings
+
+from portal import columnar
+
+
+def collection_path(file_name: str, sidecar: Optional[str] = None) -> str:
+    """Get path of collection file or of its sidecar file.
+
+    Collection files are content-addressed: They are named by SHA-256
+    of their content, so identical collections share the same file.
+
+    Sidecar files are stored alongside the collection file. They keep
+    data derived from the collection during ingestion, e.g.:
+        - keys: `url` and `edited` of the source resources (CSV)
+        - idx: Byte offsets of the collection rows (see
+            `collection_index_write`)
+        - col: Columnar binary copy of the collection (see
+            `ColumnarBackend`)
+        - counts-<key>: Value counts of field combination (see
+            `collection_value_counts`)
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str
+    :param sidecar: Sidecar name (used as an extra file extension)
+    :type sidecar: str, optional
+    :return: File path
+    :rtype: str
+    """
+
+    path = os.path.join(settings.MEDIA_ROOT, file_name)
+    if sidecar:
+        path = '%s.%s' % (path, sidecar)
+    return path
+
+
+def collection_delete(file_name: str):
+    """Delete collection file together with its sidecar files
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str
+    """
+
+    if not file_name:
+        return
+    path = collection_path(file_name)
+    for sidecar_path in glob.glob('%s.*' % glob.escape(path)):
+        os.remove(sidecar_path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+# Collection files managed by the storage: content-addressed files
+# (and legacy UUID-named files) and temporary files of ingestion
+COLLECTION_FILE_RE = re.compile(r'^[0-9a-f]{32}(?:[0-9a-f]{32})?\.csv$')
+TEMP_FILE_RE = re.compile(r'^[0-9a-f]{32}\.tmp$')
+
+
+def collection_temp_name() -> str:
+    """Get unique name of temporary collection file
+
+    :return: File name within `MEDIA_ROOT`
+    :rtype: str
+    """
+
+    return '%s.tmp' % uuid.uuid4().hex
+
+
+def collection_store(temp_name: str) -> str:
+    """Store temporary collection file (and its sidecar files) under
+    its content-addressed name.
+
+    If the same content is already stored, the temporary file is just
+    removed and the existing one is used: Its modification time is
+    updated, so it is not deleted as unreferenced before the ingestion
+    job records it (see `collection_recently_stored`). Sidecar files
+    are replaced.
+
+    :param temp_name: Name of the temporary collection file
+    :type temp_name: str
+    :return: Name of the stored collection file
+    :rtype: str
+    """
+
+    temp_path = collection_path(temp_name)
+    digest = hashlib.sha256()
+    with open(temp_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    file_name = '%s.csv' % digest.hexdigest()
+    path = collection_path(file_name)
+
+    for temp_sidecar_path in glob.glob('%s.*' % glob.escape(temp_path)):
+        sidecar = temp_sidecar_path[len(temp_path) + 1:]
+        os.replace(temp_sidecar_path, collection_path(file_name, sidecar))
+    if os.path.exists(path):
+        os.remove(temp_path)
+        os.utime(path)
+    else:
+        os.replace(temp_path, path)
+    return file_name
+
+
+def collection_recently_stored(file_name: str) -> bool:
+    """Check, if the collection file was stored (or reused) within
+    `INGEST_JOB_TIMEOUT` seconds.
+
+    Ingestion job stores the collection files as soon as they are
+    written, but collections reference them just when the whole job
+    is finished. Recently stored files which are not referenced yet
+    must not be deleted.
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str
+    :return: True if the file is recent. Missing file is not recent
+    :rtype: bool
+    """
+
+    try:
+        mtime = os.path.getmtime(collection_path(file_name))
+    except FileNotFoundError:
+        return False
+    return time.time() - mtime < settings.INGEST_JOB_TIMEOUT
+
+
+def collection_index_write(file_name: str):
+    """Write `idx` sidecar file of the collection: Byte offsets of
+    the collection rows, so any row is accessible without parsing
+    the preceding ones.
+
+    The index is an array of unsigned 64-bit little-endian integers:
+    Offset of every data row followed by the file size. The number of
+    data rows is therefore the array length minus one.
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str
+    """
+
+    offsets = array.array('Q')
+    offset = 0
+    row_offset = 0
+    quotes = 0
+    header = True
+    with open(collection_path(file_name), 'rb') as f:
+        for line in f:
+            # Line break within quoted value does not end the row
+            quotes += line.count(b'"')
+            offset += len(line)
+            if quotes % 2:
+                continue
+            if header:
+                header = False
+            else:
+                offsets.append(row_offset)
+            row_offset = offset
+    if not header:
+        offsets.append(row_offset)
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+    with open(collection_path(file_name, 'idx'), 'wb') as f:
+        offsets.tofile(f)
+
+
+def collection_rows_read(
+        file_name: str, start: int, stop: int) -> Optional[List[tuple]]:
+    """Read collection rows using the `idx` sidecar file: Just the
+    requested rows are read and parsed.
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str
+    :param start: Index of the first data row
+    :type start: int
+    :param stop: Index of the data row after the last one
+    :type stop: int
+    :return: List of rows. If the collection is not indexed,
+        returns None
+    :rtype: list, optional
+    """
+
+    try:
+        f_idx = open(collection_path(file_name, 'idx'), 'rb')
+    except FileNotFoundError:
+        return
+    with f_idx:
+        rows_count = os.fstat(f_idx.fileno()).st_size // 8 - 1
+        start = max(0, min(start, rows_count))
+        stop = max(start, min(stop, rows_count))
+        f_idx.seek(start * 8)
+        offsets = array.array('Q')
+        offsets.fromfile(f_idx, stop - start + 1)
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+    if start == stop:
+        return []
+
+    with open(collection_path(file_name), 'rb') as f:
+        f.seek(offsets[0])
+        raw = f.read(offsets[-1] - offsets[0])
+    # Decoded the same way as by `petl.fromcsv`
+    text = io.TextIOWrapper(io.BytesIO(raw), newline='')
+    return [tuple(row) for row in csv.reader(text)]
+
+
+def collection_rows_count(file_name: str) -> Optional[int]:
+    """Get number of data rows of the collection from its `idx`
+    sidecar file
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str
+    :return: Number of rows. If the collection is not indexed,
+        returns None
+    :rtype: int, optional
+    """
+
+    try:
+        return os.path.getsize(collection_path(file_name, 'idx')) // 8 - 1
+    except FileNotFoundError:
+        return
+
+
+def collection_header(file_name: str) -> List[str]:
+    """Get header of the collection: Just the first row is read
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str
+    :return: List of column names
+    :rtype: list
+    """
+
+    with open(collection_path(file_name), newline='') as f:
+        return next(csv.reader(f), [])
+
+
+def collection_chunks_read(
+        file_name: str, start: int = 0, stop: Optional[int] = None,
+        chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Read raw content of the collection file in chunks: Just one
+    chunk is kept in memory.
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str
+    :param start: Offset of the first byte
+    :type start: int
+    :param stop: Offset of the byte after the last one. When not given,
+        the file is read up to its end
+    :type stop: int, optional
+    :param chunk_size: Maximum size of a chunk in bytes
+    :type chunk_size: int
+    :return: Iterator of chunks
+    :rtype: iterator
+    """
+
+    with open(collection_path(file_name), 'rb') as f:
+        f.seek(start)
+        remaining = stop - start if stop is not None else None
+        while remaining is None or remaining > 0:
+            chunk = f.read(
+                chunk_size if remaining is None
+                else min(chunk_size, remaining))
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def collection_records_iter(file_name: str) -> Iterator[dict]:
+    """Iterate collection rows as dicts by the header fields: Rows are
+    parsed one by one.
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str
+    :return: Iterator of dicts
+    :rtype: iterator
+    """
+
+    with open(collection_path(file_name), newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        for row in reader:
+            yield dict(zip(header, row))
+
+
+class CSVBackend(object):
+    """Storage backend reading collection data from CSV file. Rows are
+    located using `idx` sidecar file.
+    """
+
+    def sidecars_write(self, file_name: str):
+        """Write sidecar files used by the backend
+
+        :param file_name: Name of the collection file within `MEDIA_ROOT`
+        :type file_name: str
+        """
+
+        collection_index_write(file_name)
+
+    def rows_read(self, file_name: str, start: int, stop: int) -> list:
+        """Read collection rows
+
+        :param file_name: Name of the collection file within `MEDIA_ROOT`
+        :type file_name: str
+        :param start: Index of the first data row
+        :type start: int
+        :param stop: Index of the data row after the last one
+        :type stop: int
+        :return: List of rows
+        :rtype: list
+        """
+
+        rows = collection_rows_read(file_name, start, stop)
+        if rows is None:
+            # Collection is not indexed: parse it from the beginning
+            rows = list(etl.records(
+                etl.fromcsv(collection_path(file_name)), start, stop))
+        return rows
+
+    def value_counts(self, file_name: str, fields) -> list:
+        """Count occurrences of distinct values of the given fields
+
+        :param file_name: Name of the collection file within `MEDIA_ROOT`
+        :type file_name: str
+        :param fields: Field names
+        :type fields: sequence
+        :return: List of tuples: values of the fields and count.
+            The most common values first
+        :rtype: list
+        """
+
+        table = (
+            etl
+            .valuecounts(etl.fromcsv(collection_path(file_name)), *fields)
+            .cutout('frequency')
+        )
+        return list(etl.data(table))
+
+
+class ColumnarBackend(CSVBackend):
+    """Storage backend reading collection data from memory-mapped
+    columnar binary sidecar file (`col`) without any parsing. CSV file
+    stays the primary collection file. Collections without the
+    sidecar file are read by `CSVBackend`.
+    """
+
+    def sidecars_write(self, file_name: str):
+        super().sidecars_write(file_name)
+        columnar.columnar_write(
+            collection_path(file_name), collection_path(file_name, 'col'))
+
+    def rows_read(self, file_name: str, start: int, stop: int) -> list:
+        try:
+            reader = _columnar_reader_get(collection_path(file_name, 'col'))
+        except FileNotFoundError:
+            return super().rows_read(file_name, start, stop)
+        return reader.rows(start, stop)
+
+    def value_counts(self, file_name: str, fields) -> list:
+        try:
+            reader = _columnar_reader_get(collection_path(file_name, 'col'))
+        except FileNotFoundError:
+            return super().value_counts(file_name, fields)
+        return reader.value_counts(fields)
+
+
+# Collection files are immutable (content-addressed), so the opened
+# (memory-mapped) files might be kept
+@functools.lru_cache(maxsize=32)
+def _columnar_reader_get(path: str) -> columnar.ColumnarReader:
+    return columnar.ColumnarReader(path)
+
+
+BACKENDS = {
+    'csv': CSVBackend,
+    'columnar': ColumnarBackend,
+}
+
+
+def backend_get() -> CSVBackend:
+    """Get storage backend set by `COLLECTION_STORAGE_BACKEND` setting
+
+    :return: Storage backend
+    :rtype: CSVBackend
+    """
+
+    return BACKENDS[settings.COLLECTION_STORAGE_BACKEND]()
+
+
+def collection_counts_write(file_name: str):
+    """Write value counts of every single field of the collection into
+    sidecar files. All the fields are counted within one pass.
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str
+    """
+
+    with open(collection_path(file_name), newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        counters = [Counter() for _ in header]
+        for row in reader:
+            for counter, value in zip(counters, row):
+                counter[value] += 1
+    for field, counter in zip(header, counters):
+        _counts_write(file_name, (field,), [
+            (value, count) for value, count in counter.most_common()])
+
+
+def collection_value_counts(file_name: str, fields: Sequence[str]) -> list:
+    """Count occurrences of distinct values of the given fields.
+
+    Counts are read from sidecar file. Counts of single fields are
+    written during ingestion, counts of field combinations are counted
+    by storage backend on the first request and written then. The
+    combination is the same regardless of the order of fields.
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :type file_name: str
+    :param fields: Field names
+    :type fields: sequence
+    :return: List of tuples: values of the fields and count.
+        The most common values first
+    :rtype: list
+    """
+
+    key = tuple(sorted(fields))
+    rows = _counts_read(file_name, key)
+    if rows is None:
+        rows = backend_get().value_counts(file_name, key)
+        _counts_write(file_name, key, rows)
+    if key == tuple(fields):
+        return rows
+    order = [key.index(f) for f in fields] + [len(key)]
+    return [tuple(row[i] for i in order) for row in rows]
+
+
+def _counts_sidecar(key: Sequence[str]) -> str:
+    """Name of value counts sidecar of the field combination"""
+
+    digest = hashlib.sha1('\0'.join(key).encode('utf-8')).hexdigest()
+    return 'counts-%s' % digest[:16]
+
+
+def _counts_read(file_name: str, key: Sequence[str]) -> Optional[list]:
+    """Read value counts of the field combination
+
+    :return: List of tuples. If the counts are not stored,
+        returns None
+    :rtype: list, optional
+    """
+
+    path = collection_path(file_name, _counts_sidecar(key))
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            counts = json.load(f)
+    except FileNotFoundError:
+        return
+    if counts['fields'] != list(key):
+        return
+    return [tuple(row) for row in counts['rows']]
+
+
+def _counts_write(file_name: str, key: Sequence[str], rows: list):
+    """Write value counts of the field combination atomically"""
+
+    temp_path = collection_path(collection_temp_name())
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fields': list(key), 'rows': rows}, f)
+        os.replace(
+            temp_path, collection_path(file_name, _counts_sidecar(key)))
+    finally:
+        # The temporary file is removed whether or not writing succeeded
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_path)
+
+
+class CollectionRows(object):
+    """Sequence of collection rows with known length. Slices are read
+    from the collection file on demand, so it can be paginated by
+    `django.core.paginator.Paginator` without reading other rows.
+    """
+
+    def __init__(self, file_name: str, rows_count: int):
+        """
+        :param file_name: Name of the collection file within `MEDIA_ROOT`
+        :type file_name: str
+        :param rows_count: Number of data rows of the collection
+        :type rows_count: int
+        """
+
+        self.file_name = file_name
+        self.rows_count = rows_count
+
+    def __len__(self):
+        return self.rows_count
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            rows = self[key:key + 1]
+            if not rows:
+                raise IndexError(key)
+            return rows[0]
+        start, stop, _ = key.indices(self.rows_count)
+        return backend_get().rows_read(self.file_name, start, stop)
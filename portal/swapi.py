@@ -1,37 +1,515 @@
 import requests
+import requests.adapters
 import urllib.parse
 import logging
-from typing import Optional
+import math
+import asyncio
+import atexit
+import collections
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+from urllib3.util.retry import Retry
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from portal import instrument
+from portal.httpcache import HTTPCache
 
 log = logging.getLogger('portal')
 
 
-class SWAPI(object):
-    """Process Star Wars API requests
+class SWAPIError(Exception):
+    """Star Wars API request failed. Raised by iterators of pages,
+    which can not signal the error by returning None.
+    """
+
+
+class ResourceSchema(object):
+    """Schema of Star Wars API resource type
 
-    :cvar HOST: Host of Star Wars API
+    :ivar name: Resource type, the path of its API endpoint
+        (e.g. `planets`)
+    :ivar references: Referenced resource types by URL reference
+        field. Single and list-valued fields are the same.
+    :ivar name_field: Field naming the resource (e.g. `title` of films)
+    """
+
+    def __init__(self, name: str, references: dict, name_field='name'):
+        """
+        :param name: Resource type
+        :type name: str
+        :param references: Referenced resource types by field
+        :type references: dict
+        :param name_field: Field naming the resource
+        :type name_field: str
+        """
+
+        self.name = name
+        self.references = references
+        self.name_field = name_field
+
+
+# Fields common to all the resource types: They identify the resource
+# and its version.
+RESOURCE_FIELDS = ('created', 'edited', 'url')
+
+# Registry of resource types
+RESOURCES = {schema.name: schema for schema in (
+    ResourceSchema('people', {
+        'homeworld': 'planets', 'films': 'films', 'species': 'species',
+        'vehicles': 'vehicles', 'starships': 'starships'}),
+    ResourceSchema('planets', {
+        'residents': 'people', 'films': 'films'}),
+    ResourceSchema('films', {
+        'characters': 'people', 'planets': 'planets',
+        'starships': 'starships', 'vehicles': 'vehicles',
+        'species': 'species'}, name_field='title'),
+    ResourceSchema('species', {
+        'homeworld': 'planets', 'people': 'people', 'films': 'films'}),
+    ResourceSchema('vehicles', {
+        'pilots': 'people', 'films': 'films'}),
+    ResourceSchema('starships', {
+        'pilots': 'people', 'films': 'films'}),
+)}
+
+
+class SWAPIBase(object):
+    """Configuration and response processing shared by Star Wars API
+    clients (see `SWAPI` and `AsyncSWAPI`)
+
+    :cvar HOST: Default base URL of Star Wars API
     :cvar RESOURCE_PEOPLE: people resource url
     :cvar RESOURCE_PLANETS: planets resource url
     :cvar REQUEST_TIMEOUT: Maximum request timeout.
         After this time, TimeOut error is raised
+    :cvar CONCURRENT_FETCH: Fetch pages of list resources concurrently
+        when their URLs can be predicted from the first page
+    :cvar MAX_WORKERS: Maximum number of pages fetched at once
+    :cvar POOL_SIZE: Default number of keep-alive connections kept
+        in the connection pool
+    :cvar MAX_RETRIES: Default number of retries of requests failed
+        on connection error, timeout or HTTP 5xx status
+    :cvar RETRY_BACKOFF: Default backoff factor between retries
+        (see `urllib3.util.retry.Retry`)
+    :cvar RETRY_STATUSES: HTTP statuses the request is retried on
+    :cvar CACHE_ALIAS: Django cache used for caching of resources
+        which are not expected to change (e.g. planets). Timeout and
+        maximum number of entries are set within `CACHES` setting
     """
 
     HOST = 'https://swapi.dev/api/'
     RESOURCE_PEOPLE = 'people'
     RESOURCE_PLANETS = 'planets'
     REQUEST_TIMEOUT = 10
+    CONCURRENT_FETCH = True
+    MAX_WORKERS = 8
+    POOL_SIZE = 10
+    MAX_RETRIES = 3
+    RETRY_BACKOFF = 0.3
+    RETRY_STATUSES = (500, 502, 503, 504)
+    CACHE_ALIAS = 'swapi'
+
+    def __init__(
+            self,
+            pool_size: Optional[int] = None,
+            max_retries: Optional[int] = None,
+            retry_backoff: Optional[float] = None,
+            http_cache: Optional[HTTPCache] = None,
+            host: Optional[str] = None):
+        """
+        :param pool_size: Number of pooled connections.
+            `POOL_SIZE` is used by default
+        :type pool_size: int, optional
+        :param max_retries: Number of retries. `MAX_RETRIES` is used
+            by default
+        :type max_retries: int, optional
+        :param retry_backoff: Backoff factor between retries.
+            `RETRY_BACKOFF` is used by default
+        :type retry_backoff: float, optional
+        :param http_cache: On-disk HTTP cache used for conditional
+            requests. Responses are not stored by default
+        :type http_cache: HTTPCache, optional
+        :param host: Base URL of Star Wars API (e.g. local stand-in
+            server, see `portal.fakeswapi`). `HOST` is used by default
+        :type host: str, optional
+        """
+
+        self.host = host or self.HOST
+        self.pool_size = self.POOL_SIZE if pool_size is None else pool_size
+        self.max_retries = (
+            self.MAX_RETRIES if max_retries is None else max_retries)
+        self.retry_backoff = (
+            self.RETRY_BACKOFF if retry_backoff is None else retry_backoff)
+        self.http_cache = http_cache
 
     @property
     def url_people(self):
         """Property for easier testing"""
 
-        return urllib.parse.urljoin(self.HOST, self.RESOURCE_PEOPLE)
+        return urllib.parse.urljoin(self.host, self.RESOURCE_PEOPLE)
 
     @property
     def url_planets(self):
         """Property for easier testing"""
 
-        return urllib.parse.urljoin(self.HOST, self.RESOURCE_PLANETS)
+        return self.url_resource(self.RESOURCE_PLANETS)
+
+    def url_resource(self, resource: str) -> str:
+        """Get API endpoint URL of the resource list
+
+        :param resource: Resource type (e.g. `planets`)
+        :type resource: str
+        :rtype: str
+        """
+
+        return urllib.parse.urljoin(self.host, resource)
+
+    @property
+    def cache(self):
+        """Django cache used by the client"""
+
+        return caches[self.CACHE_ALIAS]
+
+    def cache_invalidate(self, url: Optional[str] = None):
+        """Invalidate cached resources
+
+        :param url: API endpoint URL of cached resource. When not
+            given, all the cached resources are invalidated
+        :type url: str, optional
+        """
+
+        if url is None:
+            self.cache.clear()
+        else:
+            self.cache.delete(self._cache_key(url))
+
+    @staticmethod
+    def _cache_key(url: str) -> str:
+        """Cache key of resource on the given URL"""
+
+        return 'swapi:%s' % url
+
+    def _resources_cached_get(self, urls) -> Tuple[dict, List[str]]:
+        """Get cached single resource objects
+
+        :param urls: Iterable of resource URLs. They are deduplicated
+        :type urls: iterable
+        :return: Tuple of dict of cached resource objects by their URL
+            and list of URLs which are not cached
+        :rtype: tuple
+        """
+
+        urls = sorted(set(urls))
+        resources = self.cache.get_many([self._cache_key(u) for u in urls])
+        resources = {
+            u: resources[self._cache_key(u)] for u in urls
+            if self._cache_key(u) in resources}
+        if resources:
+            log.info('Cache hit: %s resources', len(resources))
+        return resources, [u for u in urls if u not in resources]
+
+    def _resources_fetched_add(
+            self, resources: dict, urls: List[str],
+            responses: List[Optional[dict]]) -> dict:
+        """Add fetched single resource objects and cache them.
+        Resources which could not be fetched are left out.
+
+        :param resources: Dict of resource objects by their URL
+        :type resources: dict
+        :param urls: Fetched URLs
+        :type urls: list
+        :param responses: Responses of `_swapi_request` in the order of
+            `urls`
+        :type responses: list
+        :return: The resources dict
+        :rtype: dict
+        """
+
+        fetched = {u: r for u, r in zip(urls, responses) if r}
+        if len(fetched) < len(urls):
+            log.warning('Resources not available: %s',
+                        ', '.join(u for u in urls if u not in fetched))
+        if fetched:
+            self.cache.set_many(
+                {self._cache_key(u): r for u, r in fetched.items()})
+        resources.update(fetched)
+        return resources
+
+    def _list_cached_get(self, url: str) -> Optional[list]:
+        """Get cached list of result objects
+
+        :param url: API endpoint URL
+        :type url: str
+        :return: List of result objects. If not cached, returns None
+        :rtype: list, optional
+        """
+
+        results = self.cache.get(self._cache_key(url))
+        if results is not None:
+            log.info('Cache hit: %s', url)
+        return results
+
+    def _list_cached_set(self, url: str, results: Optional[list]):
+        """Cache list of result objects. Errors are not cached.
+
+        :param url: API endpoint URL
+        :type url: str
+        :param results: List of result objects, None in case of error
+        :type results: list, optional
+        """
+
+        if results is not None:
+            self.cache.set(self._cache_key(url), results)
+
+    @staticmethod
+    def _list_response_results(response: Optional[dict]) -> Optional[list]:
+        """Check the consistency of one page of list response
+
+        :param response: Processed SWAPI response
+        :type response: dict, optional
+        :return: `results` of the page. In case of error or inconsistent
+            response, returns None
+        :rtype: list, optional
+        """
+
+        if not response:
+            return
+        results_partial = response.get('results')
+        if not results_partial:
+            log.error('Inconsistent response: \'results\' not present '
+                      'within response')
+            return
+        if 'next' not in response:
+            log.error('Inconsistent response: \'next\' not present within '
+                      'response')
+            return
+        return results_partial
+
+    @staticmethod
+    def _page_urls_predict(response: dict) -> Optional[List[str]]:
+        """Predict URLs of all the pages following the given one
+
+        Prediction is possible when the response contains `count` and
+        its `next` link carries the `page` query parameter. The page
+        size is taken from the number of results on the given page.
+
+        :param response: Consistent first page of list response
+        :type response: dict
+        :return: List of page URLs in page order. When the URLs can
+            not be predicted, returns None
+        :rtype: list, optional
+        """
+
+        count = response.get('count')
+        page_size = len(response['results'])
+        if not isinstance(count, int) or not page_size:
+            return
+        parts = urllib.parse.urlsplit(response['next'])
+        query = urllib.parse.parse_qsl(parts.query)
+        page_params = [v for k, v in query if k == 'page']
+        if len(page_params) != 1 or not page_params[0].isdigit():
+            return
+        page_next = int(page_params[0])
+        page_last = math.ceil(count / page_size)
+        if page_next > page_last:
+            return
+
+        urls = []
+        for page in range(page_next, page_last + 1):
+            query_page = [
+                (k, str(page) if k == 'page' else v) for k, v in query]
+            urls.append(urllib.parse.urlunsplit(
+                parts._replace(query=urllib.parse.urlencode(query_page))))
+        return urls
+
+    def _response_process(
+            self, url: str, r, cache_entry: Optional[dict]) -> Optional[dict]:
+        """Process HTTP response of Star Wars API request: Process error
+        states, use cached response on HTTP 304 or store the new one.
+
+        :param url: API endpoint URL
+        :type url: str
+        :param r: HTTP response (`requests.Response` or `httpx.Response`)
+        :param cache_entry: HTTP cache entry of the URL
+        :type cache_entry: dict, optional
+        :return: dict object representing result value.
+            In case of error, returns None
+        :rtype: dict, optional
+        """
+
+        log.info('URL = %s', r.url)
+        if r.status_code == 304 and cache_entry is not None:
+            log.info('[304] Not modified')
+            self.http_cache.touch(cache_entry)
+            return cache_entry['data']
+        if r.status_code != 200:
+            log.error('[%s] Error %s', r.status_code,
+                      ' : %s' % r.text if r.text else '')
+            return
+        log.info('[200] %s', r.text)
+        if not r.text:
+            log.info('Incorrect API response')
+            return
+        try:
+            result_dict = r.json()
+        except Exception as e:
+            log.error('Error parsing response: %s', e)
+            return
+        if self.http_cache is not None:
+            self.http_cache.set(url, result_dict, r.headers)
+        return result_dict
+
+
+class SWAPI(SWAPIBase):
+    """Process Star Wars API requests
+
+    The instance owns `requests.Session` with pooled keep-alive
+    connections, so the connections are reused across pages and
+    across calls. Use the instance as a context manager or call
+    `close` to release the connections. Process-wide instance
+    is available by `get_client`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """See `SWAPIBase`"""
+
+        super().__init__(*args, **kwargs)
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def session(self) -> requests.Session:
+        """HTTP session with pooled connections. It is created on the
+        first use.
+        """
+
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._session_create()
+            return self._session
+
+    def _session_create(self) -> requests.Session:
+        """Create HTTP session with connection pool and retry policy
+
+        :return: Configured session
+        :rtype: requests.Session
+        """
+
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=self.retry_backoff,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def close(self):
+        """Close pooled connections. The session is created again
+        on the next request.
+        """
+
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def people_pages_iter(self) -> Iterator[list]:
+        """Iterate pages of person objects as they arrive. See
+        `list_pages_iter`.
+
+        :return: Iterator of lists of dicts representing SW character
+            data
+        :rtype: iterator
+        """
+
+        return self.list_pages_iter(self.url_people)
+
+    def resource_pages_iter(self, resource: str) -> Iterator[list]:
+        """Iterate pages of objects of the resource type as they
+        arrive. See `list_pages_iter`.
+
+        :param resource: Resource type (e.g. `planets`)
+        :type resource: str
+        :return: Iterator of lists of dicts representing SW resource
+            data
+        :rtype: iterator
+        """
+
+        return self.list_pages_iter(self.url_resource(resource))
+
+    def list_pages_iter(self, url: str) -> Iterator[list]:
+        """Iterate pages of list resource in page order: Just the pages
+        being fetched and the page being processed are kept in memory.
+
+        When URLs of the pages can be predicted from the first page (see
+        `_page_urls_predict`), at most `MAX_WORKERS` of them are fetched
+        concurrently ahead of the page being processed. Otherwise `next`
+        links are followed one page at a time.
+
+        :param url: API endpoint URL
+        :type url: str
+        :return: Iterator of lists of result objects
+        :rtype: iterator
+        :raises SWAPIError: In case of error or inconsistent response
+        """
+
+        response = self._swapi_request(url)
+        results = self._list_response_results(response)
+        if results is None:
+            raise SWAPIError('Error processing list request: %s' % url)
+        next_page = response['next']
+        yield results
+
+        page_urls = None
+        if self.CONCURRENT_FETCH and next_page is not None:
+            page_urls = self._page_urls_predict(response)
+        if page_urls:
+            workers = max(1, min(self.MAX_WORKERS, self.pool_size))
+            request = instrument.context_bind(self._swapi_request)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                page_urls = iter(page_urls)
+                futures = collections.deque(
+                    executor.submit(request, u)
+                    for u in itertools.islice(page_urls, workers))
+                while futures:
+                    response = futures.popleft().result()
+                    results = self._list_response_results(response)
+                    if results is None:
+                        for future in futures:
+                            future.cancel()
+                        raise SWAPIError(
+                            'Error processing list request: %s' % url)
+                    for u in itertools.islice(page_urls, 1):
+                        futures.append(executor.submit(request, u))
+                    yield results
+            # More pages than predicted (e.g. resources were added in
+            # the meantime): continue by following `next` links
+            next_page = response['next']
+
+        while next_page is not None:
+            response = self._swapi_request(next_page)
+            results = self._list_response_results(response)
+            if results is None:
+                raise SWAPIError('Error processing list request: %s' % url)
+            next_page = response['next']
+            yield results
 
     def people_get(self) -> Optional[list]:
         """Get list of person objects
@@ -46,12 +524,70 @@ class SWAPI(object):
     def planets_get(self) -> Optional[list]:
         """Get list of planet objects
 
+        The list is cached, so repeated calls within cache timeout
+        do not send any request.
+
         :return: List of dicts representing SW planet data.
             In case of error, returns None
         :rtype: list, optional
         """
 
-        return self._list_request_process(self.url_planets)
+        return self.resource_list_get(self.RESOURCE_PLANETS)
+
+    def resource_list_get(
+            self, resource: str, cached: bool = True) -> Optional[list]:
+        """Get list of all the objects of the resource type
+
+        The list is cached, so repeated calls within cache timeout
+        do not send any request.
+
+        :param resource: Resource type (e.g. `planets`)
+        :type resource: str
+        :param cached: Use the cache. Otherwise, the list is always
+            requested and it is not cached
+        :type cached: bool
+        :return: List of dicts representing SW resource data.
+            In case of error, returns None
+        :rtype: list, optional
+        """
+
+        if not cached:
+            return self._list_request_process(self.url_resource(resource))
+        return self._list_request_cached(self.url_resource(resource))
+
+    def resources_get(self, urls) -> dict:
+        """Get single resource objects (e.g. `/planets/<id>/`)
+
+        Given URLs are deduplicated. Cached resources are used and the
+        rest is fetched concurrently and cached.
+
+        :param urls: Iterable of resource URLs
+        :type urls: iterable
+        :return: Dict of resource objects by their URL. Resources which
+            could not be fetched (e.g. HTTP 404) are left out
+        :rtype: dict
+        """
+
+        resources, urls_missing = self._resources_cached_get(urls)
+        if urls_missing:
+            self._resources_fetched_add(
+                resources, urls_missing, self._urls_fetch(urls_missing))
+        return resources
+
+    def _list_request_cached(self, url: str) -> Optional[list]:
+        """Process list request using the cache. Errors are not cached.
+
+        :param url: API endpoint URL
+        :type url: str
+        :return: List of result objects. In case of error, returns None
+        :rtype: list, optional
+        """
+
+        results = self._list_cached_get(url)
+        if results is None:
+            results = self._list_request_process(url)
+            self._list_cached_set(url, results)
+        return results
 
     def _list_request_process(self, url: str) -> Optional[list]:
         """Process list requests: These are request which returns
@@ -63,6 +599,8 @@ class SWAPI(object):
             - previous: None or URL of previous page
             - results: Array of result resources
 
+        Pages are fetched by `list_pages_iter` and merged in page order.
+
         :param url: API endpoint URL
         :type url: str
         :return: List of result objects. In case of error, returns None
@@ -70,34 +608,41 @@ class SWAPI(object):
         """
 
         results = []
-        while True:
-            response = self._swapi_request(url)
-            if not response:
-                return
-            results_partial = response.get('results')
-            if not results_partial:
-                log.error('Inconsistent response: \'results\' not present '
-                          'within response')
-                return
-            results.extend(results_partial)
-            if 'next' not in response:
-                log.error('Inconsistent response: \'next\' not present within '
-                          'response')
-                return
-            next_page = response['next']
-            if next_page is None:
-                break
-            url = next_page
+        try:
+            for results_partial in self.list_pages_iter(url):
+                results.extend(results_partial)
+        except SWAPIError:
+            return
         return results
 
+    def _urls_fetch(self, urls: List[str]) -> List[Optional[dict]]:
+        """Fetch the given URLs (pages or resources) concurrently
+
+        :param urls: Page URLs
+        :type urls: list
+        :return: Responses of `_swapi_request` in the order of `urls`
+        :rtype: list
+        """
+
+        workers = max(1, min(self.MAX_WORKERS, self.pool_size, len(urls)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(
+                instrument.context_bind(self._swapi_request), urls))
+
     def _swapi_request(self, url: str) -> Optional[dict]:
         """Process single Star Wars API request.
 
         Processing:
-            - Send a request
+            - Use fresh response from HTTP cache if there is one
+            - Send a request (conditional one if the response is
+                cached with validators)
             - Process error states
+            - Use cached response on HTTP 304 or store the new one
             - Log the processing
 
+        The stages are timed by `swapi.cache`, `swapi.request` and
+        `swapi.process` spans (see `portal.instrument`).
+
         :param url: API endpoint URL
         :type url: str
         :return: dict object representing result value.
@@ -105,9 +650,21 @@ class SWAPI(object):
         :rtype: dict, optional
         """
 
+        cache_entry = None
+        if self.http_cache is not None:
+            with instrument.span('swapi.cache'):
+                cache_entry = self.http_cache.get(url)
+            if cache_entry is not None and \
+                    self.http_cache.is_fresh(cache_entry):
+                log.info('HTTP cache fresh: %s', url)
+                return cache_entry['data']
+
         log.info('Sending SWAPI request ...')
         try:
-            r = requests.get(url, timeout=self.REQUEST_TIMEOUT)
+            with instrument.span('swapi.request'):
+                r = self.session.get(
+                    url, timeout=self.REQUEST_TIMEOUT,
+                    headers=HTTPCache.conditional_headers(cache_entry))
         except requests.ConnectionError as e:
             log.error('Connection error: %s', e)
             return
@@ -118,20 +675,307 @@ class SWAPI(object):
             log.error('%s', e)
             return
 
-        log.info('URL = %s', r.url)
-        if r.status_code != 200:
-            log.error('[%s] Error %s', r.status_code,
-                      ' : %s' % r.text if r.text else '')
-            return
-        log.info('[200] %s', r.text)
-        if not r.text:
-            log.info('Incorrect API response')
+        with instrument.span('swapi.process'):
+            return self._response_process(url, r, cache_entry)
+
+
+class AsyncSWAPI(SWAPIBase):
+    """Process Star Wars API requests asynchronously
+
+    Asynchronous counterpart of `SWAPI` used by ASGI views: Requests
+    are sent by `httpx.AsyncClient` on the running event loop, so
+    pages and resources are fetched concurrently without any threads.
+    HTTP cache files are read and written on worker threads.
+
+    The HTTP client is bound to the event loop it was created on. When
+    the instance is used on another loop, the client is closed on its
+    loop and created again. Use the instance as an async context
+    manager or call `aclose` to release the connections. Process-wide
+    instance is available by `get_async_client`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """See `SWAPIBase`"""
+
+        super().__init__(*args, **kwargs)
+        self._client = None
+        self._client_loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """HTTP client with pooled connections. It is created on the
+        first use within the running event loop.
+        """
+
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._client_loop is not loop:
+            self._client_discard()
+        if self._client is None:
+            self._client = self._client_create()
+            self._client_loop = loop
+        return self._client
+
+    def _client_discard(self):
+        """Close the HTTP client created on another event loop: Its
+        connections can be closed just on that loop. If the loop is
+        closed already or it is not running (the coroutine scheduled on
+        it would never run), the client is dropped and its connections
+        are released by the garbage collector.
+        """
+
+        client, loop = self._client, self._client_loop
+        self._client = self._client_loop = None
+        if loop.is_closed() or not loop.is_running():
+            log.debug('Event loop of SWAPI client is not running')
             return
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+    def _client_create(self) -> httpx.AsyncClient:
+        """Create HTTP client with connection pool. Connection errors
+        are retried by the transport, error statuses are retried by
+        `_swapi_request`.
+
+        :return: Configured client
+        :rtype: httpx.AsyncClient
+        """
+
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size),
+            retries=self.max_retries)
+        return httpx.AsyncClient(
+            transport=transport, timeout=self.REQUEST_TIMEOUT)
+
+    async def aclose(self):
+        """Close pooled connections. The client is created again
+        on the next request.
+        """
+
+        client, self._client = self._client, None
+        self._client_loop = None
+        if client is not None:
+            await client.aclose()
+
+    def resource_pages_iter(self, resource: str) -> AsyncIterator[list]:
+        """See `SWAPI.resource_pages_iter`"""
+
+        return self.list_pages_iter(self.url_resource(resource))
+
+    async def list_pages_iter(self, url: str) -> AsyncIterator[list]:
+        """Asynchronous version of `SWAPI.list_pages_iter`: Predicted
+        pages are fetched by tasks, at most `MAX_WORKERS` of them ahead
+        of the page being processed.
+
+        :param url: API endpoint URL
+        :type url: str
+        :return: Asynchronous iterator of lists of result objects
+        :raises SWAPIError: In case of error or inconsistent response
+        """
+
+        response = await self._swapi_request(url)
+        results = self._list_response_results(response)
+        if results is None:
+            raise SWAPIError('Error processing list request: %s' % url)
+        next_page = response['next']
+        yield results
+
+        page_urls = None
+        if self.CONCURRENT_FETCH and next_page is not None:
+            page_urls = self._page_urls_predict(response)
+        if page_urls:
+            workers = max(1, min(self.MAX_WORKERS, self.pool_size))
+            page_urls = iter(page_urls)
+            tasks = collections.deque(
+                asyncio.ensure_future(self._swapi_request(u))
+                for u in itertools.islice(page_urls, workers))
+            try:
+                while tasks:
+                    response = await tasks.popleft()
+                    results = self._list_response_results(response)
+                    if results is None:
+                        raise SWAPIError(
+                            'Error processing list request: %s' % url)
+                    for u in itertools.islice(page_urls, 1):
+                        tasks.append(
+                            asyncio.ensure_future(self._swapi_request(u)))
+                    yield results
+            finally:
+                for task in tasks:
+                    task.cancel()
+            # More pages than predicted: continue by following `next`
+            # links
+            next_page = response['next']
+
+        while next_page is not None:
+            response = await self._swapi_request(next_page)
+            results = self._list_response_results(response)
+            if results is None:
+                raise SWAPIError('Error processing list request: %s' % url)
+            next_page = response['next']
+            yield results
+
+    async def people_get(self) -> Optional[list]:
+        """See `SWAPI.people_get`"""
+
+        return await self._list_request_process(self.url_people)
+
+    async def planets_get(self) -> Optional[list]:
+        """See `SWAPI.planets_get`"""
+
+        return await self.resource_list_get(self.RESOURCE_PLANETS)
+
+    async def resource_list_get(
+            self, resource: str, cached: bool = True) -> Optional[list]:
+        """See `SWAPI.resource_list_get`"""
+
+        if not cached:
+            return await self._list_request_process(
+                self.url_resource(resource))
+        return await self._list_request_cached(self.url_resource(resource))
+
+    async def resources_get(self, urls) -> dict:
+        """See `SWAPI.resources_get`"""
+
+        resources, urls_missing = self._resources_cached_get(urls)
+        if urls_missing:
+            self._resources_fetched_add(
+                resources, urls_missing,
+                await self._urls_fetch(urls_missing))
+        return resources
+
+    async def _list_request_cached(self, url: str) -> Optional[list]:
+        """See `SWAPI._list_request_cached`"""
+
+        results = self._list_cached_get(url)
+        if results is None:
+            results = await self._list_request_process(url)
+            self._list_cached_set(url, results)
+        return results
+
+    async def _list_request_process(self, url: str) -> Optional[list]:
+        """See `SWAPI._list_request_process`"""
+
+        results = []
         try:
-            result_dict = r.json()
-            return result_dict
-        except Exception as e:
-            log.error('Error parsing response: %s', e)
+            async for results_partial in self.list_pages_iter(url):
+                results.extend(results_partial)
+        except SWAPIError:
             return
+        return results
+
+    async def _urls_fetch(self, urls: List[str]) -> List[Optional[dict]]:
+        """Fetch the given URLs (pages or resources) concurrently: At
+        most `MAX_WORKERS` requests are in flight at once.
+
+        :param urls: Page URLs
+        :type urls: list
+        :return: Responses of `_swapi_request` in the order of `urls`
+        :rtype: list
+        """
+
+        semaphore = asyncio.Semaphore(
+            max(1, min(self.MAX_WORKERS, self.pool_size)))
 
+        async def fetch(url):
+            async with semaphore:
+                return await self._swapi_request(url)
+
+        return list(await asyncio.gather(*(fetch(u) for u in urls)))
+
+    async def _swapi_request(self, url: str) -> Optional[dict]:
+        """Process single Star Wars API request. See
+        `SWAPI._swapi_request`. Requests failed on timeout or HTTP 5xx
+        status are retried with exponential backoff.
+
+        :param url: API endpoint URL
+        :type url: str
+        :return: dict object representing result value.
+            In case of error, returns None
+        :rtype: dict, optional
+        """
+
+        cache_entry = None
+        if self.http_cache is not None:
+            with instrument.span('swapi.cache'):
+                cache_entry = await sync_to_async(
+                    self.http_cache.get, thread_sensitive=False)(url)
+            if cache_entry is not None and \
+                    self.http_cache.is_fresh(cache_entry):
+                log.info('HTTP cache fresh: %s', url)
+                return cache_entry['data']
+
+        log.info('Sending SWAPI request ...')
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                with instrument.span('swapi.request'):
+                    r = await self.client.get(
+                        url,
+                        headers=HTTPCache.conditional_headers(cache_entry))
+            except httpx.TimeoutException:
+                if attempt < self.max_retries:
+                    continue
+                log.error('Request timeout')
+                return
+            except httpx.TransportError as e:
+                log.error('Connection error: %s', e)
+                return
+            except Exception as e:
+                log.error('%s', e)
+                return
+            if r.status_code not in self.RETRY_STATUSES:
+                break
+
+        with instrument.span('swapi.process'):
+            return await sync_to_async(
+                self._response_process, thread_sensitive=False)(
+                url, r, cache_entry)
+
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> SWAPI:
+    """Get process-wide SWAPI client, so pooled connections are reused
+    across requests handled by the same worker process.
+
+    :return: Shared SWAPI client
+    :rtype: SWAPI
+    """
+
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SWAPI(
+                http_cache=HTTPCache.from_settings(),
+                host=settings.SWAPI_HOST)
+            atexit.register(_client.close)
+        return _client
+
+
+def get_async_client() -> AsyncSWAPI:
+    """Get process-wide asynchronous SWAPI client, so pooled
+    connections are reused across requests handled by the same event
+    loop.
+
+    :return: Shared asynchronous SWAPI client
+    :rtype: AsyncSWAPI
+    """
 
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            _async_client = AsyncSWAPI(
+                http_cache=HTTPCache.from_settings(),
+                host=settings.SWAPI_HOST)
+        return _async_client
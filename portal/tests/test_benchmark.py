@@ -0,0 +1,110 @@
+import csv
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+
+from portal import benchmark
+from portal import models
+
+
+class BenchmarkTest(TestCase):
+    """Test benchmark of collection read paths"""
+
+    def test_collection_csv_write(self):
+        """collection_csv_write function test
+
+        Collection file has the header and the rows, it is
+        deterministic for the seed
+        """
+
+        with tempfile.TemporaryDirectory() as d:
+            paths = [os.path.join(d, '%s.csv' % i) for i in range(3)]
+            benchmark.collection_csv_write(paths[0], 50, seed=1)
+            benchmark.collection_csv_write(paths[1], 50, seed=1)
+            benchmark.collection_csv_write(paths[2], 50, seed=2)
+            contents = []
+            for path in paths:
+                with open(path, newline='') as f:
+                    contents.append(list(csv.reader(f)))
+
+        self.assertEqual(contents[0][0], list(benchmark.HEADER))
+        self.assertEqual(len(contents[0]), 51)
+        self.assertEqual(contents[0][50][0], 'People 50')
+        self.assertEqual(contents[0], contents[1])
+        self.assertNotEqual(contents[0], contents[2])
+
+    def test_benchmark_run(self):
+        """benchmark_run function test
+
+        - Every case of every storage variant is timed
+        - Neither DB nor MEDIA_ROOT is changed
+        """
+
+        media_files = sorted(os.listdir(settings.MEDIA_ROOT))
+        collections_count = models.Collection.objects.count()
+        progress = []
+
+        results = benchmark.benchmark_run(
+            [25], repeat=2, progress=progress.append)
+
+        self.assertEqual(progress, results)
+        self.assertEqual(
+            [(r['rows'], r['storage'], r['case']) for r in results],
+            [(25, variant, case)
+             for variant in benchmark.STORAGE_VARIANTS
+             for case in benchmark.CASES])
+        for result in results:
+            self.assertEqual(result['runs'], 2)
+            self.assertTrue(0 < result['min'] <= result['median'])
+        self.assertEqual(sorted(os.listdir(settings.MEDIA_ROOT)), media_files)
+        self.assertEqual(models.Collection.objects.count(), collections_count)
+
+    def test_results_compare(self):
+        """results_compare function test
+
+        Median timings are compared with the matching baseline results
+        """
+
+        results = [
+            {'rows': 10, 'storage': 'csv', 'case': 'detail_first',
+             'median': 0.3},
+            {'rows': 10, 'storage': 'csv', 'case': 'stats_single',
+             'median': 0.1},
+        ]
+        baseline = [
+            {'rows': 10, 'storage': 'csv', 'case': 'detail_first',
+             'median': 0.2},
+        ]
+        comparison = benchmark.results_compare(results, baseline)
+        self.assertEqual(len(comparison), 1)
+        self.assertEqual(comparison[0]['baseline'], 0.2)
+        self.assertAlmostEqual(comparison[0]['ratio'], 1.5)
+
+    def test_command(self):
+        """benchmark command test
+
+        Results are written to JSON file and compared with previous
+        results
+        """
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'results.json')
+            call_command(
+                'benchmark', rows=[20], storage=['columnar'], repeat=1,
+                json_path=path, stdout=StringIO())
+            with open(path) as f:
+                results = json.load(f)['results']
+            self.assertEqual(len(results), len(benchmark.CASES))
+
+            out = StringIO()
+            call_command(
+                'benchmark', rows=[20], storage=['columnar'], repeat=1,
+                compare_path=path, stdout=out)
+        self.assertIn('Comparison of median timings', out.getvalue())
+        self.assertEqual(
+            out.getvalue().count('20 rows'), 2 * len(benchmark.CASES))
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+import petl as etl
+
+from portal import columnar
+
+
+class TestColumnar(unittest.TestCase):
+    """Test columnar binary format module"""
+
+    ROWS = [('name', 'eye_color', 'gender', 'homeworld')] + [
+        ('Person %s' % i,
+         ('blue', 'red', 'brown, grey')[i % 3],
+         ('male', 'female', 'n/a')[i % 2],
+         ('Tatooine', 'Naboo', 'Alderaan', 'Žár')[i % 4])
+        for i in range(40)]
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._csv_path = os.path.join(self._dir.name, 'file.csv')
+        etl.tocsv(self.ROWS, self._csv_path)
+        self._path = os.path.join(self._dir.name, 'file.csv.col')
+        columnar.columnar_write(self._csv_path, self._path)
+        self._table = etl.fromcsv(self._csv_path)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_header(self):
+        """Header and row count of the file"""
+
+        reader = columnar.ColumnarReader(self._path)
+        self.assertEqual(reader.header, list(self.ROWS[0]))
+        self.assertEqual(reader.rows_count, len(self.ROWS) - 1)
+
+    def test_encoding(self):
+        """Low cardinality columns are dictionary-encoded"""
+
+        reader = columnar.ColumnarReader(self._path)
+        self.assertIsInstance(
+            reader._columns['name'], columnar._PlainColumn)
+        self.assertIsInstance(
+            reader._columns['gender'], columnar._DictColumn)
+
+    def test_rows(self):
+        """rows method test
+
+        Rows must be the same as parsed by `petl`.
+        """
+
+        reader = columnar.ColumnarReader(self._path)
+        for start, stop in ((0, 10), (35, 45), (50, 60), (3, 3)):
+            self.assertEqual(
+                reader.rows(start, stop),
+                [tuple(r) for r in etl.records(self._table, start, stop)])
+
+    def test_value_counts(self):
+        """value_counts method test
+
+        Counts (including their order) must be the same as counted by
+        `petl.valuecounts`.
+        """
+
+        reader = columnar.ColumnarReader(self._path)
+        for fields in (('gender',), ('name',), ('eye_color', 'gender'),
+                       ('homeworld', 'name')):
+            expected = etl.data(
+                etl.valuecounts(self._table, *fields).cutout('frequency'))
+            self.assertEqual(reader.value_counts(fields), list(expected))
+
+    def test_incorrect_file(self):
+        """Incorrect file can not be read"""
+
+        with self.assertRaises(ValueError):
+            columnar.ColumnarReader(self._csv_path)
@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import petl as etl
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from portal import enrich
+from portal import swapi
+
+PEOPLE = [
+    {'name': 'Luke', 'homeworld': 'planet_1',
+     'films': ['film_1', 'film_2']},
+    {'name': 'Leia', 'homeworld': 'planet_2', 'films': ['film_1']},
+    {'name': 'R2-D2', 'homeworld': 'planet_unknown', 'films': []},
+]
+RESOURCES = {
+    'planet_1': {'url': 'planet_1', 'name': 'Tatooine'},
+    'planet_2': {'url': 'planet_2', 'name': 'Alderaan'},
+    'film_1': {'url': 'film_1', 'title': 'A New Hope'},
+    'film_2': {'url': 'film_2', 'title': 'The Empire Strikes Back'},
+}
+REFERENCES = {'homeworld': 'planets', 'films': 'films'}
+
+
+class EnrichmentStageTest(SimpleTestCase):
+    """Test enrich module"""
+
+    def _resources_get(self, urls):
+        return {u: RESOURCES[u] for u in urls if u in RESOURCES}
+
+    def _transform(self, stage, people):
+        stage.prepare(people)
+        return etl.values(
+            stage.apply(etl.fromdicts(people, header=('name',) + tuple(
+                REFERENCES))), 'homeworld', 'films')
+
+    def test_stage_lazy(self):
+        """EnrichmentStage test - lazy mode
+
+        - Single and list-valued references are replaced by names
+        - Unknown references are replaced by `MISSING`
+        - Every resource is requested once for all the pages (including
+          the unavailable ones)
+        """
+
+        client = mock.Mock()
+        client.resources_get.side_effect = self._resources_get
+        stage = enrich.EnrichmentStage(
+            REFERENCES, enrich.ResourceIndex(client))
+
+        self.assertEqual(list(self._transform(stage, PEOPLE[:2])), [
+            ('Tatooine', 'A New Hope, The Empire Strikes Back'),
+            ('Alderaan', 'A New Hope')])
+        self.assertEqual(list(self._transform(stage, PEOPLE)), [
+            ('Tatooine', 'A New Hope, The Empire Strikes Back'),
+            ('Alderaan', 'A New Hope'),
+            (enrich.MISSING, '')])
+        self.assertEqual(sorted(client.resources_get.call_args_list), [
+            mock.call(['film_1', 'film_2']),
+            mock.call(['planet_1', 'planet_2']),
+            mock.call(['planet_unknown'])])
+        stage.prepare(PEOPLE)
+        self.assertEqual(client.resources_get.call_count, 3)
+
+    def test_stage_prefetch(self):
+        """EnrichmentStage test - prefetch mode
+
+        Every resource list is fetched once, even if it was not
+        referenced yet
+        """
+
+        client = mock.Mock()
+        client.resource_list_get.side_effect = lambda resource_type: [
+            r for u, r in RESOURCES.items()
+            if u.startswith(resource_type[:-1])]
+        stage = enrich.EnrichmentStage(
+            REFERENCES, enrich.ResourceIndex(client, prefetch=True))
+
+        stage.prepare([])
+        self.assertEqual(list(self._transform(stage, PEOPLE)), [
+            ('Tatooine', 'A New Hope, The Empire Strikes Back'),
+            ('Alderaan', 'A New Hope'),
+            (enrich.MISSING, '')])
+        self.assertEqual(sorted(client.resource_list_get.call_args_list), [
+            mock.call('films'), mock.call('planets')])
+        client.resources_get.assert_not_called()
+
+    def test_stage_error(self):
+        """EnrichmentStage test
+
+        Error of resource request raises SWAPIError
+        """
+
+        client = mock.Mock()
+        client.resources_get.return_value = None
+        stage = enrich.EnrichmentStage(
+            REFERENCES, enrich.ResourceIndex(client))
+        with self.assertRaises(swapi.SWAPIError):
+            stage.prepare(PEOPLE)
+
+    def test_stage_async(self):
+        """EnrichmentStage test - asynchronous client
+
+        Resources are indexed by the asynchronous client
+        """
+
+        async def resources_get(urls):
+            return self._resources_get(urls)
+
+        client = mock.Mock()
+        client.resources_get.side_effect = resources_get
+        stage = enrich.EnrichmentStage(
+            REFERENCES, enrich.ResourceIndex(client))
+
+        async_to_sync(stage.prepare_async)(PEOPLE)
+        self.assertEqual(len(stage.index), 4)
+        self.assertEqual(stage.index.get('planet_1')['name'], 'Tatooine')
+
+    def test_index_prefetch_shared(self):
+        """ResourceIndex test - prefetch mode
+
+        Index shared by several threads fetches every resource list
+        once
+        """
+
+        client = mock.Mock()
+        client.resource_list_get.side_effect = lambda resource_type: [
+            r for u, r in RESOURCES.items()
+            if u.startswith(resource_type[:-1])]
+        index = enrich.ResourceIndex(client, prefetch=True)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            index.lists_prefetch(['planets'], executor)
+            list(executor.map(
+                lambda resource_type: index.resolve(resource_type, []),
+                ['planets', 'films'] * 4))
+        self.assertEqual(sorted(client.resource_list_get.call_args_list), [
+            mock.call('films'), mock.call('planets')])
+        self.assertEqual(len(index), 4)
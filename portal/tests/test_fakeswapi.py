@@ -0,0 +1,106 @@
+import tempfile
+from unittest import mock
+
+import petl as etl
+from django.test import SimpleTestCase, override_settings
+
+from portal import fakeswapi
+from portal import ingest
+from portal import storage
+from portal import swapi
+from portal.httpcache import HTTPCache
+
+
+class FakeSWAPIServerTest(SimpleTestCase):
+    """Test local stand-in of Star Wars API"""
+
+    def setUp(self):
+        self._server = fakeswapi.FakeSWAPIServer(
+            counts={'people': 25, 'planets': 5}, page_size=10)
+        self._server.start()
+        self._swapi = swapi.SWAPI(host=self._server.base_url, max_retries=0)
+
+    def tearDown(self):
+        self._swapi.close()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def test_list_pages(self):
+        """List pages of resource type are served
+
+        - All the resources are served on pages of the page size
+        - References point to the resources of the server
+        """
+
+        pages = list(self._swapi.resource_pages_iter('people'))
+        self.assertEqual([len(p) for p in pages], [10, 10, 5])
+        self.assertEqual(pages[2][4]['name'], 'People 25')
+        homeworld = pages[0][0]['homeworld']
+        self.assertTrue(homeworld.startswith(self._server.base_url))
+        self.assertEqual(
+            self._swapi.resources_get([homeworld])[homeworld]['url'],
+            homeworld)
+
+    def test_conditional_request(self):
+        """Responses carry ETag: Cached response is revalidated by
+        conditional request and answered with 304 Not Modified
+        """
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self._swapi.http_cache = HTTPCache(cache_dir, freshness=3600)
+            people = self._swapi.people_get()
+            requests_count = self._server.requests_count
+            with self.assertLogs('portal') as logs:
+                self.assertEqual(self._swapi.people_get(), people)
+        self.assertEqual(
+            self._server.requests_count, 2 * requests_count)
+        self.assertEqual(
+            sum('[304] Not modified' in m for m in logs.output),
+            requests_count)
+
+    def test_dataset_deterministic(self):
+        """Datasets of the same seed are the same"""
+
+        dataset = fakeswapi.FakeDataset(
+            self._server.base_url, {'people': 25, 'planets': 5})
+        self.assertEqual(dataset.resources, self._server.dataset.resources)
+
+    def test_not_found(self):
+        """Unknown resources and pages are not found"""
+
+        self.assertEqual(self._server.response_get('/api/ships/')[0], 404)
+        self.assertEqual(
+            self._server.response_get('/api/people/26/')[0], 404)
+        self.assertEqual(
+            self._server.response_get('/api/people/?page=4')[0], 404)
+
+    def test_error_injection(self):
+        """Every request fails with error rate 1"""
+
+        self._server.error_rate = 1
+        self.assertEqual(self._swapi.people_get(), None)
+        self.assertEqual(self._server.errors_count, 1)
+
+    @override_settings(INGEST_ENRICHED_FIELDS={'people': ('homeworld',)})
+    def test_collection_ingest(self):
+        """Collection is ingested from the server"""
+
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root), \
+                mock.patch('portal.swapi.get_client',
+                           return_value=self._swapi):
+            file_name = ingest.collection_ingest()
+            table = etl.fromcsv(storage.collection_path(file_name))
+            self.assertEqual(etl.nrows(table), 25)
+            self.assertTrue(all(
+                v.startswith('Planets ') for v in etl.values(
+                    table, 'homeworld')))
+
+    def test_counts_parse(self):
+        """counts_parse function test"""
+
+        self.assertEqual(
+            fakeswapi.counts_parse(['people=5000', 'planets=10']),
+            {'people': 5000, 'planets': 10})
+        with self.assertRaises(ValueError):
+            fakeswapi.counts_parse(['ships=10'])
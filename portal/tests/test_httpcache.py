@@ -0,0 +1,85 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from portal import httpcache
+
+
+class TestHTTPCache(unittest.TestCase):
+    """Test on-disk HTTP cache module"""
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._cache = httpcache.HTTPCache(self._dir.name, freshness=60)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_get_missing(self):
+        """get method test
+
+        There is no entry for the URL. None must be returned.
+        """
+
+        self.assertEqual(self._cache.get('testing_url'), None)
+
+    def test_set_get(self):
+        """set and get methods test
+
+        Stored entry must be returned with its validators.
+        """
+
+        self._cache.set('testing_url', {'results': [1]}, {'ETag': '"abc"'})
+        entry = self._cache.get('testing_url')
+        self.assertEqual(entry['data'], {'results': [1]})
+        self.assertEqual(entry['etag'], '"abc"')
+        self.assertEqual(entry['last_modified'], None)
+
+    def test_conditional_headers(self):
+        """conditional_headers method test
+
+        Headers are created just for present validators.
+        """
+
+        self.assertEqual(self._cache.conditional_headers(None), {})
+        entry = self._cache.set('testing_url', {}, {
+            'ETag': '"abc"',
+            'Last-Modified': 'Sat, 20 Dec 2014 21:17:56 GMT'})
+        self.assertEqual(self._cache.conditional_headers(entry), {
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Sat, 20 Dec 2014 21:17:56 GMT'})
+
+    def test_is_fresh(self):
+        """is_fresh method test
+
+        - Entry with validators is never fresh: it must be revalidated
+        - Entry without validators is fresh within freshness window
+        """
+
+        entry = self._cache.set('testing_url', {}, {'ETag': '"abc"'})
+        self.assertFalse(self._cache.is_fresh(entry))
+        entry = self._cache.set('testing_url', {}, {})
+        self.assertTrue(self._cache.is_fresh(entry))
+        entry['stored'] = time.time() - 120
+        self.assertFalse(self._cache.is_fresh(entry))
+
+    def test_clear(self):
+        """clear method test"""
+
+        self._cache.set('testing_url', {}, {})
+        self._cache.clear()
+        self.assertEqual(self._cache.get('testing_url'), None)
+
+    def test_set_error(self):
+        """set method test
+
+        Write error is logged, no temporary file is left
+        """
+
+        with mock.patch('json.dump', side_effect=OSError('Test error')), \
+                self.assertLogs('portal', 'ERROR'):
+            self._cache.set('testing_url', {}, {})
+        self.assertEqual(self._cache.get('testing_url'), None)
+        self.assertEqual(os.listdir(self._dir.name), [])
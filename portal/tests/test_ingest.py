@@ -0,0 +1,381 @@
+import os
+import tempfile
+from unittest import mock
+
+import dateutil.parser
+import petl as etl
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, override_settings
+
+from portal import ingest
+from portal import storage
+from portal import swapi
+
+
+def _person(name, homeworld, edited):
+    """Prepare dict representing SW character data"""
+
+    return {
+        'name': name, 'height': '172', 'mass': '77', 'hair_color': 'blond',
+        'skin_color': 'fair', 'eye_color': 'blue', 'birth_year': '19BBY',
+        'gender': 'male', 'homeworld': homeworld,
+        'films': [], 'species': [], 'vehicles': [], 'starships': [],
+        'created': '2014-12-09T13:50:51.644000Z', 'edited': edited,
+        'url': 'https://swapi.dev/api/people/%s/' % name}
+
+
+class DatesParseTest(SimpleTestCase):
+    """Test parsing of `edited` timestamps"""
+
+    def test_dates_parse(self):
+        """_dates_parse function test
+
+        Dates are the same as dates parsed by `dateutil` for ISO
+        timestamps as well as for other formats
+        """
+
+        values = [
+            '2014-12-20T21:17:56.891000Z', '2014-12-20T21:17:56Z',
+            '2014-12-20T23:17:56+05:00', '2014-12-20T21:17:56.891-0800',
+            '2014-12-20 21:17:56', 'Dec 21 2014',
+            '2014-12-20T21:17:56.891000Z']
+        self.assertEqual(
+            ingest._dates_parse(values),
+            [dateutil.parser.parse(v).strftime('%Y-%m-%d') for v in values])
+
+    def test_dates_parse_invalid(self):
+        """_dates_parse function test
+
+        Invalid ISO timestamp is not accepted by the fast path
+        """
+
+        with self.assertRaises(ValueError):
+            ingest._dates_parse(['2014-02-30T21:17:56Z'])
+
+
+@override_settings(SWAPI_HOMEWORLD_RESOLUTION='lazy')
+class IngestTest(SimpleTestCase):
+    """Test ingest module"""
+
+    def setUp(self):
+        self._media_root = tempfile.TemporaryDirectory()
+        self._override = override_settings(
+            MEDIA_ROOT=self._media_root.name)
+        self._override.enable()
+
+    def tearDown(self):
+        self._override.disable()
+        self._media_root.cleanup()
+
+    @mock.patch('portal.swapi.SWAPI.resources_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_collection_ingest(self, mock_people, mock_resources):
+        """collection_ingest function test
+
+        - Collection file contains transformed people
+        - Keys sidecar file contains `url` and `edited` of people
+        """
+
+        mock_people.return_value = [[
+            _person('luke', 'planet_1', '2014-12-20T21:17:56.891000Z')]]
+        mock_resources.return_value = {'planet_1': {'name': 'Tatooine'}}
+        file_name = ingest.collection_ingest()
+
+        table = etl.fromcsv(storage.collection_path(file_name))
+        self.assertEqual(etl.header(table), (
+            'name', 'height', 'mass', 'hair_color', 'skin_color',
+            'eye_color', 'birth_year', 'gender', 'homeworld', 'date'))
+        self.assertEqual(
+            etl.values(table, 'homeworld', 'date')[0],
+            ('Tatooine', '2014-12-20'))
+        keys = etl.fromcsv(storage.collection_path(file_name, 'keys'))
+        self.assertEqual(list(etl.data(keys)), [(
+            'https://swapi.dev/api/people/luke/',
+            '2014-12-20T21:17:56.891000Z')])
+
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_collection_ingest_error(self, mock_people):
+        """collection_ingest function test
+
+        SWAPI error: None is returned and no file is written
+        """
+
+        mock_people.side_effect = swapi.SWAPIError('Test error')
+        self.assertEqual(ingest.collection_ingest(), None)
+        self.assertEqual(os.listdir(self._media_root.name), [])
+
+    @mock.patch('portal.swapi.SWAPI.resources_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_collection_ingest_incremental(self, mock_people, mock_resources):
+        """collection_ingest function test - incremental mode
+
+        - Unchanged rows are reused from the previous collection
+        - Changed and new people are transformed
+        - Just homeworlds of changed people are requested
+        - Order of people is kept
+        """
+
+        mock_people.return_value = [[
+            _person('luke', 'planet_1', '2014-12-20T21:17:56.891000Z'),
+            _person('owen', 'planet_1', '2014-12-20T21:17:56.891000Z')]]
+        mock_resources.return_value = {'planet_1': {'name': 'Tatooine'}}
+        previous = ingest.collection_ingest()
+
+        # Mark the reused row, so it is recognizable
+        path = storage.collection_path(previous)
+        etl.tocsv(etl.fromcsv(path).convert('name', lambda v: v.upper()),
+                  path + '.tmp')
+        etl.tocsv(etl.fromcsv(path + '.tmp'), path)
+
+        mock_people.return_value = [[
+            _person('biggs', 'planet_2', '2014-12-21T10:00:00.000000Z'),
+            _person('luke', 'planet_1', '2014-12-20T21:17:56.891000Z'),
+            _person('owen', 'planet_3', '2014-12-22T10:00:00.000000Z')]]
+        mock_resources.return_value = {
+            'planet_2': {'name': 'Alderaan'}, 'planet_3': {'name': 'Naboo'}}
+        file_name = ingest.collection_ingest(previous)
+        self.assertEqual(
+            set(mock_resources.call_args[0][0]), {'planet_2', 'planet_3'})
+
+        table = etl.fromcsv(storage.collection_path(file_name))
+        self.assertEqual(list(etl.values(table, 'name')), [
+            'biggs', 'LUKE', 'owen'])
+        self.assertEqual(list(etl.values(table, 'homeworld')), [
+            'Alderaan', 'Tatooine', 'Naboo'])
+
+    @mock.patch('portal.swapi.SWAPI.resources_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_collection_ingest_deduplicated(self, mock_people, mock_resources):
+        """collection_ingest function test
+
+        Identical collections are stored within the same file.
+        No temporary file is left.
+        """
+
+        mock_people.return_value = [[
+            _person('luke', 'planet_1', '2014-12-20T21:17:56.891000Z')]]
+        mock_resources.return_value = {'planet_1': {'name': 'Tatooine'}}
+        file_name = ingest.collection_ingest()
+        self.assertEqual(ingest.collection_ingest(), file_name)
+        self.assertEqual(
+            [f for f in os.listdir(self._media_root.name)
+             if not f.startswith(file_name + '.')],
+            [file_name])
+
+    @mock.patch('portal.swapi.SWAPI.resources_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_collection_ingest_pages(self, mock_people, mock_resources):
+        """collection_ingest function test - people pages
+
+        - Pages are written in order, homeworlds are requested per page
+            and just once
+        - Error on later page: None is returned and no file is left
+        """
+
+        def pages(error=False):
+            yield [_person('luke', 'planet_1', '2014-12-20T21:17:56.891000Z')]
+            if error:
+                raise swapi.SWAPIError('Test error')
+            yield [_person('owen', 'planet_1', '2014-12-20T21:17:56.891000Z'),
+                   _person('biggs', 'planet_2', '2014-12-21T10:00:00.000000Z')]
+
+        mock_people.side_effect = lambda resource_type: pages()
+        mock_resources.side_effect = lambda urls: {
+            u: {'name': u.upper()} for u in urls}
+        file_name = ingest.collection_ingest()
+        table = etl.fromcsv(storage.collection_path(file_name))
+        self.assertEqual(list(etl.values(table, 'name')), [
+            'luke', 'owen', 'biggs'])
+        self.assertEqual(list(etl.values(table, 'homeworld')), [
+            'PLANET_1', 'PLANET_1', 'PLANET_2'])
+        self.assertEqual(
+            [call[0][0] for call in mock_resources.call_args_list],
+            [['planet_1'], ['planet_2']])
+
+        mock_people.side_effect = lambda resource_type: pages(error=True)
+        files = sorted(os.listdir(self._media_root.name))
+        self.assertEqual(ingest.collection_ingest(), None)
+        self.assertEqual(sorted(os.listdir(self._media_root.name)), files)
+
+    @mock.patch('portal.swapi.AsyncSWAPI.resources_get')
+    @mock.patch('portal.swapi.AsyncSWAPI.resource_pages_iter')
+    def test_collection_ingest_async_pages(
+            self, mock_people, mock_resources):
+        """collection_ingest_async function test - people pages
+
+        - Pages are written in order, homeworlds are requested per page
+            and just once
+        - Error on later page: None is returned and no file is left
+        """
+
+        async def pages(error=False):
+            yield [_person('luke', 'planet_1', '2014-12-20T21:17:56.891000Z')]
+            if error:
+                raise swapi.SWAPIError('Test error')
+            yield [_person('owen', 'planet_1', '2014-12-20T21:17:56.891000Z'),
+                   _person('biggs', 'planet_2', '2014-12-21T10:00:00.000000Z')]
+
+        async def resources_get(urls):
+            return {u: {'name': u.upper()} for u in urls}
+
+        mock_people.side_effect = lambda resource_type: pages()
+        mock_resources.side_effect = resources_get
+        file_name = async_to_sync(ingest.collection_ingest_async)()
+        table = etl.fromcsv(storage.collection_path(file_name))
+        self.assertEqual(list(etl.values(table, 'name')), [
+            'luke', 'owen', 'biggs'])
+        self.assertEqual(list(etl.values(table, 'homeworld')), [
+            'PLANET_1', 'PLANET_1', 'PLANET_2'])
+        self.assertEqual(
+            [sorted(call[0][0]) for call in mock_resources.call_args_list],
+            [['planet_1'], ['planet_2']])
+
+        mock_people.side_effect = lambda resource_type: pages(error=True)
+        files = sorted(os.listdir(self._media_root.name))
+        self.assertEqual(
+            async_to_sync(ingest.collection_ingest_async)(), None)
+        self.assertEqual(sorted(os.listdir(self._media_root.name)), files)
+
+    @override_settings(
+        INGEST_ENRICHED_FIELDS={'people': ('homeworld', 'films')})
+    @mock.patch('portal.swapi.SWAPI.resources_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_collection_ingest_enriched(self, mock_people, mock_resources):
+        """collection_ingest function test - enriched fields
+
+        Enriched list-valued field is kept within the collection and its
+        references are replaced by titles of films
+        """
+
+        person = _person('luke', 'planet_1', '2014-12-20T21:17:56.891000Z')
+        person['films'] = ['film_1', 'film_2']
+        mock_people.return_value = [[person]]
+        mock_resources.side_effect = lambda urls: {
+            u: {'name': u.upper(), 'title': u.title()} for u in urls}
+        file_name = ingest.collection_ingest()
+
+        table = etl.fromcsv(storage.collection_path(file_name))
+        self.assertIn('films', etl.header(table))
+        self.assertEqual(
+            etl.values(table, 'homeworld', 'films')[0],
+            ('PLANET_1', 'Film_1, Film_2'))
+        self.assertEqual(
+            sorted(call[0][0] for call in mock_resources.call_args_list),
+            [['film_1', 'film_2'], ['planet_1']])
+
+    @mock.patch('portal.swapi.SWAPI.resources_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_collections_ingest(self, mock_pages, mock_resources):
+        """collections_ingest function test
+
+        - Collection of every resource type is written, transformation
+            follows the schema of the resource type
+        - Error of one resource type does not affect others
+        """
+
+        def pages(resource_type):
+            if resource_type == 'starships':
+                raise swapi.SWAPIError('Test error')
+            record = _person(
+                resource_type, 'planet_1', '2014-12-20T21:17:56.891000Z')
+            if resource_type == 'planets':
+                record['residents'] = []
+            elif resource_type == 'species':
+                record['people'] = []
+            return [[record]]
+
+        mock_pages.side_effect = pages
+        mock_resources.side_effect = lambda urls: {
+            u: {'name': u.upper()} for u in urls}
+        file_names = ingest.collections_ingest(
+            {'people': None, 'planets': None, 'species': None,
+             'starships': None})
+
+        self.assertEqual(file_names['starships'], None)
+        header = etl.header(etl.fromcsv(
+            storage.collection_path(file_names['planets'])))
+        self.assertNotIn('residents', header)
+        self.assertIn('homeworld', header)
+        header = etl.header(etl.fromcsv(
+            storage.collection_path(file_names['species'])))
+        self.assertNotIn('people', header)
+        for resource_type in ('people', 'species'):
+            table = etl.fromcsv(
+                storage.collection_path(file_names[resource_type]))
+            self.assertEqual(
+                etl.values(table, 'homeworld', 'date')[0],
+                ('PLANET_1', '2014-12-20'))
+
+    @override_settings(
+        INGEST_ENRICHED_FIELDS={
+            'people': ('homeworld',), 'species': ('homeworld',),
+            'planets': ('films',), 'films': ('planets',)})
+    def test_ingestion_waves(self):
+        """_ingestion_waves function test
+
+        - Referenced types are ingested before the referencing ones
+        - Types referencing each other are ingested together
+        """
+
+        waves, referenced = ingest._ingestion_waves(
+            ['people', 'species', 'planets', 'films', 'starships'])
+        self.assertEqual(waves, [
+            ['planets', 'films', 'starships'], ['people', 'species']])
+        self.assertEqual(referenced, {'planets', 'films'})
+
+    @mock.patch('portal.swapi.SWAPI.resource_list_get')
+    @mock.patch('portal.swapi.SWAPI.resources_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_collections_ingest_indexed(
+            self, mock_pages, mock_resources, mock_list):
+        """collections_ingest function test - referenced types
+
+        Planets ingested by the job are added into the index, they are
+        requested neither by lazy nor by prefetch mode
+        """
+
+        def pages(resource_type):
+            if resource_type == 'planets':
+                return iter([[{
+                    'name': 'Tatooine', 'residents': [], 'films': [],
+                    'created': '', 'edited': '2014-12-20T21:17:56.891000Z',
+                    'url': 'planet_1'}]])
+            return iter([[_person(
+                'luke', 'planet_1', '2014-12-20T21:17:56.891000Z')]])
+
+        mock_pages.side_effect = pages
+        for resolution in ('lazy', 'prefetch'):
+            with override_settings(SWAPI_HOMEWORLD_RESOLUTION=resolution):
+                file_names = ingest.collections_ingest(
+                    {'people': None, 'planets': None})
+            table = etl.fromcsv(
+                storage.collection_path(file_names['people']))
+            self.assertEqual(etl.values(table, 'homeworld')[0], 'Tatooine')
+        mock_resources.assert_not_called()
+        mock_list.assert_not_called()
+
+    @mock.patch('portal.swapi.AsyncSWAPI.resources_get')
+    @mock.patch('portal.swapi.AsyncSWAPI.resource_pages_iter')
+    def test_collections_ingest_async_indexed(
+            self, mock_pages, mock_resources):
+        """collections_ingest_async function test - referenced types
+
+        Planets ingested by the job are not requested again
+        """
+
+        async def pages(resource_type):
+            if resource_type == 'planets':
+                yield [{
+                    'name': 'Tatooine', 'residents': [], 'films': [],
+                    'created': '', 'edited': '2014-12-20T21:17:56.891000Z',
+                    'url': 'planet_1'}]
+            else:
+                yield [_person(
+                    'luke', 'planet_1', '2014-12-20T21:17:56.891000Z')]
+
+        mock_pages.side_effect = pages
+        file_names = async_to_sync(ingest.collections_ingest_async)(
+            {'people': None, 'planets': None})
+        table = etl.fromcsv(storage.collection_path(file_names['people']))
+        self.assertEqual(etl.values(table, 'homeworld')[0], 'Tatooine')
+        mock_resources.assert_not_called()
@@ -0,0 +1,200 @@
+import threading
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from portal import instrument
+from portal import storage
+from portal.models import Collection
+
+PEOPLE = [
+    {'name': 'Luke Skywalker', 'eye_color': 'blue', 'homeworld': 'planet_1',
+     'edited': '2014-12-20T21:17:56.891000Z', 'created': '', 'url': 'p1'},
+]
+
+
+class InstrumentTest(SimpleTestCase):
+    """Test instrument module"""
+
+    def test_histogram(self):
+        """Histogram test
+
+        Bucket counts are cumulative, label values are escaped
+        """
+
+        histogram = instrument.Histogram(
+            'test_seconds', 'Test.', ('span',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value, 'a"b')
+        self.assertEqual(list(histogram.render()), [
+            '# HELP test_seconds Test.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{span="a\\"b",le="0.1"} 1',
+            'test_seconds_bucket{span="a\\"b",le="1"} 3',
+            'test_seconds_bucket{span="a\\"b",le="+Inf"} 4',
+            'test_seconds_sum{span="a\\"b"} 6.05',
+            'test_seconds_count{span="a\\"b"} 4'])
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_span_disabled(self):
+        """span function test - disabled instrumentation
+
+        Nothing is timed
+        """
+
+        with instrument.timings_collect('test') as timings:
+            self.assertIsNone(timings)
+            with instrument.span('test.disabled') as span:
+                self.assertIsNone(span)
+        self.assertNotIn('test.disabled', instrument.metrics_render())
+
+    @override_settings(INSTRUMENTATION_ENABLED=True)
+    def test_timings_collect(self):
+        """timings_collect function test
+
+        - Spans of the same name are summed up
+        - Spans on other threads are recorded within bound functions
+        - Timings of nested context are recorded into the outer one
+        - Timings are logged
+        """
+
+        def run():
+            with instrument.span('test.thread'):
+                pass
+
+        with self.assertLogs('portal.timing') as logs, \
+                instrument.timings_collect('test') as timings:
+            with instrument.timings_collect('test.nested') as nested:
+                for _ in range(2):
+                    with instrument.span('test.span'):
+                        pass
+            thread = threading.Thread(target=instrument.context_bind(run))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(
+            {name: span['count'] for name, span in nested.summary().items()},
+            {'test.span': 2})
+        self.assertEqual(
+            {name: span['count']
+             for name, span in timings.summary().items()},
+            {'test.span': 2, 'test.nested': 1, 'test.thread': 1})
+        self.assertRegex(
+            timings.server_timing(),
+            r'^test\.span;dur=[\d.]+;desc="x2", test\.nested;dur=[\d.]+, '
+            r'test\.thread;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(logs.records[1].timing['name'], 'test')
+        self.assertEqual(
+            logs.records[1].timing['spans']['test.span']['count'], 2)
+        self.assertIn(
+            'portal_span_duration_seconds_count{span="test.thread"}',
+            instrument.metrics_render())
+
+
+class TimingMiddlewareTest(TestCase):
+    """Test timing middleware and /metrics view"""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Set the collection used by testing methods"""
+
+        cls.col = Collection(file_name='file.csv')
+        cls.col.file = SimpleUploadedFile(
+            'file.csv',
+            b'''name,eye_color,homeworld,date
+            Luke Skywalker,blue,Tatooine,2014-12-20
+            C-3PO,yellow,Tatooine,2014-12-20''')
+        cls.col.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        storage.collection_delete(cls.col.file_name)
+        cls.col.file.delete()
+        super().tearDownClass()
+
+    def _spans_get(self, response):
+        """Span names of Server-Timing header"""
+
+        return [
+            metric.split(';')[0]
+            for metric in response['Server-Timing'].split(', ')]
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_disabled(self):
+        """Disabled instrumentation test
+
+        Responses have no Server-Timing header, metrics are not found
+        """
+
+        response = self.client.get('/collections/%s/' % self.col.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(INSTRUMENTATION_ENABLED=True)
+    def test_detail(self):
+        """Collection detail test
+
+        - Stages are reported by Server-Timing header and log record
+        - Request duration is observed by the histogram
+        """
+
+        with self.assertLogs('portal.timing') as logs:
+            response = self.client.get('/collections/%s/' % self.col.pk)
+        self.assertEqual(
+            self._spans_get(response),
+            ['collection.lookup', 'collection.metadata', 'collection.rows',
+             'render', 'total'])
+        self.assertNotIn('desc=', response['Server-Timing'])
+        timing = logs.records[-1].timing
+        self.assertEqual(timing['view'], 'collection_detail')
+        self.assertEqual(timing['status'], 200)
+        self.assertEqual(
+            {name: span['count'] for name, span in timing['spans'].items()},
+            {'collection.lookup': 1, 'collection.metadata': 1,
+             'collection.rows': 1, 'render': 1})
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(
+            'portal_request_duration_seconds_count{view="collection_detail",'
+            'method="GET",status="200"}', response.content.decode())
+
+    @override_settings(INSTRUMENTATION_ENABLED=True)
+    def test_stats(self):
+        """Collection statistics test"""
+
+        response = self.client.get(
+            '/collections/%s/stats/' % self.col.pk, {'eye_color': 'on'})
+        self.assertEqual(
+            self._spans_get(response),
+            ['collection.lookup', 'collection.metadata', 'collection.stats',
+             'render', 'total'])
+        self.assertNotIn('desc=', response['Server-Timing'])
+
+    @override_settings(
+        INSTRUMENTATION_ENABLED=True, INGEST_JOB_RUNNER='sync',
+        INGEST_RESOURCE_TYPES=('people',), SWAPI_HTTP_CACHE_DIR=None)
+    @mock.patch('portal.swapi.SWAPI.resources_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_collections_post(self, mock_pages, mock_resources):
+        """Collections test - synchronous ingestion job
+
+        Stages of the job run within the request are reported
+        """
+
+        mock_pages.side_effect = lambda resource_type: iter([PEOPLE])
+        mock_resources.return_value = {
+            'planet_1': {'url': 'planet_1', 'name': 'Tatooine'}}
+        response = self.client.post('/collections/')
+        spans = self._spans_get(response)
+        for name in ('collections.submit', 'ingest.job', 'ingest.enrich',
+                     'ingest.dates', 'ingest.write', 'ingest.store',
+                     'collections.query', 'render'):
+            self.assertIn(name, spans)
+
+        for col in Collection.objects.exclude(pk=self.col.pk):
+            storage.collection_delete(col.file_name)
@@ -0,0 +1,42 @@
+import unittest
+
+from portal import loadtest
+
+
+class LoadTestTest(unittest.TestCase):
+    """Test load-test harness"""
+
+    def test_percentile(self):
+        """percentile function test (nearest-rank method)"""
+
+        values = list(range(100, 0, -1))
+        self.assertEqual(loadtest.percentile(values, 50), 50)
+        self.assertEqual(loadtest.percentile(values, 95), 95)
+        self.assertEqual(loadtest.percentile(values, 99), 99)
+        self.assertEqual(loadtest.percentile(values, 100), 100)
+        self.assertEqual(loadtest.percentile([3], 99), 3)
+        self.assertEqual(loadtest.percentile([], 50), None)
+
+    def test_load_run(self):
+        """load_run function test
+
+        - Every request is sent once
+        - False results and exceptions are counted as errors
+        """
+
+        sent = []
+
+        def request_send(i):
+            sent.append(i)
+            if i == 3:
+                raise OSError('Test error')
+            return i % 2 == 0
+
+        summary = loadtest.load_run(request_send, 10, 4)
+        self.assertEqual(sorted(sent), list(range(10)))
+        self.assertEqual(summary['requests'], 10)
+        self.assertEqual(summary['errors'], 5)
+        self.assertTrue(
+            summary['p50'] <= summary['p95'] <= summary['p99']
+            <= summary['max'])
+        self.assertTrue(summary['throughput'] > 0)
@@ -0,0 +1,221 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+from unittest import mock
+
+import petl as etl
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from portal import storage
+from portal.models import Collection
+
+
+class StorageTest(TestCase):
+    """Test storage module and collection files management"""
+
+    def setUp(self):
+        self._media_root = tempfile.TemporaryDirectory()
+        self._override = override_settings(
+            MEDIA_ROOT=self._media_root.name)
+        self._override.enable()
+
+    def tearDown(self):
+        self._override.disable()
+        self._media_root.cleanup()
+
+    def _collection_file_prepare(self, content):
+        """Prepare stored collection file with `keys` sidecar file
+
+        :param content: Content of the collection file
+        :type content: bytes
+        :return: Name of the stored collection file
+        :rtype: str
+        """
+
+        temp_name = storage.collection_temp_name()
+        with open(storage.collection_path(temp_name), 'wb') as f:
+            f.write(content)
+        with open(storage.collection_path(temp_name, 'keys'), 'wb') as f:
+            f.write(b'url,edited')
+        return storage.collection_store(temp_name)
+
+    def _collection_file_age(self, file_name, age):
+        """Set modification time of the collection file `age` seconds
+        back
+        """
+
+        mtime = time.time() - age
+        os.utime(storage.collection_path(file_name), (mtime, mtime))
+
+    def test_collection_store(self):
+        """collection_store function test
+
+        - The file is named by its content
+        - The same content is stored just once, storing it again makes
+            the file recent
+        """
+
+        file_name = self._collection_file_prepare(b'a,b')
+        self.assertEqual(
+            file_name, '%s.csv' % hashlib.sha256(b'a,b').hexdigest())
+        self.assertTrue(storage.COLLECTION_FILE_RE.match(file_name))
+        self._collection_file_age(file_name, 7200)
+        self.assertFalse(storage.collection_recently_stored(file_name))
+        self.assertEqual(self._collection_file_prepare(b'a,b'), file_name)
+        self.assertTrue(storage.collection_recently_stored(file_name))
+        self.assertNotEqual(self._collection_file_prepare(b'a,c'), file_name)
+        self.assertEqual(len(os.listdir(self._media_root.name)), 4)
+
+    def test_collection_rows_read(self):
+        """collection_rows_read function test
+
+        Rows read using the index must be the same as rows parsed by
+        `petl`, also for quoted values with line breaks.
+        """
+
+        rows = [('name', 'skin_color')] + [
+            (str(i), 'white,\n"blue"' if i % 3 else 'gold')
+            for i in range(25)]
+        etl.tocsv(rows, storage.collection_path('file.csv'))
+        table = etl.fromcsv(storage.collection_path('file.csv'))
+
+        self.assertEqual(
+            storage.collection_rows_read('file.csv', 0, 10), None)
+        storage.collection_index_write('file.csv')
+        for start, stop in ((0, 10), (10, 20), (20, 30), (30, 40), (5, 5)):
+            self.assertEqual(
+                storage.collection_rows_read('file.csv', start, stop),
+                [tuple(r) for r in etl.records(table, start, stop)])
+
+    def test_backends(self):
+        """Storage backends test
+
+        - Both backends read the same rows and counts
+        - Columnar backend reads collections without columnar file
+            from CSV file
+        """
+
+        rows = [('name', 'gender')] + [
+            ('Person %s' % i, ('male', 'female')[i % 2]) for i in range(15)]
+        etl.tocsv(rows, storage.collection_path('file.csv'))
+        backend_csv = storage.CSVBackend()
+        backend_columnar = storage.ColumnarBackend()
+        expected_rows = backend_csv.rows_read('file.csv', 10, 20)
+        expected_counts = backend_csv.value_counts('file.csv', ('gender',))
+        self.assertEqual(
+            backend_columnar.rows_read('file.csv', 10, 20), expected_rows)
+
+        backend_columnar.sidecars_write('file.csv')
+        self.assertTrue(os.path.exists(
+            storage.collection_path('file.csv', 'col')))
+        self.assertEqual(
+            backend_columnar.rows_read('file.csv', 10, 20),
+            [tuple(r) for r in expected_rows])
+        self.assertEqual(
+            backend_columnar.value_counts('file.csv', ('gender',)),
+            expected_counts)
+
+    def test_collection_value_counts(self):
+        """collection_value_counts function test
+
+        - Counts of single fields are written at once and equal to the
+            counts of storage backend
+        - Counts of field combination are written on the first request
+            and the order of fields is respected
+        """
+
+        rows = [('name', 'gender', 'eye_color')] + [
+            ('Person %s' % i, ('male', 'female')[i % 2],
+             ('blue', 'brown', 'red')[i % 3]) for i in range(15)]
+        etl.tocsv(rows, storage.collection_path('file.csv'))
+        backend = storage.CSVBackend()
+
+        storage.collection_counts_write('file.csv')
+        for field in rows[0]:
+            self.assertEqual(
+                storage._counts_read('file.csv', (field,)),
+                backend.value_counts('file.csv', (field,)))
+        self.assertIsNone(
+            storage._counts_read('file.csv', ('eye_color', 'gender')))
+
+        fields = ('gender', 'eye_color')
+        expected = backend.value_counts('file.csv', fields)
+        self.assertEqual(
+            storage.collection_value_counts('file.csv', fields), expected)
+        self.assertIsNotNone(
+            storage._counts_read('file.csv', ('eye_color', 'gender')))
+        self.assertEqual(
+            storage.collection_value_counts('file.csv', fields), expected)
+        self.assertEqual(
+            storage.collection_value_counts('file.csv', fields[::-1]),
+            backend.value_counts('file.csv', fields[::-1]))
+
+    def test_counts_write_error(self):
+        """_counts_write function test - writing fails
+
+        The original error is raised and no temporary file is left
+        """
+
+        with mock.patch('portal.storage.json.dump', side_effect=ValueError):
+            with self.assertRaises(ValueError):
+                storage._counts_write('file.csv', ('name',), [])
+        self.assertEqual(os.listdir(self._media_root.name), [])
+
+        with mock.patch('builtins.open', side_effect=PermissionError):
+            with self.assertRaises(PermissionError):
+                storage._counts_write('file.csv', ('name',), [])
+
+    def test_collection_delete_references(self):
+        """Collection deletion test
+
+        - Collection file is deleted together with the last collection
+            referencing it
+        - Recently stored file is kept: Running ingestion job may
+            reference it
+        """
+
+        file_name = self._collection_file_prepare(b'a,b')
+        self._collection_file_age(file_name, 7200)
+        col_1 = Collection.objects.create(file_name=file_name, file=file_name)
+        col_2 = Collection.objects.create(file_name=file_name, file=file_name)
+        self.assertEqual(col_1.file_references(), 2)
+
+        col_1.delete()
+        self.assertTrue(os.path.exists(storage.collection_path(file_name)))
+        col_2.delete()
+        self.assertEqual(os.listdir(self._media_root.name), [])
+
+        file_name = self._collection_file_prepare(b'a,c')
+        Collection.objects.create(file_name=file_name, file=file_name).delete()
+        self.assertTrue(os.path.exists(storage.collection_path(file_name)))
+
+    def test_collections_gc(self):
+        """collections_gc command test
+
+        - Files of referenced collections are kept
+        - Unreferenced files and their sidecar files are deleted
+        - Unreferenced recently stored files are kept
+        - Other files are kept
+        """
+
+        file_name = self._collection_file_prepare(b'a,b')
+        file_name_orphan = self._collection_file_prepare(b'a,c')
+        self._collection_file_age(file_name_orphan, 7200)
+        file_name_recent = self._collection_file_prepare(b'a,d')
+        Collection.objects.create(file_name=file_name, file=file_name)
+        open(storage.collection_path('.placeholder'), 'w').close()
+
+        call_command('collections_gc', '--dry-run', stdout=io.StringIO())
+        self.assertEqual(len(os.listdir(self._media_root.name)), 7)
+
+        call_command('collections_gc', stdout=io.StringIO())
+        self.assertEqual(
+            sorted(os.listdir(self._media_root.name)),
+            sorted(['.placeholder', file_name, file_name + '.keys',
+                    file_name_recent, file_name_recent + '.keys']))
+        self.assertFalse(os.path.exists(
+            storage.collection_path(file_name_orphan)))
@@ -1,8 +1,14 @@
+import asyncio
+import httpx
 import requests
+import tempfile
+import threading
 import unittest
 from unittest import mock
 import json
+import os
 
+from portal import httpcache
 from portal import swapi
 
 
@@ -11,44 +17,50 @@ class TestSwApi(unittest.TestCase):
 
     def setUp(self):
         self._swapi = swapi.SWAPI()
+        self._swapi.cache_invalidate()
+
+    def tearDown(self):
+        self._swapi.close()
 
-    @staticmethod
     def _mock_request_response_prepare(
+            self,
             resp_status_code=200,
             resp_text='resp_text',
             raise_exception_req=None,
             raise_exception_json=None):
-        """Prepare mock for requests.get for latter use
+        """Prepare mock for session.get for latter use
 
-        Possibility to prepare requests.get method mock object with
+        Possibility to prepare session.get method mock object with
         different settings:
-        - Raise error on requests.get call
+        - Raise error on session.get call
         - Raise error during response json parsing
         - Return different response HTTP status codes and response
             texts
 
         :param resp_status_code: response status code for
-            requests.get method
+            session.get method
         :type resp_status_code: int
-        :param resp_text: response text for requests.get method
+        :param resp_text: response text for session.get method
         :type resp_text: str
         :param raise_exception_req: Simulate raising given exception
-            during requests.get call
+            during session.get call
         :type raise_exception_req: Exception, optional
         :param raise_exception_json: Simulate raising given exception
             during processing JSON response
         :type raise_exception_json: Exception, optional
         """
 
-        requests.get = mock.Mock()
+        session_get = mock.Mock()
+        self._swapi.session.get = session_get
         if raise_exception_req:
-            requests.get.side_effect = raise_exception_req
+            session_get.side_effect = raise_exception_req
             return
         response = mock.Mock()
         response.url = 'testing_url'
         response.status_code = resp_status_code
         response.text = resp_text
-        requests.get.return_value = response
+        response.headers = {'ETag': '"testing_etag"'}
+        session_get.return_value = response
         response.json = mock.Mock()
         response.json.return_value = {}
         if raise_exception_json:
@@ -98,7 +110,8 @@ class TestSwApi(unittest.TestCase):
         """
 
         self._mock_request_response_prepare(
-            raise_exception_req=requests.exceptions.SSLError('Test other error'))
+            raise_exception_req=requests.exceptions.SSLError(
+                'Test other error'))
         result = self._swapi._swapi_request('testing_url')
         self.assertEquals(result, None)
 
@@ -139,6 +152,64 @@ class TestSwApi(unittest.TestCase):
         result = self._swapi._swapi_request('testing_url')
         self.assertEquals(result, {})
 
+    def test_request_http_cache(self):
+        """_swapi_request method test
+
+        Test with HTTP cache:
+        - the first response is stored
+        - the second request is conditional. Cached response is
+            returned on HTTP 304
+        """
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self._swapi.http_cache = httpcache.HTTPCache(cache_dir)
+            self._mock_request_response_prepare()
+            self._swapi.session.get.return_value.json.return_value = {
+                'results': [1]}
+            result = self._swapi._swapi_request('testing_url')
+            self.assertEquals(result, {'results': [1]})
+
+            self._mock_request_response_prepare(
+                resp_status_code=304, resp_text='')
+            result = self._swapi._swapi_request('testing_url')
+            self.assertEquals(result, {'results': [1]})
+            self.assertEquals(
+                self._swapi.session.get.call_args[1]['headers'],
+                {'If-None-Match': '"testing_etag"'})
+
+    def test_request_http_cache_error(self):
+        """_swapi_request method test
+
+        Error writing HTTP cache does not fail the request
+        """
+
+        with tempfile.NamedTemporaryFile() as f:
+            # Cache directory can not be created
+            self._swapi.http_cache = httpcache.HTTPCache(
+                os.path.join(f.name, 'cache'))
+            self._mock_request_response_prepare()
+            self._swapi.session.get.return_value.json.return_value = {
+                'results': [1]}
+            with self.assertLogs('portal', 'ERROR'):
+                result = self._swapi._swapi_request('testing_url')
+            self.assertEquals(result, {'results': [1]})
+
+    def test_request_http_cache_fresh(self):
+        """_swapi_request method test
+
+        Cached response without validators is returned within
+        freshness window without any request.
+        """
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self._swapi.http_cache = httpcache.HTTPCache(
+                cache_dir, freshness=60)
+            self._swapi.http_cache.set('testing_url', {'results': [1]}, {})
+            self._mock_request_response_prepare()
+            result = self._swapi._swapi_request('testing_url')
+            self.assertEquals(result, {'results': [1]})
+            self._swapi.session.get.assert_not_called()
+
     def test_list_request_process(self):
         """_list_request_process method test
 
@@ -239,3 +310,390 @@ class TestSwApi(unittest.TestCase):
         self._swapi._list_request_process.assert_called_once_with(
             self._swapi.url_planets)
         self.assertEquals(response, 'TEST')
+
+    def test_planets_get_cached(self):
+        """planets_get method test
+
+        Test:
+        - the second call is served from the cache
+        - errors are not cached
+        - invalidated list is requested again
+        """
+
+        self._swapi._list_request_process = mock.Mock()
+        self._swapi._list_request_process.side_effect = [
+            None, ['TEST'], ['TEST_2']]
+
+        self.assertEquals(self._swapi.planets_get(), None)
+        self.assertEquals(self._swapi.planets_get(), ['TEST'])
+        self.assertEquals(self._swapi.planets_get(), ['TEST'])
+        self.assertEquals(self._swapi._list_request_process.call_count, 2)
+
+        self._swapi.cache_invalidate(self._swapi.url_planets)
+        self.assertEquals(self._swapi.planets_get(), ['TEST_2'])
+        self.assertEquals(self._swapi._list_request_process.call_count, 3)
+
+    def test_list_request_concurrent(self):
+        """_list_request_process method test
+
+        The first page contains `count` and `next` link with `page`
+        parameter, so the remaining pages are predicted and fetched
+        concurrently. Results must be merged in page order.
+        """
+
+        pages = {
+            'https://test/api/people/': {
+                'count': 5, 'results': [1, 2],
+                'next': 'https://test/api/people/?page=2'},
+            'https://test/api/people/?page=2': {
+                'count': 5, 'results': [3, 4],
+                'next': 'https://test/api/people/?page=3'},
+            'https://test/api/people/?page=3': {
+                'count': 5, 'results': [5], 'next': None},
+        }
+        self._swapi._swapi_request = mock.Mock()
+        self._swapi._swapi_request.side_effect = pages.get
+        result = self._swapi._list_request_process(
+            'https://test/api/people/')
+        self.assertEquals(result, [1, 2, 3, 4, 5])
+        self.assertEquals(self._swapi._swapi_request.call_count, 3)
+
+    def test_list_request_concurrent_error_result(self):
+        """_list_request_process method test
+
+        There was some error during one of concurrent SWAPI requests.
+        None must be returned.
+        """
+
+        pages = {
+            'https://test/api/people/': {
+                'count': 5, 'results': [1, 2],
+                'next': 'https://test/api/people/?page=2'},
+            'https://test/api/people/?page=2': None,
+            'https://test/api/people/?page=3': {
+                'count': 5, 'results': [5], 'next': None},
+        }
+        self._swapi._swapi_request = mock.Mock()
+        self._swapi._swapi_request.side_effect = pages.get
+        result = self._swapi._list_request_process(
+            'https://test/api/people/')
+        self.assertEquals(result, None)
+
+    def test_list_request_concurrent_more_pages(self):
+        """_list_request_process method test
+
+        The last predicted page still has `next` page (resources were
+        added in the meantime). The `next` link must be followed.
+        """
+
+        pages = {
+            'https://test/api/people/': {
+                'count': 3, 'results': [1, 2],
+                'next': 'https://test/api/people/?page=2'},
+            'https://test/api/people/?page=2': {
+                'count': 5, 'results': [3, 4],
+                'next': 'https://test/api/people/?page=3'},
+            'https://test/api/people/?page=3': {
+                'count': 5, 'results': [5], 'next': None},
+        }
+        self._swapi._swapi_request = mock.Mock()
+        self._swapi._swapi_request.side_effect = pages.get
+        result = self._swapi._list_request_process(
+            'https://test/api/people/')
+        self.assertEquals(result, [1, 2, 3, 4, 5])
+
+    def test_list_pages_iter(self):
+        """list_pages_iter method test
+
+        - Pages are yielded in page order, the next pages are requested
+            after the first page is processed
+        - Error raises SWAPIError
+        """
+
+        pages = {
+            'https://test/api/people/': {
+                'count': 5, 'results': [1, 2],
+                'next': 'https://test/api/people/?page=2'},
+            'https://test/api/people/?page=2': {
+                'count': 5, 'results': [3, 4],
+                'next': 'https://test/api/people/?page=3'},
+            'https://test/api/people/?page=3': {
+                'count': 5, 'results': [5], 'next': None},
+        }
+        self._swapi._swapi_request = mock.Mock()
+        self._swapi._swapi_request.side_effect = pages.get
+        pages_iter = self._swapi.list_pages_iter('https://test/api/people/')
+        self.assertEquals(next(pages_iter), [1, 2])
+        self.assertEquals(self._swapi._swapi_request.call_count, 1)
+        self.assertEquals(list(pages_iter), [[3, 4], [5]])
+
+        pages['https://test/api/people/?page=3'] = None
+        pages_iter = self._swapi.list_pages_iter('https://test/api/people/')
+        self.assertEquals(next(pages_iter), [1, 2])
+        self.assertEquals(next(pages_iter), [3, 4])
+        with self.assertRaises(swapi.SWAPIError):
+            next(pages_iter)
+
+    def test_page_urls_predict(self):
+        """_page_urls_predict method test
+
+        Other query parameters must be kept. When there is no `page`
+        parameter or `count`, URLs can not be predicted.
+        """
+
+        urls = self._swapi._page_urls_predict({
+            'count': 25, 'results': list(range(10)),
+            'next': 'https://test/api/people/?format=json&page=2'})
+        self.assertEquals(urls, [
+            'https://test/api/people/?format=json&page=2',
+            'https://test/api/people/?format=json&page=3'])
+        self.assertEquals(self._swapi._page_urls_predict({
+            'count': 25, 'results': list(range(10)),
+            'next': 'https://test/api/people/?cursor=abc'}), None)
+        self.assertEquals(self._swapi._page_urls_predict({
+            'results': list(range(10)),
+            'next': 'https://test/api/people/?page=2'}), None)
+
+    def test_resources_get(self):
+        """resources_get method test
+
+        Test:
+        - URLs are deduplicated
+        - the second call is served from the cache
+        - resources failed to fetch are left out, the rest is cached
+        """
+
+        self._swapi._swapi_request = mock.Mock()
+        self._swapi._swapi_request.side_effect = lambda url: {'url': url}
+        urls = ['https://test/api/planets/1/', 'https://test/api/planets/2/']
+
+        result = self._swapi.resources_get(urls + urls)
+        self.assertEquals(result, {u: {'url': u} for u in urls})
+        self.assertEquals(self._swapi._swapi_request.call_count, 2)
+        result = self._swapi.resources_get(urls)
+        self.assertEquals(result, {u: {'url': u} for u in urls})
+        self.assertEquals(self._swapi._swapi_request.call_count, 2)
+
+        urls_new = ['https://test/api/planets/3/',
+                    'https://test/api/planets/4/']
+        self._swapi._swapi_request.side_effect = lambda url: (
+            None if url == urls_new[0] else {'url': url})
+        result = self._swapi.resources_get(urls + urls_new)
+        self.assertEquals(
+            result, {u: {'url': u} for u in urls + urls_new[1:]})
+        self.assertEquals(self._swapi._swapi_request.call_count, 4)
+        result = self._swapi.resources_get(urls_new)
+        self.assertEquals(result, {urls_new[1]: {'url': urls_new[1]}})
+        self.assertEquals(self._swapi._swapi_request.call_count, 5)
+
+    def test_session_pool(self):
+        """session property test
+
+        - Session is created once and reused
+        - Connection pool size and retry policy are configured
+        """
+
+        client = swapi.SWAPI(pool_size=4, max_retries=2, retry_backoff=0.1)
+        session = client.session
+        self.assertIs(client.session, session)
+        adapter = session.get_adapter('https://swapi.dev/api/')
+        self.assertEquals(adapter._pool_maxsize, 4)
+        self.assertEquals(adapter.max_retries.total, 2)
+        self.assertEquals(adapter.max_retries.backoff_factor, 0.1)
+        self.assertIn(500, adapter.max_retries.status_forcelist)
+        client.close()
+
+    def test_session_context_manager(self):
+        """Context manager test
+
+        Session must be closed after leaving the context.
+        """
+
+        with swapi.SWAPI() as client:
+            session = client.session
+            session.close = mock.Mock()
+        session.close.assert_called_once_with()
+        self.assertIsNot(client.session, session)
+        client.close()
+
+    def test_get_client(self):
+        """get_client function test
+
+        The same client is returned on subsequent calls.
+        """
+
+        self.assertIs(swapi.get_client(), swapi.get_client())
+
+
+class TestAsyncSwApi(unittest.TestCase):
+    """Test asynchronous SWAPI client. Requests are answered by
+    `httpx.MockTransport`.
+    """
+
+    def setUp(self):
+        self._swapi = swapi.AsyncSWAPI(retry_backoff=0)
+        self._swapi.cache_invalidate()
+        self._requests = []
+
+    def _transport_prepare(self, handler):
+        """Answer requests by the given handler
+
+        :param handler: Function returning `httpx.Response` for
+            `httpx.Request`
+        :type handler: callable
+        """
+
+        def handler_logged(request):
+            self._requests.append(str(request.url))
+            return handler(request)
+
+        self._swapi._client_create = lambda: httpx.AsyncClient(
+            transport=httpx.MockTransport(handler_logged))
+
+    def _run(self, coroutine):
+        """Run the coroutine and close the client afterwards"""
+
+        async def run():
+            async with self._swapi:
+                return await coroutine
+
+        return asyncio.run(run())
+
+    def test_people_get_concurrent(self):
+        """people_get method test
+
+        Pages are predicted from the first page and merged in order.
+        """
+
+        def handler(request):
+            page = int(request.url.params.get('page', 1))
+            return httpx.Response(200, json={
+                'count': 5,
+                'next': (
+                    'https://test/api/people/?page=%s' % (page + 1)
+                    if page < 3 else None),
+                'results': [{'name': '%s-%s' % (page, i)} for i in range(2)]
+                if page < 3 else [{'name': '3-0'}]})
+
+        self._transport_prepare(handler)
+        result = self._run(self._swapi.people_get())
+        self.assertEqual(
+            [p['name'] for p in result],
+            ['1-0', '1-1', '2-0', '2-1', '3-0'])
+        self.assertEqual(len(self._requests), 3)
+
+    def test_list_pages_iter_error(self):
+        """list_pages_iter method test
+
+        Pages preceding the failed one are yielded, then SWAPIError is
+        raised
+        """
+
+        def handler(request):
+            page = int(request.url.params.get('page', 1))
+            if page == 3:
+                return httpx.Response(404)
+            return httpx.Response(200, json={
+                'count': 6,
+                'next': 'https://test/api/people/?page=%s' % (page + 1),
+                'results': [{'name': '%s-%s' % (page, i)} for i in range(2)]})
+
+        async def pages_get(pages):
+            async for results in self._swapi.resource_pages_iter('people'):
+                pages.append(results)
+
+        pages = []
+        self._transport_prepare(handler)
+        with self.assertRaises(swapi.SWAPIError):
+            self._run(pages_get(pages))
+        self.assertEqual(
+            [[p['name'] for p in page] for page in pages],
+            [['1-0', '1-1'], ['2-0', '2-1']])
+
+    def test_request_retry(self):
+        """_swapi_request method test
+
+        - HTTP 5xx response is retried
+        - None is returned when retries are exhausted
+        """
+
+        statuses = iter([503, 200])
+        self._transport_prepare(lambda request: httpx.Response(
+            next(statuses), json={'name': 'Tatooine'}))
+        result = self._run(self._swapi._swapi_request('https://test/api/'))
+        self.assertEqual(result, {'name': 'Tatooine'})
+        self.assertEqual(len(self._requests), 2)
+
+        self._requests = []
+        self._transport_prepare(lambda request: httpx.Response(500))
+        result = self._run(self._swapi._swapi_request('https://test/api/'))
+        self.assertIsNone(result)
+        self.assertEqual(
+            len(self._requests), swapi.AsyncSWAPI.MAX_RETRIES + 1)
+
+    def test_resources_get_cache(self):
+        """resources_get method test
+
+        - Distinct resources are fetched once
+        - Cached resources are not requested again
+        """
+
+        self._transport_prepare(lambda request: httpx.Response(
+            200, json={'url': str(request.url)}))
+        urls = ['https://test/api/planets/1/', 'https://test/api/planets/2/']
+        result = self._run(self._swapi.resources_get(urls + urls))
+        self.assertEqual(set(result), set(urls))
+        self.assertEqual(len(self._requests), 2)
+
+        result = self._run(self._swapi.resources_get(urls))
+        self.assertEqual(set(result), set(urls))
+        self.assertEqual(len(self._requests), 2)
+
+    def test_client_loop(self):
+        """client property test
+
+        - The client is reused within the event loop
+        - The client of another running loop is closed on that loop,
+            a new one is created
+        - The client of the loop not running is dropped
+        - The client of closed loop is replaced
+        """
+
+        async def client_get():
+            return self._swapi.client
+
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+            client = asyncio.run_coroutine_threadsafe(
+                client_get(), loop).result()
+            self.assertIs(
+                asyncio.run_coroutine_threadsafe(client_get(), loop).result(),
+                client)
+            client_other = asyncio.run(client_get())
+            self.assertIsNot(client_other, client)
+            for _ in range(100):
+                if client.is_closed:
+                    break
+                asyncio.run_coroutine_threadsafe(
+                    asyncio.sleep(0.01), loop).result()
+            self.assertTrue(client.is_closed)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+        loop = asyncio.new_event_loop()
+        try:
+            client = loop.run_until_complete(client_get())
+            client_other = asyncio.run(client_get())
+            self.assertIsNot(client_other, client)
+            self.assertFalse(client.is_closed)
+        finally:
+            loop.close()
+
+        client = asyncio.run(client_get())
+        self.assertIsNot(client, client_other)
+        self.assertFalse(client.is_closed)
+        asyncio.run(self._swapi.aclose())
@@ -1,13 +1,31 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.utils import timezone
 from unittest import mock
-
+import datetime
+import io
+import json
+import os
+import tempfile
+
+from portal import jobs
+from portal import stats
+from portal import swapi
+from portal import storage
+from portal import views_async
 from portal.models import Collection
 
 
+@override_settings(INGEST_JOB_RUNNER='sync', INGEST_RESOURCE_TYPES=('people',))
 class CollectionsViewTest(TestCase):
-    """Test /collection/ view"""
+    """Test /collection/ view
+
+    Ingestion jobs are run synchronously, so their result is known
+    within the response.
+    """
 
     @classmethod
     def setUpTestData(cls):
@@ -18,9 +36,12 @@ class CollectionsViewTest(TestCase):
             col = Collection(file_name=file_name)
             col.file = SimpleUploadedFile(
                 file_name,
-                b'''name,height,mass,hair_color,skin_color,eye_color,birth_year,gender,homeworld,date
-                Luke Skywalker,172,77,blond,fair,blue,19BBY,male,Tatooine,2014-12-20
-                C-3PO,167,75,n/a,gold,yellow,112BBY,n/a,Tatooine,2014-12-20'''
+                b'name,height,mass,hair_color,skin_color,eye_color,'
+                b'birth_year,gender,homeworld,date\n'
+                b'Luke Skywalker,172,77,blond,fair,blue,19BBY,male,'
+                b'Tatooine,2014-12-20\n'
+                b'C-3PO,167,75,n/a,gold,yellow,112BBY,n/a,Tatooine,'
+                b'2014-12-20'
             )
             col.save()
 
@@ -28,6 +49,7 @@ class CollectionsViewTest(TestCase):
         """Delete al files created during the test"""
 
         for col in Collection.objects.all():
+            storage.collection_delete(col.file_name)
             col.file.delete()
             col.save()
 
@@ -61,38 +83,69 @@ class CollectionsViewTest(TestCase):
         self.assertTrue('collections' in response.context)
         self.assertTrue(len(response.context['collections']) == col_count)
 
-    @mock.patch('portal.swapi.SWAPI.planets_get')
-    def test_post_swapi_error_planets(self, mock_planets):
+    @override_settings(SWAPI_HOMEWORLD_RESOLUTION='prefetch')
+    @mock.patch('portal.swapi.SWAPI.resource_list_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_post_swapi_error_planets(self, mock_people, mock_planets):
         """Test correct behaviour after SWAPI/planets error
 
-        - No collection is added - `collections` count must be correct.
+        - Failed collection is added - `collections` count is increased
         - Warning message is shown
         """
 
         mock_planets.return_value = None
+        mock_people.return_value = []
         col_count = Collection.objects.all().count()
         response = self.client.post('/collections/')
         self.assertTrue(len(response.context['messages']) == 1)
-        self.assertTrue(len(response.context['collections']) == col_count)
+        self.assertTrue(len(response.context['collections']) == col_count + 1)
+        self.assertEqual(
+            Collection.objects.latest('pk').status,
+            Collection.Status.FAILED)
 
-    @mock.patch('portal.swapi.SWAPI.planets_get')
-    @mock.patch('portal.swapi.SWAPI.people_get')
+    @mock.patch('portal.swapi.SWAPI.resource_list_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
     def test_post_swapi_error_people(self, mock_people, mock_planets):
         """Test correct behaviour after SWAPI/people error
 
-        - No collection is added - `collections` count is correct.
+        - Failed collection is added - `collections` count is increased
         - Warning message is shown
         """
 
         mock_planets.return_value = [{'url': 'url', 'name': 'planet'}]
-        mock_people.return_value = None
+        mock_people.side_effect = swapi.SWAPIError('Test error')
         col_count = Collection.objects.all().count()
         response = self.client.post('/collections/')
         self.assertTrue(len(response.context['messages']) == 1)
-        self.assertTrue(len(response.context['collections']) == col_count)
+        self.assertTrue(len(response.context['collections']) == col_count + 1)
+        self.assertEqual(
+            Collection.objects.latest('pk').status,
+            Collection.Status.FAILED)
+
+    @override_settings(SWAPI_HOMEWORLD_RESOLUTION='prefetch')
+    @mock.patch('portal.swapi.SWAPI.resource_list_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_post_swapi_error_both(self, mock_people, mock_planets):
+        """Test correct behaviour after both SWAPI/planets and
+        SWAPI/people errors
+
+        - Failed collection is added - `collections` count is increased
+        - Just one warning message is shown
+        """
+
+        mock_planets.return_value = None
+        mock_people.side_effect = swapi.SWAPIError('Test error')
+        col_count = Collection.objects.all().count()
+        response = self.client.post('/collections/')
+        self.assertTrue(len(response.context['messages']) == 1)
+        self.assertTrue(len(response.context['collections']) == col_count + 1)
+        self.assertEqual(
+            Collection.objects.latest('pk').status,
+            Collection.Status.FAILED)
 
-    @mock.patch('portal.swapi.SWAPI.planets_get')
-    @mock.patch('portal.swapi.SWAPI.people_get')
+    @override_settings(SWAPI_HOMEWORLD_RESOLUTION='prefetch')
+    @mock.patch('portal.swapi.SWAPI.resource_list_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
     def test_post_ok(self, mock_people, mock_planets):
         """Test correct behaviour after POST request went well
 
@@ -100,9 +153,10 @@ class CollectionsViewTest(TestCase):
         - No message is shown
         - Show added collection within page - `collections` count i
             s increased
+        - ID of the collection is returned by response header
         """
         mock_planets.return_value = [{'url': 'url', 'name': 'planet'}]
-        mock_people.return_value = [
+        mock_people.return_value = [[
             {'name': 'Luke Skywalker', 'height': '172', 'mass': '77',
              'hair_color': 'blond', 'skin_color': 'fair', 'eye_color': 'blue',
              'birth_year': '19BBY', 'gender': 'male',
@@ -137,11 +191,275 @@ class CollectionsViewTest(TestCase):
              'starships': [], 'created': '2014-12-10T15:10:51.357000Z',
              'edited': '2014-12-20T21:17:50.309000Z',
              'url': 'https://swapi.dev/api/people/2/'}
-        ]
+        ]]
         col_count = Collection.objects.all().count()
         response = self.client.post('/collections/')
         self.assertTrue(len(response.context['messages']) == 0)
         self.assertTrue(len(response.context['collections']) == col_count + 1)
+        self.assertEqual(
+            response['X-Collection-Ids'],
+            str(Collection.objects.latest('pk').pk))
+
+    @mock.patch('portal.swapi.SWAPI.resource_list_get')
+    @mock.patch('portal.swapi.SWAPI.resources_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_post_lazy_ok(self, mock_people, mock_resources, mock_planets):
+        """Test lazy homeworld resolution after POST request went well
+
+        - Just distinct homeworlds of people are requested
+        - Planet list is not requested
+        - No message is shown and collection is added
+        """
+
+        mock_people.return_value = [[
+            {'name': name, 'height': '172', 'mass': '77',
+             'hair_color': 'blond', 'skin_color': 'fair', 'eye_color': 'blue',
+             'birth_year': '19BBY', 'gender': 'male',
+             'homeworld': 'https://swapi.dev/api/planets/1/',
+             'films': [], 'species': [], 'vehicles': [], 'starships': [],
+             'created': '2014-12-09T13:50:51.644000Z',
+             'edited': '2014-12-20T21:17:56.891000Z',
+             'url': 'https://swapi.dev/api/people/1/'}
+            for name in ('Luke Skywalker', 'Owen Lars')]]
+        mock_resources.return_value = {
+            'https://swapi.dev/api/planets/1/': {'name': 'Tatooine'}}
+        col_count = Collection.objects.all().count()
+        response = self.client.post('/collections/')
+        self.assertEqual(
+            set(mock_resources.call_args[0][0]),
+            {'https://swapi.dev/api/planets/1/'})
+        mock_planets.assert_not_called()
+        self.assertTrue(len(response.context['messages']) == 0)
+        self.assertTrue(len(response.context['collections']) == col_count + 1)
+
+    @mock.patch('portal.swapi.SWAPI.resources_get')
+    @mock.patch('portal.swapi.SWAPI.resource_pages_iter')
+    def test_post_lazy_swapi_error_planets(self, mock_people, mock_resources):
+        """Test lazy homeworld resolution after SWAPI/planets error
+
+        - Failed collection is added - `collections` count is increased
+        - Warning message is shown
+        """
+
+        mock_people.return_value = [[
+            {'homeworld': 'https://swapi.dev/api/planets/1/'}]]
+        mock_resources.return_value = None
+        col_count = Collection.objects.all().count()
+        response = self.client.post('/collections/')
+        self.assertTrue(len(response.context['messages']) == 1)
+        self.assertTrue(len(response.context['collections']) == col_count + 1)
+        self.assertEqual(
+            Collection.objects.latest('pk').status,
+            Collection.Status.FAILED)
+
+    @override_settings(INGEST_JOB_RUNNER='db')
+    @mock.patch('portal.storage.collection_header')
+    @mock.patch('portal.ingest.collection_ingest')
+    def test_post_db_runner(self, mock_ingest, mock_header):
+        """Test POST request with DB-backed job queue
+
+        - Pending collection is added and the response is returned
+            immediately: ingestion is not run
+        - The page is refreshed while the collection is pending
+        - Pending job is run by the worker
+        """
+
+        mock_ingest.return_value = 'file_new.csv'
+        mock_header.return_value = ['name']
+        col_count = Collection.objects.all().count()
+        response = self.client.post('/collections/')
+        self.assertTrue(len(response.context['messages']) == 0)
+        self.assertTrue(len(response.context['collections']) == col_count + 1)
+        self.assertTrue(response.context['in_progress'])
+        mock_ingest.assert_not_called()
+        col = Collection.objects.latest('pk')
+        self.assertEqual(col.status, Collection.Status.PENDING)
+
+        call_command('ingest_worker', '--once', stdout=io.StringIO())
+        mock_ingest.assert_called_once()
+        col.refresh_from_db()
+        self.assertEqual(col.status, Collection.Status.DONE)
+        self.assertEqual(col.file_name, 'file_new.csv')
+        self.assertEqual(col.file.name, 'file_new.csv')
+        self.assertEqual(col.header, ['name'])
+
+    @mock.patch('portal.storage.collection_header')
+    @mock.patch('portal.ingest.collection_ingest')
+    def test_view_collections_async(self, mock_ingest, mock_header):
+        """Test asynchronous version of the view
+
+        - GET request lists the collections
+        - POST request runs the ingestion job and returns IDs of the
+            new collections
+        """
+
+        mock_ingest.return_value = 'file_new.csv'
+        mock_header.return_value = ['name']
+        col_count = Collection.objects.all().count()
+        view = async_to_sync(views_async.view_collections)
+        response = view(AsyncRequestFactory().get('/collections/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('X-Collection-Ids'))
+
+        response = view(AsyncRequestFactory().post(
+            '/collections/', '',
+            content_type='application/x-www-form-urlencoded'))
+        self.assertEqual(response.status_code, 200)
+        mock_ingest.assert_called_once()
+        col = Collection.objects.latest('pk')
+        self.assertEqual(response['X-Collection-Ids'], str(col.pk))
+        self.assertEqual(Collection.objects.count(), col_count + 1)
+        self.assertEqual(col.status, Collection.Status.DONE)
+        self.assertEqual(col.file_name, 'file_new.csv')
+        self.assertIn(
+            '/collections/%s/' % col.pk, response.content.decode())
+
+    @mock.patch('portal.storage.collection_rows_count')
+    @mock.patch('portal.storage.collection_header')
+    @mock.patch('portal.ingest.collections_ingest')
+    def test_stale_job_finished(self, mock_ingest, mock_header,
+                                mock_rows_count):
+        """Test job finished after its collection failed as stale
+
+        The collection is kept failed and the job is logged as lost
+        """
+
+        def ingest(previous):
+            Collection.objects.filter(pk=col.pk).update(
+                status=Collection.Status.FAILED)
+            return {t: 'file_late.csv' for t in previous}
+
+        mock_ingest.side_effect = ingest
+        mock_header.return_value = ['name']
+        mock_rows_count.return_value = 1
+        col = Collection.objects.create(status=Collection.Status.PENDING)
+        with self.assertLogs('portal', 'WARNING') as logs:
+            self.assertEqual(jobs.job_run(col.pk), 1)
+        self.assertIn('Ingestion job lost', logs.output[0])
+        col.refresh_from_db()
+        self.assertEqual(col.status, Collection.Status.FAILED)
+        self.assertNotEqual(col.file_name, 'file_late.csv')
+
+    @override_settings(INGEST_JOB_TIMEOUT=60)
+    def test_stale_jobs(self):
+        """Test collections of stale jobs
+
+        - Collections running or pending longer than the timeout fail
+        - The page is refreshed just while other jobs are in progress
+        """
+
+        old = timezone.now() - datetime.timedelta(seconds=120)
+        running = Collection.objects.create(
+            status=Collection.Status.RUNNING, date_started=old)
+        pending = Collection.objects.create(status=Collection.Status.PENDING)
+        Collection.objects.filter(pk=pending.pk).update(date_created=old)
+        fresh = Collection.objects.create(
+            status=Collection.Status.RUNNING, date_started=timezone.now())
+
+        response = self.client.get('/collections/')
+        self.assertTrue(response.context['in_progress'])
+        for col, status in ((running, Collection.Status.FAILED),
+                            (pending, Collection.Status.FAILED),
+                            (fresh, Collection.Status.RUNNING)):
+            col.refresh_from_db()
+            self.assertEqual(col.status, status)
+
+        Collection.objects.filter(pk=fresh.pk).update(date_started=old)
+        response = self.client.get('/collections/')
+        self.assertFalse(response.context['in_progress'])
+        self.assertNotContains(response, 'http-equiv="refresh"')
+
+    @mock.patch('portal.swapi.AsyncSWAPI.resources_get')
+    @mock.patch('portal.swapi.AsyncSWAPI.resource_pages_iter')
+    def test_job_run_async(self, mock_pages, mock_resources):
+        """Test asynchronous ingestion job
+
+        - Star Wars API is requested by asynchronous client
+        - Collection is done and its metadata are stored
+        """
+
+        async def pages_iter(resource_type):
+            yield people
+
+        mock_pages.side_effect = pages_iter
+        people = [
+            {'name': 'Luke Skywalker', 'height': '172', 'mass': '77',
+             'hair_color': 'blond', 'skin_color': 'fair', 'eye_color': 'blue',
+             'birth_year': '19BBY', 'gender': 'male',
+             'homeworld': 'https://swapi.dev/api/planets/1/',
+             'films': [], 'species': [], 'vehicles': [], 'starships': [],
+             'created': '2014-12-09T13:50:51.644000Z',
+             'edited': '2014-12-20T21:17:56.891000Z',
+             'url': 'https://swapi.dev/api/people/1/'}]
+        mock_resources.return_value = {
+            'https://swapi.dev/api/planets/1/': {'name': 'Tatooine'}}
+        col = Collection.objects.create(status=Collection.Status.PENDING)
+        self.assertTrue(async_to_sync(jobs.job_run_async)(col.pk))
+        col.refresh_from_db()
+        self.assertEqual(col.status, Collection.Status.DONE)
+        self.assertEqual(col.row_count, 1)
+        self.assertEqual(
+            storage.collection_rows_read(col.file_name, 0, 1)[0][-2:],
+            ('Tatooine', '2014-12-20'))
+        self.assertFalse(async_to_sync(jobs.job_run_async)(col.pk))
+
+    @mock.patch('portal.ingest.collection_ingest')
+    def test_post_job_exception(self, mock_ingest):
+        """Test unexpected exception within ingestion job
+
+        Collection status must be `failed`.
+        """
+
+        mock_ingest.side_effect = OSError('Test error')
+        response = self.client.post('/collections/')
+        self.assertTrue(len(response.context['messages']) == 1)
+        self.assertEqual(
+            Collection.objects.latest('pk').status,
+            Collection.Status.FAILED)
+
+    @override_settings(INGEST_RESOURCE_TYPES=('people', 'planets', 'films'))
+    @mock.patch('portal.storage.collection_header')
+    @mock.patch('portal.ingest.collections_ingest')
+    def test_post_resource_types(self, mock_ingest, mock_header):
+        """Test POST request fetching collections of all resource types
+
+        - Collection of every resource type is added
+        - All of them are ingested by one job, failed resource type
+            does not affect others
+        - Just the previous collection of the same resource type is
+            used for incremental ingestion
+        """
+
+        Collection.objects.create(
+            file_name='films_old.csv', resource_type='films')
+        mock_ingest.return_value = {
+            'people': 'people.csv', 'planets': None, 'films': 'films.csv'}
+        mock_header.return_value = ['name']
+        response = self.client.post('/collections/')
+        self.assertTrue(len(response.context['messages']) == 1)
+
+        cols = Collection.objects.order_by('-pk')[:3]
+        mock_ingest.assert_called_once_with({
+            'people': Collection.objects.filter(resource_type='people')
+            .exclude(pk__in=[c.pk for c in cols]).latest('pk').file_name,
+            'planets': None, 'films': 'films_old.csv'})
+        self.assertEqual(
+            sorted((c.resource_type, c.status, c.file_name) for c in cols), [
+                ('films', Collection.Status.DONE, 'films.csv'),
+                ('people', Collection.Status.DONE, 'people.csv'),
+                ('planets', Collection.Status.FAILED, '')])
+
+    @mock.patch('portal.ingest.collections_ingest')
+    def test_post_resource_type(self, mock_ingest):
+        """Test POST request fetching collection of the given resource
+        type
+        """
+
+        mock_ingest.return_value = {}
+        self.client.post('/collections/', {'resource_type': 'starships'})
+        mock_ingest.assert_called_once_with({'starships': None})
+        self.assertEqual(
+            Collection.objects.latest('pk').resource_type, 'starships')
 
 
 class CollectionDetailViewTest(TestCase):
@@ -227,13 +545,25 @@ class CollectionDetailViewTest(TestCase):
         response = self.client.get('/collections/qwert/')
         self.assertRedirects(response, '/collections/')
 
+    def test_view_collection_pending(self):
+        """Test correct behaviour for collection which is not ready yet
+
+        Response is redirected to `/collections/` view
+        """
+
+        col = Collection(
+            file_name='pending.csv', status=Collection.Status.PENDING)
+        col.save()
+        response = self.client.get('/collections/{}/'.format(col.pk))
+        self.assertRedirects(response, '/collections/')
+
     def test_view_collection_first_page(self):
         """Test correct behaviour for the collection - first page
 
         Check, if response is rendered with correct context:
         - `col_name` is present
         - `col_id` is 1
-        - `next_page` is 2
+        - next page is 2
         - `col_header` length is 10
         - `col_data` is 10
         """
@@ -244,17 +574,17 @@ class CollectionDetailViewTest(TestCase):
         self.assertTrue(response.context['col_id'] == self.TEST_INSTANCE_PK)
         self.assertTrue(len(response.context['col_header']) == 10)
         self.assertTrue(len(response.context['col_data']) == 10)
-        self.assertTrue(response.context['next_page'] == 2)
+        self.assertTrue(response.context['page_obj'].next_page_number() == 2)
 
     def test_view_collection_second_page(self):
         """Test correct behaviour for the collection - second page
 
         Check, if response is rendered with correct context.
         This is the last, page, so only 1 row is displayed and
-        next page is the first:
+        there is no next page:
         - `col_name` is present
         - `col_id` is 1
-        - `next_page` is 1
+        - there is no next page
         - `col_header` length is 10
         - `col_data` is 1
         """
@@ -265,7 +595,134 @@ class CollectionDetailViewTest(TestCase):
         self.assertTrue(response.context['col_id'] == self.TEST_INSTANCE_PK)
         self.assertTrue(len(response.context['col_header']) == 10)
         self.assertTrue(len(response.context['col_data']) == 1)
-        self.assertTrue(response.context['next_page'] == 1)
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_view_collection_pagination(self):
+        """Test pagination of the collection
+
+        - Page number after the last one shows the last page
+        - Page size is taken from GET parameter
+        - Row count and header are stored on the collection
+        """
+
+        response = self.client.get(
+            '/collections/{}/?page=99'.format(self.TEST_INSTANCE_PK))
+        self.assertTrue(response.context['page_obj'].number == 2)
+        self.assertTrue(len(response.context['col_data']) == 1)
+
+        response = self.client.get(
+            '/collections/{}/?page=3&page_size=4'.format(
+                self.TEST_INSTANCE_PK))
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.paginator.num_pages == 3)
+        self.assertTrue(page_obj.has_previous())
+        self.assertFalse(page_obj.has_next())
+        self.assertTrue(len(response.context['col_data']) == 3)
+        self.assertEqual(
+            response.context['col_data'][0][0].strip(), 'Biggs Darklighter')
+
+        col = Collection.objects.get(pk=self.TEST_INSTANCE_PK)
+        self.assertTrue(col.row_count == 11)
+        self.assertTrue(len(col.header) == 10)
+
+    def test_view_collection_indexed(self):
+        """Test correct behaviour for the indexed collection
+
+        Rows read using the row index are the same as parsed ones.
+        """
+
+        pages = [
+            self.client.get('/collections/{}/?page={}'.format(
+                self.TEST_INSTANCE_PK, page)).context['col_data']
+            for page in (1, 2)]
+        col = Collection.objects.get(pk=self.TEST_INSTANCE_PK)
+        storage.collection_index_write(col.file.name)
+        try:
+            for page, data in zip((1, 2), pages):
+                response = self.client.get('/collections/{}/?page={}'.format(
+                    self.TEST_INSTANCE_PK, page))
+                self.assertEqual(
+                    [tuple(row) for row in response.context['col_data']],
+                    [tuple(row) for row in data])
+        finally:
+            os.remove(storage.collection_path(col.file.name, 'idx'))
+
+    def test_view_collection_conditional(self):
+        """Test caching headers of the collection detail
+
+        - ETag, Last-Modified and Cache-Control headers are set, the
+            page is cached by browsers only
+        - The collection is queried once
+        - Conditional requests are answered with 304 response
+        - Pages of unfinished collections are not cached
+        """
+
+        url = '/collections/{}/'.format(self.TEST_INSTANCE_PK)
+        response = self.client.get(url)
+        self.assertIn('max-age', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+        with self.assertNumQueries(1):
+            self.client.get(url, {'page': 2})
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+        col = Collection.objects.create(
+            status=Collection.Status.PENDING)
+        response = self.client.get('/collections/{}/'.format(col.pk))
+        self.assertRedirects(response, '/collections/')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Cache-Control'))
+
+    def test_view_collection_async(self):
+        """Test asynchronous version of the view
+
+        The response is the same as the response of synchronous view.
+        """
+
+        url = '/collections/{}/?page=2&page_size=4'.format(
+            self.TEST_INSTANCE_PK)
+        response = self.client.get(url)
+        response_async = async_to_sync(views_async.view_collection_detail)(
+            AsyncRequestFactory().get(url), str(self.TEST_INSTANCE_PK))
+        self.assertEqual(response_async.status_code, 200)
+        self.assertEqual(response_async.content, response.content)
+        self.assertEqual(response_async['ETag'], response['ETag'])
+
+    def test_api_collection_rows(self):
+        """Test JSON API of collection rows
+
+        - Rows and header are the same as within the detail page
+        - Pagination metadata is returned
+        - The response may be cached by shared caches
+        - Unknown collection returns 404 response
+        """
+
+        url = '/api/collections/{}/rows/?page=2&page_size=4'.format(
+            self.TEST_INSTANCE_PK)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        data = response.json()
+        context = self.client.get(
+            '/collections/{}/?page=2&page_size=4'.format(
+                self.TEST_INSTANCE_PK)).context
+        self.assertEqual(data['header'], list(context['col_header']))
+        self.assertEqual(
+            data['rows'], [list(row) for row in context['col_data']])
+        self.assertEqual(data['page'], {
+            'number': 2, 'size': 4, 'num_pages': 3, 'count': 11,
+            'previous': 1, 'next': 3})
+
+        response = self.client.get('/api/collections/123456/rows/')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', response.json())
 
 
 class CollectionStatViewTest(TestCase):
@@ -394,3 +851,202 @@ class CollectionStatViewTest(TestCase):
         self.assertTrue(response.context['col_header'] == (
             'eye_color', 'gender', 'count'))
         self.assertTrue(len(response.context['col_data']) == 8)
+
+    def test_view_form_fields(self):
+        """Test the statistics form
+
+        Form fields are the fields of the collection header
+        """
+
+        response = self.client.get(
+            '/collections/{}/stats/'.format(self.TEST_INSTANCE_PK))
+        self.assertEqual(list(response.context['form'].fields), [
+            'name', 'height', 'mass', 'hair_color', 'skin_color',
+            'eye_color', 'birth_year', 'gender', 'homeworld', 'date'])
+
+    def test_api_collection_stats(self):
+        """Test JSON API of collection statistics
+
+        - Counts are the same as within the statistics page
+        - No selected field returns no counts
+        """
+
+        query = 'eye_color=on&gender=on'
+        response = self.client.get('/api/collections/{}/stats/?{}'.format(
+            self.TEST_INSTANCE_PK, query))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        context = self.client.get('/collections/{}/stats/?{}'.format(
+            self.TEST_INSTANCE_PK, query)).context
+        self.assertEqual(data['header'], list(context['col_header']))
+        self.assertEqual(
+            data['rows'], [list(row) for row in context['col_data']])
+
+        response = self.client.get(
+            '/api/collections/{}/stats/'.format(self.TEST_INSTANCE_PK))
+        self.assertEqual(response.json()['rows'], [])
+
+    def test_view_stats_async(self):
+        """Test asynchronous version of the view
+
+        The response is the same as the response of synchronous view.
+        """
+
+        url = '/collections/{}/stats/?eye_color=on&gender=on'.format(
+            self.TEST_INSTANCE_PK)
+        response = self.client.get(url)
+        response_async = async_to_sync(views_async.view_collection_stats)(
+            AsyncRequestFactory().get(url), str(self.TEST_INSTANCE_PK))
+        self.assertEqual(response_async.status_code, 200)
+        self.assertEqual(response_async.content, response.content)
+
+    def test_view_stats_cached(self):
+        """Test the statistics are cached
+
+        - The second request of the same fields in any order does not
+            read the collection
+        - Cached statistics are invalidated explicitly and when the
+            collection is deleted
+        """
+
+        url = '/collections/{}/stats/?{}'
+        response = self.client.get(
+            url.format(self.TEST_INSTANCE_PK, 'gender=on&eye_color=on'))
+        expected = response.context['col_data']
+        with mock.patch('portal.storage.collection_value_counts') as counts:
+            response = self.client.get(
+                url.format(self.TEST_INSTANCE_PK, 'gender=on&eye_color=on'))
+            self.assertEqual(response.context['col_data'], expected)
+            response = self.client.get(
+                url.format(self.TEST_INSTANCE_PK, 'eye_color=on&gender=on'))
+            self.assertEqual(
+                response.context['col_data'],
+                [(e, g, c) for g, e, c in expected])
+            counts.assert_not_called()
+
+        col = Collection.objects.get(pk=self.TEST_INSTANCE_PK)
+        stats.collection_stats_invalidate(col.id)
+        with mock.patch('portal.storage.collection_value_counts') as counts:
+            counts.return_value = expected
+            self.assertEqual(
+                stats.collection_stats_get(col, ['eye_color', 'gender']),
+                expected)
+            self.assertEqual(
+                stats.collection_stats_get(col, ['eye_color', 'gender']),
+                expected)
+            counts.assert_called_once()
+
+        with mock.patch('portal.storage.collection_delete'):
+            col.delete()
+        with mock.patch('portal.storage.collection_value_counts') as counts:
+            counts.return_value = []
+            self.assertEqual(
+                stats.collection_stats_get(col, ['eye_color', 'gender']),
+                [])
+
+
+class CollectionExportViewTest(TestCase):
+    """Test /collection_export/ view"""
+
+    TEST_FILE_CONTENT = (
+        b'name,gender\r\n'
+        b'Luke Skywalker,male\r\n'
+        b'"Leia Organa, Princess",female\r\n')
+
+    def setUp(self):
+        self._media_root = tempfile.TemporaryDirectory()
+        self._override = override_settings(
+            MEDIA_ROOT=self._media_root.name)
+        self._override.enable()
+        temp_name = storage.collection_temp_name()
+        with open(storage.collection_path(temp_name), 'wb') as f:
+            f.write(self.TEST_FILE_CONTENT)
+        col = Collection(file_name=storage.collection_store(temp_name))
+        col.save()
+        self._url = '/collections/{}/export/'.format(col.pk)
+
+    def tearDown(self):
+        self._override.disable()
+        self._media_root.cleanup()
+
+    def test_view_export_csv(self):
+        """Test CSV export
+
+        The content is the collection file, validators are set
+        """
+
+        response = self.client.get(self._url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            b''.join(response.streaming_content), self.TEST_FILE_CONTENT)
+        self.assertEqual(
+            response['Content-Length'], str(len(self.TEST_FILE_CONTENT)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'])
+        self.assertTrue(response['Last-Modified'])
+
+    def test_view_export_ndjson(self):
+        """Test NDJSON export: Every row is a JSON object"""
+
+        response = self.client.get(self._url + '?format=ndjson')
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'name': 'Luke Skywalker', 'gender': 'male'},
+            {'name': 'Leia Organa, Princess', 'gender': 'female'}])
+
+    def test_view_export_conditional(self):
+        """Test conditional requests are answered with 304 response"""
+
+        response = self.client.get(self._url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        response = self.client.get(self._url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self._url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self._url + '?format=ndjson', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_view_export_range(self):
+        """Test byte range requests
+
+        - Satisfiable range returns 206 response with just the range
+        - Suffix range returns the last bytes
+        - Unsatisfiable range returns 416 response
+        - Range is ignored when `If-Range` does not match
+        """
+
+        size = len(self.TEST_FILE_CONTENT)
+        response = self.client.get(self._url, HTTP_RANGE='bytes=5-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(
+            b''.join(response.streaming_content),
+            self.TEST_FILE_CONTENT[5:10])
+        self.assertEqual(
+            response['Content-Range'], 'bytes 5-9/{}'.format(size))
+
+        response = self.client.get(self._url, HTTP_RANGE='bytes=-8')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(
+            b''.join(response.streaming_content),
+            self.TEST_FILE_CONTENT[-8:])
+
+        response = self.client.get(
+            self._url, HTTP_RANGE='bytes={}-'.format(size))
+        self.assertEqual(response.status_code, 416)
+
+        response = self.client.get(
+            self._url, HTTP_RANGE='bytes=5-9', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_view_export_unknown(self):
+        """Test correct behaviour for unknown collection
+
+        Response is redirected to `/collections/` view
+        """
+
+        response = self.client.get('/collections/123456/export/')
+        self.assertRedirects(response, '/collections/')
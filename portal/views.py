@@ -1,211 +1,671 @@
-from django.shortcuts import render, redirect
-from portal import swapi
-from portal import models
-import petl as etl
-import dateutil.parser
+import asyncio
+import calendar
+import functools
+import itertools
+import json
 import os
-import uuid
+import re
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.paginator import Paginator
+from django.http import (
+    Http404, HttpResponse, JsonResponse, StreamingHttpResponse)
+from django.shortcuts import render, redirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from portal import instrument
+from portal import jobs
+from portal import models
+from portal import stats
+from portal import storage
 from django.contrib import messages
 
 from portal import forms
 
+# Content types of collection export formats
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+# Number of rows serialized at once within NDJSON export
+EXPORT_NDJSON_BATCH = 1000
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
 
 def view_index(request):
 
     return redirect('collections')
 
 
+def view_metrics(request):
+    """Prometheus metrics endpoint: Histograms of request and span
+    durations (see `portal.instrument`)
+
+    :param request: HTTP Request object
+    :return: HTTP response: Metrics in Prometheus text exposition
+        format. If `INSTRUMENTATION_ENABLED` setting is off, 404
+        response.
+    """
+
+    if not instrument.enabled():
+        raise Http404('Instrumentation is disabled')
+    return HttpResponse(
+        instrument.metrics_render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 def view_collections(request):
     """View for processing collections list.
 
     In case of POST request:
-        - Get list of people from SW API
-        - Transform the data
-            - Parse date of edited column
-            - Parse homeworld column to use the planet name
-                instead of url
-            - Cut some redundant columns
-        - Load the data into CSV file
-        - Save metadata into DB
+        - Save new pending collection of every requested resource type
+            into DB (see `_resource_types_get`). Their file names are
+            set by the job
+        - Submit one ingestion job of the collections (see
+            `portal.jobs`) and do not wait for the result
+            (see `INGEST_JOB_RUNNER` setting)
+        - IDs of the collections are returned by `X-Collection-Ids`
+            response header (e.g. for load tests)
+
+    Collections of stale jobs fail (see `jobs.stale_jobs_fail`), so the
+    page is refreshed just while the jobs are in progress.
 
     param request: HTTP Request object
     :returns: HTTP response: A page with list of previously fetched
-        collections. In case of error during new collection fetching,
-        show warning message.
+        collections and their status. In case of error during new
+        collection fetching (if it is already known), show warning
+        message.
     """
 
-    def collections_render():
-        """Helper method to get all previously fetched collections
-        and render it
-        """
-
-        collections = models.Collection.objects.all()
-        return render(
+    if request.method == 'POST':
+        with instrument.span('collections.submit'):
+            cols = _collections_create(request)
+            jobs.job_submit(*cols)
+
+            if _collections_failed(cols):
+                messages.warning(
+                    request, 'Error processing Star Wars API request :(')
+
+    with instrument.span('collections.query'):
+        collections = _collections_query()
+    with instrument.span('render'):
+        response = render(
             request,
             'portal/collections.html',
-            context={'collections': collections})
-
+            context=_collections_context(collections))
     if request.method == 'POST':
-        s = swapi.SWAPI()
-
-        # Get planets and fetch 'em to dict for latter use
-        resp_planets = s.planets_get()
-        if resp_planets is None:
-            messages.warning(
-                request, 'Error processing Star Wars API request :(')
-            return collections_render()
-        planets_map = {p['url']: p['name'] for p in resp_planets}
-
-        # Get all people from the API
-        resp_people = s.people_get()
-        if resp_people is None:
-            messages.warning(
-                request, 'Error processing Star Wars API request :(')
-            return collections_render()
-
-        # Transform people data
-        table = (
-            etl
-            .fromdicts(resp_people)
-            .addfield(
-                'date', lambda rec: dateutil.parser.parse(
-                    rec['edited']).strftime('%Y-%m-%d'))
-            .convert(
-                'homeworld', lambda v: planets_map.get(v, 'N/A'))
-            .cutout(
-                'films', 'vehicles', 'starships', 'created',
-                'url', 'species', 'edited')
-        )
-
-        # Load data into CSV file
-        file_name = '%s.csv' % uuid.uuid4().hex
-        file_path = os.path.join(settings.MEDIA_ROOT, file_name)
-        etl.tocsv(table, file_path)
-
-        # Save metadata into model
-        col = models.Collection(file_name=file_name)
-        col.file.name = file_name
-        col.save()
-
-    return collections_render()
-
-
-def view_collection_detail(request, collection_id):
+        _collection_ids_set(response, cols)
+    return response
+
+
+def _collection_ids_set(response, cols):
+    """Set `X-Collection-Ids` header of the response: Comma-separated
+    IDs of the collections
+    """
+
+    response['X-Collection-Ids'] = ','.join(str(col.pk) for col in cols)
+
+
+def _collections_create(request):
+    """Save new pending collection of every resource type requested
+    by POST request (see `_resource_types_get`)
+
+    :param request: HTTP Request object
+    :return: List of collection objects
+    """
+
+    return [
+        models.Collection.objects.create(
+            status=models.Collection.Status.PENDING,
+            resource_type=resource_type)
+        for resource_type in _resource_types_get(request)]
+
+
+def _collections_failed(cols):
+    """Check whether ingestion job of the collections failed already
+
+    :param cols: Collection objects
+    :return: True if any of the collections failed
+    """
+
+    return models.Collection.objects.filter(
+        pk__in=[col.pk for col in cols],
+        status=models.Collection.Status.FAILED).exists()
+
+
+def _collections_query():
+    """Get all the collections. Collections of stale jobs fail first
+    (see `jobs.stale_jobs_fail`).
+
+    :return: List of collection objects
+    """
+
+    jobs.stale_jobs_fail()
+    return list(models.Collection.objects.all())
+
+
+def _collections_context(collections):
+    """Get context of collections list page
+
+    :param collections: List of collection objects
+    :return: Context dict: The page is refreshed while any of the
+        collections is in progress
+    """
+
+    in_progress = any(
+        col.status in (
+            models.Collection.Status.PENDING,
+            models.Collection.Status.RUNNING)
+        for col in collections)
+    return {
+        'collections': collections,
+        'in_progress': in_progress,
+        'form': forms.CollectionsFetchForm()}
+
+
+def _resource_types_get(request):
+    """Get resource types of collections fetched by POST request: The
+    type given by `resource_type` POST parameter, all the types of
+    `INGEST_RESOURCE_TYPES` setting by default.
+
+    :param request: HTTP Request object
+    :return: List of resource types
+    """
+
+    form = forms.CollectionsFetchForm(request.POST)
+    if form.is_valid() and form.cleaned_data['resource_type']:
+        return [form.cleaned_data['resource_type']]
+    return list(settings.INGEST_RESOURCE_TYPES)
+
+
+def _collection_lookup(collection_id):
+    """Get finished collection object
+
+    :param collection_id: ID af the collection
+    :return: Tuple of collection object and error message. Collection
+        is None if it is not available
+    """
+
+    try:
+        col = models.Collection.objects.get(pk=collection_id)
+    except (models.Collection.DoesNotExist, ValueError):
+        return None, 'Given collection was lost in a black hole :('
+    if col.status != models.Collection.Status.DONE:
+        return None, 'Given collection is not ready yet :('
+    return col, None
+
+
+def _collection_get(request, collection_id):
+    """Get finished collection object. Warning message is added if
+    the collection is not available.
+
+    :param request: HTTP Request object
+    :param collection_id: ID af the collection
+    :return: Collection object or None
+    """
+
+    col, error = _collection_lookup(collection_id)
+    if col is None:
+        messages.warning(request, error)
+    return col
+
+
+def _collection_page_get(request, col):
+    """Get page of collection rows requested by GET parameters `page`
+    and `page_size` (up to `COLLECTION_PAGE_SIZE_MAX`,
+    `COLLECTION_PAGE_SIZE` by default). Incorrect page number gets
+    the first page, page number after the last one gets the last page.
+
+    :param request: HTTP Request object
+    :param col: Collection object with metadata
+    :return: Tuple of page object and page size
+    """
+
+    try:
+        page_size = int(request.GET['page_size'])
+    except (KeyError, ValueError):
+        page_size = settings.COLLECTION_PAGE_SIZE
+    page_size = min(max(page_size, 1), settings.COLLECTION_PAGE_SIZE_MAX)
+    paginator = Paginator(
+        storage.CollectionRows(col.file_name, col.row_count), page_size)
+    return paginator.get_page(request.GET.get('page')), page_size
+
+
+def _collection_detail_context(col, page_obj, page_size):
+    """Get context of collection detail page
+
+    :param col: Collection object with metadata
+    :param page_obj: Page of collection rows
+    :param page_size: Page size
+    :return: Context dict
+    """
+
+    return {
+        'col_name': col.file_name,
+        'col_id': col.id,
+        'col_header': col.header,
+        'col_data': page_obj.object_list,
+        'page_obj': page_obj,
+        'page_size': page_size}
+
+
+def _collection_stats_context(col, form, selected_fields, data):
+    """Get context of collection statistics page
+
+    :param col: Collection object with metadata
+    :param form: Statistics form
+    :param selected_fields: Tuple of selected field names
+    :param data: Value counts of the selected fields. The table is not
+        shown if no field is selected
+    :return: Context dict
+    """
+
+    context = {
+        'col_name': col.file_name,
+        'col_id': col.id,
+        'form': form}
+    if selected_fields:
+        context['col_header'] = selected_fields + ('count',)
+        context['col_data'] = data
+    return context
+
+
+def _selected_fields_get(request, col):
+    """Get fields selected by GET parameters: Just the keys which are
+    collection fields are used.
+
+    :param request: HTTP Request object
+    :param col: Collection object with metadata
+    :return: Tuple of field names
+    """
+
+    return tuple(f for f in request.GET.keys() if f in col.header)
+
+
+def _collection_cached(view_func=None, *, public=True):
+    """Decorator of views fully determined by finished collection and
+    GET parameters.
+
+    The collection is looked up just once: The view is called with
+    the collection object (None if it is not available) and the error
+    message as `col` and `error` keyword arguments.
+
+    Collections never change: `ETag` and `Last-Modified` headers are
+    derived from the collection id and its creation date, conditional
+    requests are answered with 304 Not Modified without calling the
+    view. Successful responses may be cached for
+    `COLLECTION_CACHE_MAX_AGE` seconds by browsers and proxies, or by
+    browsers only if `public` is false (HTML pages rendered for
+    the session). Responses for collections which are not finished are
+    not cached.
+    """
+
+    if view_func is None:
+        return functools.partial(_collection_cached, public=public)
+
+    if asyncio.iscoroutinefunction(view_func):
+        @functools.wraps(view_func)
+        async def wrapper_async(request, collection_id, *args, **kwargs):
+            with instrument.span('collection.lookup'):
+                col, error = await sync_to_async(_collection_lookup)(
+                    collection_id)
+            kwargs.update(col=col, error=error)
+            if col is None or request.method not in ('GET', 'HEAD'):
+                return await view_func(
+                    request, collection_id, *args, **kwargs)
+            response = _collection_conditional_response(request, col)
+            if response is None:
+                response = await view_func(
+                    request, collection_id, *args, **kwargs)
+            return _collection_cache_headers_set(response, col, public)
+
+        return wrapper_async
+
+    @functools.wraps(view_func)
+    def wrapper(request, collection_id, *args, **kwargs):
+        with instrument.span('collection.lookup'):
+            col, error = _collection_lookup(collection_id)
+        kwargs.update(col=col, error=error)
+        if col is None or request.method not in ('GET', 'HEAD'):
+            return view_func(request, collection_id, *args, **kwargs)
+        response = _collection_conditional_response(request, col)
+        if response is None:
+            response = view_func(request, collection_id, *args, **kwargs)
+        return _collection_cache_headers_set(response, col, public)
+
+    return wrapper
+
+
+def _collection_validators(col):
+    """Get `ETag` and `Last-Modified` timestamp of the collection"""
+
+    etag = '"%s-%s"' % (col.id, col.date_created.strftime('%Y%m%d%H%M%S%f'))
+    return etag, calendar.timegm(col.date_created.utctimetuple())
+
+
+def _collection_conditional_response(request, col):
+    """Get 304 Not Modified response if the request conditions match
+    the collection, otherwise None
+    """
+
+    etag, last_modified = _collection_validators(col)
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+
+
+def _collection_cache_headers_set(response, col, public=True):
+    """Set validators and `Cache-Control` of successful response of
+    the collection view
+    """
+
+    if response.status_code not in (200, 304):
+        return response
+    etag, last_modified = _collection_validators(col)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    _cache_control_patch(response, public)
+    return response
+
+
+def _cache_control_patch(response, public=True):
+    """Allow caching of the response of immutable collection for
+    `COLLECTION_CACHE_MAX_AGE` seconds: By shared caches as well if
+    `public`, by browsers only otherwise
+    """
+
+    if public:
+        patch_cache_control(
+            response, public=True,
+            max_age=settings.COLLECTION_CACHE_MAX_AGE)
+    else:
+        patch_cache_control(
+            response, private=True,
+            max_age=settings.COLLECTION_CACHE_MAX_AGE)
+
+
+@_collection_cached(public=False)
+def view_collection_detail(request, collection_id, *, col, error):
     """View for processing collection detail.
 
-    - Get collection CSV file
+    - Get collection metadata: header and row count
     - Load data from file respecting paging:
-        - Requested page number is obtained from GET parameter `page`
-        - There is support just for subsequent pages: Just `next`
-            button is shown
-        - When there is no data on next page, show the first page
+        - Requested page number is obtained from GET parameter `page`,
+            page size from GET parameter `page_size` (up to
+            `COLLECTION_PAGE_SIZE_MAX`, `COLLECTION_PAGE_SIZE` by
+            default)
+        - Just the rows of the page are read using the row index of
+            the collection (see `storage.CollectionRows`)
+        - Incorrect page number shows the first page, page number
+            after the last one shows the last page
+    - Other pages are loaded by the rendered page from JSON API
+        without reloading (see `api_collection_rows`)
+    - Response can be cached and conditional requests are supported
+        (see `_collection_cached`)
 
     :param request: HTTP Request object
     :param collection_id: ID af the collection
+    :param col: Collection object (see `_collection_cached`), None if
+        it is not available
+    :param error: Error message if the collection is not available
     :return: HTTP response: A page with table data regarding given
         collection. In case of incorrect collection_id, redirect
         to collections list page.
     """
 
-    # Get collection object
-    try:
-        col = models.Collection.objects.get(id=collection_id)
-    except (models.Collection.DoesNotExist, ValueError):
-        messages.warning(
-            request, 'Given collection was lost in a black hole :(')
-        return redirect('collections')
+    # Check collection object
+    with instrument.span('collection.metadata'):
+        if col is None:
+            messages.warning(request, error)
+            return redirect('collections')
+        col.metadata_ensure()
 
-    # Get and read collection file
-    file_path = os.path.join(settings.MEDIA_ROOT, col.file_name)
-    table = etl.fromcsv(file_path)
-    header = etl.header(table)
+    # Get requested page size and page
+    with instrument.span('collection.rows'):
+        page_obj, page_size = _collection_page_get(request, col)
 
-    # Get requested page number and data slice boundaries
-    page = request.GET.get('page', 1)
-    try:
-        page = int(page)
-    except ValueError:
-        page = 1
-    slice_start = (page - 1) * 10
-    slice_stop = slice_start + 10
-
-    # Get data
-    data = etl.records(table, slice_start, slice_stop)
-    next_page = page + 1
-    if len(data) < 10:
-        next_page = 1
-
-    return render(
-        request,
-        'portal/collection_detail.html',
-        context={
-            'col_name': col.file_name,
-            'col_id': col.id,
-            'col_header': header,
-            'col_data': data,
-            'next_page': next_page})
-
-
-def view_collection_stats(request, collection_id):
+    with instrument.span('render'):
+        return render(
+            request,
+            'portal/collection_detail.html',
+            context=_collection_detail_context(col, page_obj, page_size))
+
+
+@_collection_cached(public=False)
+def view_collection_stats(request, collection_id, *, col, error):
     """View for processing collection Statistic.
 
     The statistic enables user to show count of occurrences of values
     for columns. Requested column names are retrieved from GET data
     (GET is used so user is able to bookmark the form).
 
-    - Get collection CSV file
-    - Transform data using `petl`: Find distinct values for the
-        given fields and count the number of occurrences.
+    - Find distinct values for the given fields and count the number
+        of occurrences: Counts precomputed during ingestion are used
+        and cached (see `stats.collection_stats_get`)
+    - Response can be cached and conditional requests are supported
+        (see `_collection_cached`)
 
     :param request: HTTP Request object
     :param collection_id: ID af the collection
+    :param col: Collection object (see `_collection_cached`), None if
+        it is not available
+    :param error: Error message if the collection is not available
     :return: HTTP response: A page with table data regarding given
         collection statistics. In case of incorrect collection_id,
         redirect to collections list page.
     """
 
-    # Get collection object
-    try:
-        col = models.Collection.objects.get(pk=collection_id)
-    except (models.Collection.DoesNotExist, ValueError):
-        messages.warning(
-            request, 'Given collection was lost in a black hole :(')
-        return redirect('collections')
-
-    # Get collection object
-    file_path = os.path.join(settings.MEDIA_ROOT, col.file_name)
-    table = etl.fromcsv(file_path)
+    # Check collection object
+    with instrument.span('collection.metadata'):
+        if col is None:
+            messages.warning(request, error)
+            return redirect('collections')
+        col.metadata_ensure()
 
     # Process form: Get just form data keys as form contains
-    # only checkboxes
-    form = forms.StatisticsForm(request.GET)
-    selected_fields = tuple(form.data.keys())
-
-    # Use does not select any field. Do not show table
-    if not selected_fields:
+    # only checkboxes. Ignore the keys which are not collection fields
+    form = forms.StatisticsForm(request.GET, fields=col.header)
+    selected_fields = _selected_fields_get(request, col)
+
+    # Count the values. If user does not select any field, do not show
+    # table
+    data = None
+    if selected_fields:
+        with instrument.span('collection.stats'):
+            data = stats.collection_stats_get(col, selected_fields)
+    with instrument.span('render'):
         return render(
             request,
             'portal/collection_stats.html',
-            context={
-                'col_name': col.file_name,
-                'col_id': col.id,
-                'form': form})
-
-    # Count the values and return table data
-    table_updated = (
-        etl
-        .valuecounts(table, *selected_fields)
-        .cutout('frequency')
-    )
-    header = etl.header(table_updated)
-    data = etl.records(table_updated)
-    return render(
-        request,
-        'portal/collection_stats.html',
-        context={
-            'col_name': col.file_name,
-            'col_id': col.id,
-            'col_header': header,
-            'col_data': data,
-            'form': form})
+            context=_collection_stats_context(
+                col, form, selected_fields, data))
+
+
+@_collection_cached
+def api_collection_rows(request, collection_id, *, col, error):
+    """JSON API of collection rows: The same page of rows as within
+    `view_collection_detail` is returned without page rendering.
+
+    :param request: HTTP Request object
+    :param collection_id: ID af the collection
+    :param col: Collection object (see `_collection_cached`), None if
+        it is not available
+    :param error: Error message if the collection is not available
+    :return: JSON response: Collection header, rows of the page and
+        pagination metadata. In case of incorrect collection_id,
+        404 response with error message.
+    """
+
+    if col is None:
+        return JsonResponse({'error': error}, status=404)
+    col.metadata_ensure()
+
+    page_obj, page_size = _collection_page_get(request, col)
+    paginator = page_obj.paginator
+    return JsonResponse({
+        'id': col.id,
+        'name': col.file_name,
+        'resource_type': col.resource_type,
+        'header': col.header,
+        'rows': [list(row) for row in page_obj.object_list],
+        'page': {
+            'number': page_obj.number,
+            'size': page_size,
+            'num_pages': paginator.num_pages,
+            'count': paginator.count,
+            'previous': (
+                page_obj.previous_page_number()
+                if page_obj.has_previous() else None),
+            'next': (
+                page_obj.next_page_number()
+                if page_obj.has_next() else None)}})
+
+
+@_collection_cached
+def api_collection_stats(request, collection_id, *, col, error):
+    """JSON API of collection statistics: The same value counts as
+    within `view_collection_stats` are returned without page rendering.
+
+    :param request: HTTP Request object
+    :param collection_id: ID af the collection
+    :param col: Collection object (see `_collection_cached`), None if
+        it is not available
+    :param error: Error message if the collection is not available
+    :return: JSON response: Selected fields with count and value
+        counts. In case of incorrect collection_id, 404 response with
+        error message.
+    """
+
+    if col is None:
+        return JsonResponse({'error': error}, status=404)
+    col.metadata_ensure()
+
+    selected_fields = _selected_fields_get(request, col)
+    data = (
+        stats.collection_stats_get(col, selected_fields)
+        if selected_fields else [])
+    return JsonResponse({
+        'id': col.id,
+        'name': col.file_name,
+        'header': list(selected_fields) + ['count'],
+        'rows': [list(row) for row in data]})
+
+
+def view_collection_export(request, collection_id):
+    """View for collection export.
+
+    The collection is streamed in chunks, so the memory used does not
+    depend on the collection size. Format is obtained from GET
+    parameter `format`:
+        - csv (default): The stored collection file. Single byte range
+            requests are supported (`Range` and `If-Range` headers)
+        - ndjson: Every row as JSON object on separate line
+
+    Collections never change: `ETag` is derived from the collection
+    content hash and the format, `Last-Modified` is the date of
+    the collection creation. Conditional requests are answered with
+    304 Not Modified.
+
+    :param request: HTTP Request object
+    :param collection_id: ID af the collection
+    :return: HTTP streaming response with the collection content.
+        In case of incorrect collection_id, redirect to collections
+        list page.
+    """
+
+    # Get collection object
+    col = _collection_get(request, collection_id)
+    if col is None:
+        return redirect('collections')
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'csv'
+    etag = '"%s-%s"' % (os.path.splitext(col.file_name)[0], export_format)
+    _, last_modified = _collection_validators(col)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    if export_format == 'csv':
+        size = os.path.getsize(storage.collection_path(col.file_name))
+        byte_range = _byte_range_get(request, etag, last_modified, size)
+        if byte_range == ():
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%s' % size
+            return response
+        start, stop = byte_range or (0, size)
+        response = StreamingHttpResponse(
+            storage.collection_chunks_read(col.file_name, start, stop),
+            content_type=EXPORT_FORMATS[export_format])
+        if byte_range:
+            response.status_code = 206
+            response['Content-Range'] = 'bytes %s-%s/%s' % (
+                start, stop - 1, size)
+        response['Content-Length'] = stop - start
+        response['Accept-Ranges'] = 'bytes'
+    else:
+        response = StreamingHttpResponse(
+            _ndjson_stream(col.file_name),
+            content_type=EXPORT_FORMATS[export_format])
+        response['Accept-Ranges'] = 'none'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    _cache_control_patch(response)
+    response['Content-Disposition'] = 'attachment; filename="%s.%s"' % (
+        os.path.splitext(col.file_name)[0], export_format)
+    return response
+
+
+def _byte_range_get(request, etag, last_modified, size):
+    """Get byte range requested by `Range` header. Just a single range
+    is supported, the header is ignored otherwise. The header is also
+    ignored if `If-Range` header does not match the content.
+
+    :param request: HTTP Request object
+    :param etag: ETag of the content
+    :param last_modified: Timestamp of the content modification
+    :param size: Size of the content in bytes
+    :return: Tuple of the first byte offset and the offset after the
+        last byte. Empty tuple if the range is not satisfiable. None if
+        the whole content is requested
+    """
+
+    match = RANGE_RE.match(request.META.get('HTTP_RANGE', '').strip())
+    if match is None or match.groups() == ('', ''):
+        return
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range not in (etag, http_date(last_modified)):
+        return
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last bytes
+        start, stop = max(0, size - int(last)), size
+    else:
+        start = int(first)
+        stop = min(int(last) + 1, size) if last else size
+        if last and int(last) < start:
+            return
+    if start >= size or start >= stop:
+        return ()
+    return start, stop
+
+
+def _ndjson_stream(file_name):
+    """Serialize collection rows into newline-delimited JSON by batches
+    of `EXPORT_NDJSON_BATCH` rows
+
+    :param file_name: Name of the collection file within `MEDIA_ROOT`
+    :return: Iterator of encoded lines
+    """
+
+    records = storage.collection_records_iter(file_name)
+    while True:
+        batch = list(itertools.islice(records, EXPORT_NDJSON_BATCH))
+        if not batch:
+            return
+        yield ''.join(
+            json.dumps(record) + '\n' for record in batch).encode('utf-8')
@@ -0,0 +1,113 @@
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.shortcuts import render, redirect
+
+from portal import forms
+from portal import instrument
+from portal import jobs
+from portal import stats
+from portal import views
+
+# Asynchronous versions of the collection views used when served by
+# ASGI server (see `PORTAL_ASYNC_VIEWS` setting). DB queries run on
+# the thread shared by synchronous code, collection files are read
+# on worker threads, so the event loop is never blocked by them.
+
+
+async def view_collections(request):
+    """Asynchronous version of `views.view_collections`. Ingestion job
+    is submitted by `jobs.job_submit_async`: With `INGEST_JOB_RUNNER`
+    setting 'async', Star Wars API is requested on the event loop.
+
+    :param request: HTTP Request object
+    :returns: HTTP response: A page with list of previously fetched
+        collections and their status
+    """
+
+    if request.method == 'POST':
+        with instrument.span('collections.submit'):
+            cols = await sync_to_async(views._collections_create)(request)
+            await jobs.job_submit_async(*cols)
+
+            if await sync_to_async(views._collections_failed)(cols):
+                messages.warning(
+                    request, 'Error processing Star Wars API request :(')
+
+    with instrument.span('collections.query'):
+        collections = await sync_to_async(views._collections_query)()
+    with instrument.span('render'):
+        response = render(
+            request,
+            'portal/collections.html',
+            context=views._collections_context(collections))
+    if request.method == 'POST':
+        views._collection_ids_set(response, cols)
+    return response
+
+
+@views._collection_cached(public=False)
+async def view_collection_detail(request, collection_id, *, col, error):
+    """Asynchronous version of `views.view_collection_detail`
+
+    :param request: HTTP Request object
+    :param collection_id: ID af the collection
+    :param col: Collection object (see `views._collection_cached`),
+        None if it is not available
+    :param error: Error message if the collection is not available
+    :return: HTTP response: A page with table data regarding given
+        collection. In case of incorrect collection_id, redirect
+        to collections list page.
+    """
+
+    with instrument.span('collection.metadata'):
+        if col is None:
+            messages.warning(request, error)
+            return redirect('collections')
+        await sync_to_async(col.metadata_ensure)()
+
+    with instrument.span('collection.rows'):
+        page_obj, page_size = await sync_to_async(
+            views._collection_page_get, thread_sensitive=False)(request, col)
+
+    with instrument.span('render'):
+        return render(
+            request,
+            'portal/collection_detail.html',
+            context=views._collection_detail_context(
+                col, page_obj, page_size))
+
+
+@views._collection_cached(public=False)
+async def view_collection_stats(request, collection_id, *, col, error):
+    """Asynchronous version of `views.view_collection_stats`
+
+    :param request: HTTP Request object
+    :param collection_id: ID af the collection
+    :param col: Collection object (see `views._collection_cached`),
+        None if it is not available
+    :param error: Error message if the collection is not available
+    :return: HTTP response: A page with table data regarding given
+        collection statistics. In case of incorrect collection_id,
+        redirect to collections list page.
+    """
+
+    with instrument.span('collection.metadata'):
+        if col is None:
+            messages.warning(request, error)
+            return redirect('collections')
+        await sync_to_async(col.metadata_ensure)()
+
+    form = forms.StatisticsForm(request.GET, fields=col.header)
+    selected_fields = views._selected_fields_get(request, col)
+    data = None
+    if selected_fields:
+        with instrument.span('collection.stats'):
+            data = await sync_to_async(
+                stats.collection_stats_get, thread_sensitive=False)(
+                col, selected_fields)
+    with instrument.span('render'):
+        return render(
+            request,
+            'portal/collection_stats.html',
+            context=views._collection_stats_context(
+                col, form, selected_fields, data))
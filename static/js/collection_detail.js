@@ -0,0 +1,78 @@
+// Load pages of the collection detail from JSON API without reloading
+// the whole page. Links keep working without JavaScript.
+(function () {
+    var nav = document.getElementById('collection-pagination');
+    var tbody = document.getElementById('collection-rows');
+    if (!nav || !tbody || !window.fetch) {
+        return;
+    }
+    var pageSize = nav.dataset.pageSize;
+
+    function pageLink(page, icon) {
+        return '<li class="page-item">' +
+            '<a class="page-link" href="?page=' + page +
+            '&page_size=' + pageSize + '" data-page="' + page + '">' +
+            '<span class="fas ' + icon + '"></span></a></li>';
+    }
+
+    function render(data) {
+        tbody.textContent = '';
+        data.rows.forEach(function (row) {
+            var tr = document.createElement('tr');
+            row.forEach(function (value) {
+                var td = document.createElement('td');
+                td.textContent = value;
+                tr.appendChild(td);
+            });
+            tbody.appendChild(tr);
+        });
+
+        var page = data.page;
+        var items = '';
+        if (page.previous !== null) {
+            items += pageLink(1, 'fa-angles-left');
+            items += pageLink(page.previous, 'fa-angle-left');
+        }
+        items += '<li class="page-item disabled"><span class="page-link">' +
+            'Page ' + page.number + ' of ' + page.num_pages + '</span></li>';
+        if (page.next !== null) {
+            items += pageLink(page.next, 'fa-angle-right');
+            items += pageLink(page.num_pages, 'fa-angles-right');
+        }
+        nav.querySelector('.pagination').innerHTML = items;
+    }
+
+    function load(query, push) {
+        return fetch(nav.dataset.apiUrl + query)
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(function (data) {
+                render(data);
+                if (push) {
+                    history.pushState(null, '', query);
+                }
+            });
+    }
+
+    nav.addEventListener('click', function (event) {
+        var link = event.target.closest('a[data-page]');
+        if (!link) {
+            return;
+        }
+        event.preventDefault();
+        var query = '?page=' + link.dataset.page + '&page_size=' + pageSize;
+        load(query, true).catch(function () {
+            window.location = link.href;
+        });
+    });
+
+    window.addEventListener('popstate', function () {
+        load(window.location.search, false).catch(function () {
+            window.location.reload();
+        });
+    });
+})();